@@ -0,0 +1,244 @@
+from __future__ import absolute_import
+
+import logging
+import os
+import re
+import subprocess
+import uuid
+from os.path import join
+from subprocess import list2cmdline
+from time import gmtime, strftime
+
+from limix_lsf.config import stdoe_folder
+from limix_lsf.job import Job as BJob
+
+from ._path import make_sure_path_exists
+from ._pickle_files import dump, load
+
+# A job array submits many jobs with a single scheduler call. Its element
+# `i` (1-based, given by LSB_JOBINDEX) runs the jobs specified on line `i`
+# of the array mapping file, e.g. ``7`` or a bundle like ``100-109,250``.
+
+
+class LSFScheduler(object):
+    """Submits and queries LSF job arrays through bsub, bjobs and bkill."""
+    def __init__(self):
+        self._stats = None
+
+    def submit(self, bcmd):
+        """Runs a bsub command line, returning its output and error."""
+        p = subprocess.Popen(
+            list2cmdline(bcmd),
+            shell=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            universal_newlines=True)
+        return p.communicate()
+
+    def stats(self):
+        """Status of every array element, as ``{(jobid, index): stat}``.
+
+        The status is read once per process, like `limix_lsf` does.
+        """
+        if self._stats is None:
+            out = subprocess.check_output(
+                'bjobs -a -o "JOBID JOBINDEX STAT" -noheader',
+                shell=True, stderr=subprocess.STDOUT,
+                universal_newlines=True).strip()
+            stats = dict()
+            for row in out.split('\n'):
+                row = row.split()
+                if len(row) == 3 and row[0].isdigit() and row[1].isdigit():
+                    stats[(int(row[0]), int(row[1]))] = row[2]
+            self._stats = stats
+        return self._stats
+
+    def reset(self):
+        """Forgets the status read so far, so that it is read again."""
+        self._stats = None
+
+    def kill(self, os_jobid):
+        self.kill_jobs([os_jobid])
+
+    def kill_jobs(self, os_jobids, chunk=500):
+        """Kills many jobs or array elements (e.g. ``'123[4]'``) with a
+        few bkill calls."""
+        os_jobids = [str(i) for i in os_jobids]
+        for i in range(0, len(os_jobids), chunk):
+            _call_quietly(['bkill'] + os_jobids[i:i + chunk])
+
+
+def _call_quietly(argv):
+    with open(os.devnull, 'w') as devnull:
+        try:
+            subprocess.call(argv, stdout=devnull, stderr=devnull)
+        except OSError as e:
+            logging.getLogger(__name__).warn('Could not run %s: %s',
+                                             argv[0], e)
+
+
+_scheduler = [LSFScheduler()]
+
+
+def get_scheduler():
+    return _scheduler[0]
+
+
+def set_scheduler(scheduler):
+    """Replaces the scheduler used to submit and query job arrays, which is
+    useful for testing."""
+    _scheduler[0] = scheduler
+
+
+def _generate_runid():
+    return '%s-%s' % (strftime('%Y-%m-%d-%H-%M-%S', gmtime()),
+                      uuid.uuid4().hex[:6])
+
+
+class ArrayRun(object):
+    """A job array of an experiment.
+
+    :param str folder: folder where the array run and its mapping file are
+                       stored.
+    :param list specs: job ID specifications of the elements, in array
+                       index order (see :func:`.job.format_jobids`).
+    :param str output_folder: folder of the standard output and error
+                              files. Defaults to a folder named after the
+                              run in the `limix_lsf` output folder.
+    """
+    def __init__(self, folder, specs, output_folder=None):
+        self.runid = _generate_runid()
+        self.folder = folder
+        self.specs = [str(s) for s in specs]
+        if output_folder is None:
+            output_folder = join(stdoe_folder(), self.runid)
+        self.output_folder = output_folder
+        self.odata = ''
+        self.edata = ''
+
+    @property
+    def fpath(self):
+        return join(self.folder, '%s.pkl' % self.runid)
+
+    @property
+    def mapping_fpath(self):
+        return join(self.folder, '%s.jobids' % self.runid)
+
+    @property
+    def os_jobid(self):
+        m = re.match(r'^Job <(\d+)>.*$', self.odata)
+        if m:
+            return int(m.group(1))
+        return None
+
+    def bsub_cmd(self, cmd, megabytes, nprocs=1, mkl_nthreads=1, queue=None,
+                 requests=None, name='arauto'):
+        bcmd = ['bsub', '-J', '%s[1-%d]' % (name, len(self.specs))]
+        bcmd += ['-R', 'select[%s]' % ','.join(requests or [])]
+        if megabytes is not None:
+            bcmd += ['-M', '%d' % megabytes, '-R', 'rusage[mem=1]']
+        bcmd += ['-n', '%d' % nprocs]
+        bcmd += ['-g', '/cluster/%s' % self.runid]
+        if queue:
+            bcmd += ['-q', queue]
+        bcmd += ['-o', join(self.output_folder, 'out_%I.txt')]
+        bcmd += ['-e', join(self.output_folder, 'err_%I.txt')]
+        bcmd += ['env', 'MKL_NUM_THREADS=%d' % mkl_nthreads]
+        bcmd += ['MKL_DYNAMIC=TRUE']
+        return bcmd + [str(c) for c in cmd]
+
+    def submit(self, bcmd):
+        make_sure_path_exists(self.folder)
+        make_sure_path_exists(self.output_folder)
+        with open(self.mapping_fpath, 'w') as f:
+            f.write(''.join('%s\n' % s for s in self.specs))
+        (self.odata, self.edata) = get_scheduler().submit(bcmd)
+        dump(self, self.fpath)
+        return self.os_jobid
+
+    def elements(self):
+        return [ArrayElement(self, i + 1) for i in range(len(self.specs))]
+
+    def kill(self):
+        if self.os_jobid is not None:
+            get_scheduler().kill(self.os_jobid)
+
+
+def mapped_jobids(mapping_fpath, index=None):
+    """Job IDs run by the array element `index`, which defaults to
+    LSB_JOBINDEX."""
+    from .job import parse_jobids
+    if index is None:
+        index = int(os.environ['LSB_JOBINDEX'])
+    with open(mapping_fpath) as f:
+        specs = [line.strip() for line in f if line.strip()]
+    return parse_jobids(specs[index - 1])
+
+
+_array_runs = dict()
+
+
+def load_array_run(fpath):
+    if fpath not in _array_runs:
+        _array_runs[fpath] = load(fpath)
+    return _array_runs[fpath]
+
+
+def get_element(fpath, index):
+    return ArrayElement(load_array_run(fpath), index)
+
+
+class ArrayElement(BJob):
+    """Element of a job array, behaving as a `limix_lsf` bjob."""
+    __slots__ = ['array_run', 'index']
+
+    def __init__(self, array_run, index):
+        super(ArrayElement, self).__init__(index, [])
+        self.array_run = array_run
+        self.index = index
+        self.runid = array_run.runid
+        self.odata = array_run.odata
+        self.edata = array_run.edata
+
+    @property
+    def array_fpath(self):
+        return self.array_run.fpath
+
+    def _output(self, prefix):
+        fp = join(self.array_run.output_folder,
+                  '%s_%d.txt' % (prefix, self.index))
+        try:
+            with open(fp, 'r') as f:
+                return f.read()
+        except IOError:
+            return None
+
+    def stdout(self):
+        return self._output('out')
+
+    def stderr(self):
+        return self._output('err')
+
+    @property
+    def os_jobid(self):
+        return self.array_run.os_jobid
+
+    def hassubmitted(self):
+        return self.os_jobid is not None
+
+    def stat(self):
+        if self._stat_cache:
+            return self._stat_cache
+
+        stats = get_scheduler().stats()
+        key = (self.os_jobid, self.index)
+        if key not in stats:
+            if self.hassubmitted():
+                self._stat_cache = 'DONE_OR_EXIT'
+                return self._stat_cache
+            return 'UNKNOWN'
+
+        r = stats[key]
+        if r == 'DONE' or r == 'EXIT':
+            self._stat_cache = r
+        return r
@@ -0,0 +1,138 @@
+from __future__ import absolute_import
+
+import os
+import sys
+import traceback
+from contextlib import contextmanager
+from time import time
+
+from tabulate import tabulate
+
+from ._elapsed import BeginEnd
+
+
+@contextmanager
+def _quiet():
+    # progress messages of many experiments would be interleaved; the file
+    # descriptor is redirected as some modules hold on to `sys.stdout`
+    sys.stdout.flush()
+    fd = os.dup(1)
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    try:
+        yield
+    finally:
+        sys.stdout.flush()
+        os.dup2(fd, 1)
+        os.close(fd)
+        os.close(devnull)
+
+
+def _run(operation, workspace_id, experiment_id, kwargs):
+    from .workspace import get_experiment
+    row = dict(experiment=experiment_id, error=None)
+    start = time()
+    try:
+        with _quiet():
+            e = get_experiment(workspace_id, experiment_id)
+            row.update(operation(e, **kwargs))
+    except Exception as exc:
+        row['error'] = '%s: %s' % (type(exc).__name__, exc)
+        row['traceback'] = traceback.format_exc()
+    row['elapsed'] = time() - start
+    return row
+
+
+def status(e):
+    if not e.auto_run_done:
+        return dict(setup='auto_run err')
+    if not e.tasks_setup_done:
+        return dict(setup='tasks setup err')
+    if not e.finish_setup_done:
+        return dict(setup='finish setup err')
+    row = dict(setup='successful', njobs=e.njobs, ntasks=e.ntasks)
+    row.update(e.job_status_counts())
+    return row
+
+
+def submit(e, dryrun=False, queue=None, requests=None):
+    counts = e.job_status_counts()
+    e.submit_jobs(dryrun, requests=requests, queue=queue)
+    return dict(njobs=e.njobs, submitted=e.njobs - counts['finished'])
+
+
+def collect(e):
+    ncompacted = e.compact_results()
+    index = e.error_index(rescan=True)
+    nerrors = sum(entry['count'] for entries in index.values()
+                  for entry in entries.values())
+    nresults = sum(len(trs) for trs in e.iter_task_results(batch_size=10000))
+    return dict(compacted=ncompacted, results=nresults, errors=nerrors)
+
+
+operations = dict(status=status, submit=submit, collect=collect)
+
+# submitting starts processes of its own, which the daemonic workers of a
+# pool are not allowed to have
+_serial = set(['submit'])
+
+
+def map_experiments(operation, workspace_id, experiment_ids, nprocs=None,
+                    **kwargs):
+    """Runs an operation on many experiments with a pool of processes.
+
+    Each experiment is set up in its own process, except when submitting or
+    if `nprocs` is 1, in which case experiments are run one after the other
+    in this process. Failures are reported in the returned rows instead of
+    being raised.
+
+    :param str operation: ``'status'``, ``'submit'`` or ``'collect'``.
+    :param int nprocs: number of processes. Defaults to the number of CPUs.
+    :returns: one dict per experiment, with its ``elapsed`` time and
+              ``error`` message, if any.
+    """
+    from joblib import Parallel, delayed
+    func = operations[operation]
+    if nprocs is None:
+        nprocs = -1
+    with BeginEnd('Running %s on %d experiments' %
+                  (operation, len(experiment_ids))):
+        if nprocs == 1 or operation in _serial:
+            rows = [_run(func, workspace_id, ei, kwargs)
+                    for ei in experiment_ids]
+        else:
+            rows = Parallel(n_jobs=nprocs, backend='multiprocessing')(
+                delayed(_run)(func, workspace_id, ei, kwargs)
+                for ei in experiment_ids)
+    return sorted(rows, key=lambda r: r['experiment'])
+
+
+_columns = dict(
+    status=['njobs', 'ntasks', 'waiting', 'pending', 'running', 'finished',
+            'failed', 'lost', 'pruned'],
+    submit=['njobs', 'submitted'],
+    collect=['results', 'errors', 'compacted'])
+
+
+def format_rows(operation, rows):
+    """Aggregated table of the rows of `map_experiments`, with a total line
+    and the experiments that have failed listed below it."""
+    cols = _columns[operation]
+    table = []
+    for r in rows:
+        table.append([r['experiment']] + [r.get(c, '') for c in cols] +
+                     ['%.2f' % r['elapsed']])
+
+    totals = [sum(r.get(c, 0) for r in rows if r['error'] is None)
+              for c in cols]
+    table.append(['total'] + totals + ['%.2f' % sum(r['elapsed']
+                                                    for r in rows)])
+
+    msg = tabulate(table, headers=['experiment'] + cols + ['elapsed (s)'])
+
+    errors = [r for r in rows if r['error'] is not None]
+    if len(errors) > 0:
+        msg += '\n\nFailed experiments:\n'
+        msg += '\n'.join('  %s: %s' % (r['experiment'], r['error'])
+                         for r in errors)
+    return msg
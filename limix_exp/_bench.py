@@ -0,0 +1,82 @@
+from __future__ import absolute_import
+
+import os
+from os.path import join
+from time import time
+
+import numpy as np
+from humanfriendly import format_size
+from tabulate import tabulate
+
+from ._codec import Codec, default_codec
+from ._path import temp_folder
+from ._pickle_files import dump, load, read_header
+
+
+def synthetic_task_results(ntasks, nmethods=3, array_size=0, seed=0):
+    """Task results looking like those of a typical experiment."""
+    from .task import TaskResult
+    random = np.random.RandomState(seed)
+    trs = []
+    for i in range(ntasks):
+        tr = TaskResult('workspace', 'experiment', i)
+        for j in range(nmethods):
+            m = 'method%d' % j
+            tr.set_elapsed(m, random.exponential())
+            failed = random.rand() < 0.1
+            tr.set_error_status(m, int(failed))
+            tr.set_error_msg(m, 'Singular matrix.' if failed else '')
+            if array_size > 0:
+                tr.set_array(m, 'beta', random.randn(array_size))
+        trs.append(tr)
+    return {tr.task_id: tr for tr in trs}
+
+
+def bench_io(ntasks=10000, array_size=0, codecs=None, repeat=3):
+    """Measures write and read throughput and file size of synthetic task
+    results stored with each codec.
+
+    :param int ntasks: number of task results stored in a file.
+    :param int array_size: length of an array attached to each method.
+    :param list codecs: :class:`Codec` instances. Defaults to the
+                        configured codec, no compression and every blosc
+                        compressor.
+    :returns: a list of rows ``(codec, size, write MB/s, read MB/s)``.
+              Throughputs are of uncompressed data, so that codecs that
+              compress better are not penalised.
+    """
+    if codecs is None:
+        import blosc
+        codecs = [default_codec(), Codec('none')]
+        codecs += [Codec(c) for c in blosc.compressor_list()
+                   if c != codecs[0].codec]
+
+    obj = synthetic_task_results(ntasks, array_size=array_size)
+
+    rows = []
+    with temp_folder() as folder:
+        fp = join(folder, 'bench.pkl')
+        for codec in codecs:
+            wtime = _best(lambda: dump(obj, fp, codec), repeat)
+            size = os.path.getsize(fp)
+            payload = sum(h['size'] for h in read_header(fp)['frames'])
+            rtime = _best(lambda: load(fp), repeat)
+            rows.append((codec.name, size, payload / wtime / 1e6,
+                         payload / rtime / 1e6))
+    return rows
+
+
+def _best(func, repeat):
+    elapsed = []
+    for _ in range(repeat):
+        start = time()
+        func()
+        elapsed.append(time() - start)
+    return min(elapsed)
+
+
+def format_bench_io(rows):
+    table = [(c, format_size(s), '%.1f' % w, '%.1f' % r)
+             for (c, s, w, r) in rows]
+    return tabulate(
+        table, headers=['Codec', 'Size', 'Write (MB/s)', 'Read (MB/s)'])
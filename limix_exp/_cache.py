@@ -0,0 +1,161 @@
+from __future__ import absolute_import
+
+import sys
+from collections import defaultdict
+from itertools import islice
+
+from cachetools import LRUCache
+from humanfriendly import format_size, parse_size
+from tabulate import tabulate
+
+from .config import conf
+
+_default_max_size = '2 GB'
+
+
+def estimate_size(obj, _depth=0, _sample=64):
+    """Rough size in bytes of an object and of what it refers to.
+
+    Only a sample of the items of large containers is measured, and the
+    result is extrapolated.
+    """
+    import numpy as np
+
+    if isinstance(obj, np.ndarray):
+        # accounts for the data only if the array owns it, so neither views
+        # nor memory-mapped files are counted
+        return sys.getsizeof(obj)
+
+    size = sys.getsizeof(obj)
+    if _depth > 6:
+        return size
+
+    if isinstance(obj, dict):
+        items = list(islice(obj.items(), _sample))
+        sub = sum(
+            estimate_size(k, _depth + 1) + estimate_size(v, _depth + 1)
+            for (k, v) in items)
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        items = list(islice(obj, _sample))
+        sub = sum(estimate_size(v, _depth + 1) for v in items)
+    elif isinstance(obj, (str, bytes, int, float, bool, type(None))):
+        return size
+    else:
+        attrs = []
+        if hasattr(obj, '__dict__'):
+            attrs += list(vars(obj).values())
+        for cls in type(obj).__mro__:
+            for slot in getattr(cls, '__slots__', []):
+                if hasattr(obj, slot):
+                    attrs.append(getattr(obj, slot))
+        return size + sum(estimate_size(v, _depth + 1) for v in attrs)
+
+    if len(items) == 0:
+        return size
+    return size + int(sub * len(obj) / float(len(items)))
+
+
+class _Entry(object):
+    __slots__ = ['value', 'size']
+
+    def __init__(self, value, size):
+        self.value = value
+        self.size = size
+
+
+class CacheManager(object):
+    """Least-recently-used cache of loaded objects bounded by their total
+    estimated size.
+
+    Objects are grouped by kind (tasks, results, jobs, datasets) for
+    introspection, but share the same budget. Only data that can be loaded
+    again belongs here: workspaces and experiments carry state set up at run
+    time and are kept apart for as long as the process lives.
+
+    An object that alone exceeds the budget is kept outside of it, as the
+    only large object of its kind, until another one replaces it. Otherwise
+    it would be loaded again on every access.
+
+    :param int max_size: budget in bytes.
+    """
+    def __init__(self, max_size):
+        self._cache = LRUCache(maxsize=max_size, getsizeof=lambda e: e.size)
+        self._large = dict()
+
+    @property
+    def max_size(self):
+        return self._cache.maxsize
+
+    @property
+    def size(self):
+        return self._cache.currsize + sum(
+            e.size for (_, e) in self._large.values())
+
+    def get(self, kind, key, default=None):
+        entry = self._cache.get((kind, key))
+        if entry is None and kind in self._large and\
+                self._large[kind][0] == key:
+            entry = self._large[kind][1]
+        if entry is None:
+            return default
+        return entry.value
+
+    def put(self, kind, key, value, size=None):
+        """Caches `value`, replacing the large object of its kind if it
+        alone exceeds the budget."""
+        if size is None:
+            size = estimate_size(value)
+        self._cache.pop((kind, key), None)
+        if kind in self._large and self._large[kind][0] == key:
+            del self._large[kind]
+        if size > self.max_size:
+            self._large[kind] = (key, _Entry(value, size))
+            return
+        self._cache[(kind, key)] = _Entry(value, size)
+
+    def get_or_load(self, kind, key, load):
+        value = self.get(kind, key)
+        if value is None:
+            value = load()
+            self.put(kind, key, value)
+        return value
+
+    def invalidate(self, kind, key=None):
+        """Removes an entry, or every entry of a kind if `key` is ``None``."""
+        for k in list(self._cache.keys()):
+            if k[0] == kind and (key is None or k[1] == key):
+                del self._cache[k]
+        if kind in self._large and (key is None or
+                                    self._large[kind][0] == key):
+            del self._large[kind]
+
+    def clear(self):
+        self._cache.clear()
+        self._large.clear()
+
+    def entries(self):
+        """``(kind, key, size)`` of each entry."""
+        entries = [(k[0], k[1], e.size) for (k, e) in self._cache.items()]
+        return entries + [(kind, key, e.size)
+                          for (kind, (key, e)) in self._large.items()]
+
+    def info(self):
+        """Number of entries and their size per kind."""
+        counts = defaultdict(int)
+        sizes = defaultdict(int)
+        for (kind, _, size) in self.entries():
+            counts[kind] += 1
+            sizes[kind] += size
+        table = [[k, counts[k], format_size(sizes[k])] for k in sorted(counts)]
+        table.append(['total', sum(counts.values()), format_size(self.size)])
+        msg = tabulate(table, headers=['kind', '# entries', 'size'])
+        return msg + '\nBudget: %s' % format_size(self.max_size)
+
+
+def _max_size():
+    if conf.has_option('cache', 'max_size'):
+        return parse_size(conf.get('cache', 'max_size'))
+    return parse_size(_default_max_size)
+
+
+cache_manager = CacheManager(_max_size())
@@ -0,0 +1,114 @@
+from __future__ import absolute_import
+
+import blosc
+
+from .config import conf
+
+_shuffles = {
+    'none': blosc.NOSHUFFLE,
+    'byte': blosc.SHUFFLE,
+    'bit': blosc.BITSHUFFLE
+}
+
+_defaults = dict(
+    codec='blosclz', level=5, nthreads=1, shuffle='byte', min_size=4096)
+
+
+class Codec(object):
+    """Compression settings of stored pickle files.
+
+    They are read from the ``[storage]`` section of the configuration file::
+
+        [storage]
+        codec = zstd
+        level = 3
+        nthreads = 4
+        shuffle = bit
+        min_size = 4096
+
+    `codec` is either ``none`` or one of the blosc compressors. Frames
+    smaller than `min_size` bytes are stored uncompressed.
+    """
+    def __init__(self, codec=None, level=None, nthreads=None, shuffle=None,
+                 min_size=None):
+        self.codec = _defaults['codec'] if codec is None else codec
+        self.level = _defaults['level'] if level is None else int(level)
+        self.nthreads = (_defaults['nthreads']
+                         if nthreads is None else int(nthreads))
+        self.shuffle = _defaults['shuffle'] if shuffle is None else shuffle
+        self.min_size = (_defaults['min_size']
+                         if min_size is None else int(min_size))
+
+        if self.codec != 'none' and\
+                self.codec not in blosc.compressor_list():
+            raise ValueError("Unknown codec %s. Please, use none or one of %s."
+                             % (self.codec, blosc.compressor_list()))
+        if self.shuffle not in _shuffles:
+            raise ValueError("Unknown shuffle %s. Please, use one of %s." %
+                             (self.shuffle, sorted(_shuffles)))
+
+    @property
+    def name(self):
+        if self.codec == 'none':
+            return 'none'
+        return '%s:%d:%s' % (self.codec, self.level, self.shuffle)
+
+    def compress(self, data, typesize=8):
+        """Compresses `data` into a list of blosc chunks, or returns
+        ``None`` if it is not worth compressing."""
+        if self.codec == 'none' or len(data) < self.min_size:
+            return None
+        blosc.set_nthreads(self.nthreads)
+        chunks = []
+        for s in range(0, len(data), blosc.MAX_BUFFERSIZE):
+            e = min(s + blosc.MAX_BUFFERSIZE, len(data))
+            chunks.append(
+                blosc.compress(data[s:e], typesize=typesize,
+                               clevel=self.level,
+                               shuffle=_shuffles[self.shuffle],
+                               cname=self.codec))
+        return chunks
+
+    def decompress_into(self, chunks, address, size):
+        """Decompresses blosc chunks into the `size` bytes of memory at
+        `address`.
+
+        :raises ValueError: if the chunks do not decompress into exactly
+                            `size` bytes.
+        """
+        blosc.set_nthreads(self.nthreads)
+        pos = 0
+        for c in chunks:
+            nbytes = blosc.get_cbuffer_sizes(c)[0]
+            if pos + nbytes > size:
+                raise ValueError('Chunks decompress into more than %d'
+                                 ' bytes.' % size)
+            pos += blosc.decompress_ptr(c, address + pos)
+        if pos != size:
+            raise ValueError('Chunks decompress into %d bytes instead of %d.'
+                             % (pos, size))
+        return pos
+
+    @classmethod
+    def from_name(cls, name, **kwargs):
+        """Codec of a `name` as recorded in stored files, e.g.
+        ``'zstd:3:bit'``."""
+        if name == 'none':
+            return cls('none', **kwargs)
+        (codec, level, shuffle) = name.split(':')
+        return cls(codec, level, shuffle=shuffle, **kwargs)
+
+    def __repr__(self):
+        return 'Codec(%s)' % self.name
+
+
+def _option(name):
+    if conf.has_option('storage', name):
+        return conf.get('storage', name)
+    return None
+
+
+def default_codec():
+    """Codec configured in the ``[storage]`` section."""
+    names = ['codec', 'level', 'nthreads', 'shuffle', 'min_size']
+    return Codec(**{n: _option(n) for n in names})
@@ -0,0 +1,69 @@
+from __future__ import absolute_import
+
+import os
+from time import time
+
+import numpy as np
+
+from ._cache import cache_manager
+
+
+class DatasetCache(object):
+    """Datasets loaded by this process, kept for the following tasks.
+
+    NumPy ``.npy`` files are memory-mapped read-only, so that processes of
+    the same host share their pages through the page cache instead of each
+    holding a copy. Other files are read by a user-given loader. A dataset
+    is loaded again if its file has been modified since.
+
+    Datasets are kept in a :class:`.CacheManager`, the process-wide one by
+    default, so that they share its budget with other loaded objects and
+    the least recently used are dropped first. Memory-mapped arrays hold
+    no memory of their own and barely count against the budget.
+    """
+    def __init__(self, cache=None):
+        self._cache = cache_manager if cache is None else cache
+        self.hits = 0
+        self.misses = 0
+        self.load_time = 0.
+
+    def load(self, fpath, loader=None):
+        """Dataset stored in `fpath`.
+
+        :param callable loader: function reading `fpath`. Defaults to a
+                                memory-mapped ``np.load``.
+        """
+        mtime = os.stat(fpath).st_mtime
+        key = (fpath, loader)
+        entry = self._cache.get('datasets', key)
+        if entry is not None and entry[0] == mtime:
+            self.hits += 1
+            return entry[1]
+
+        start = time()
+        if loader is None:
+            data = np.load(fpath, mmap_mode='r')
+        else:
+            data = loader(fpath)
+        self.load_time += time() - start
+        self.misses += 1
+
+        self._cache.put('datasets', key, (mtime, data))
+        return data
+
+    def stats(self):
+        return dict(hits=self.hits, misses=self.misses,
+                    load_time=self.load_time)
+
+    def clear(self):
+        self._cache.invalidate('datasets')
+
+
+dataset_cache = DatasetCache()
+
+
+def store_dataset(fpath, array):
+    """Stores an array as a ``.npy`` file that can be memory-mapped."""
+    tmp = fpath + '.tmp.npy'
+    np.save(tmp, np.ascontiguousarray(array))
+    os.rename(tmp, fpath)
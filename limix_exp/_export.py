@@ -0,0 +1,183 @@
+from __future__ import absolute_import
+
+from os.path import splitext
+
+import numpy as np
+
+from ._iter import batches
+from .task import _get_resource
+
+_formats = {
+    '.parquet': 'parquet',
+    '.arrow': 'arrow',
+    '.feather': 'arrow',
+    '.h5': 'hdf5',
+    '.hdf5': 'hdf5'
+}
+
+
+def export_format(fpath):
+    """Guesses the export format from the file extension."""
+    ext = splitext(fpath)[1].lower()
+    if ext not in _formats:
+        raise ValueError("Unknown export format for %s. Please, use one of"
+                         " the extensions %s." % (fpath, sorted(_formats)))
+    return _formats[ext]
+
+
+def export_task_results(tasks, arg_names, task_results, fpath, fmt=None,
+                        chunk_size=100000):
+    """Writes task arguments joined with result columns to a columnar file.
+
+    Task results are read twice: once to find every method, and once more
+    `chunk_size` at a time so that only one chunk of rows is held in
+    memory. Every chunk has the same columns and types.
+
+    :param dict tasks: tasks indexed by task ID.
+    :param list arg_names: names of the task arguments to export.
+    :param callable task_results: function returning a new iterable of task
+                                  results at each call.
+    :param str fpath: destination file path.
+    :param str fmt: ``'parquet'``, ``'arrow'`` or ``'hdf5'``. Guessed from
+                    the file extension by default.
+    :returns: the number of rows written.
+    """
+    if fmt is None:
+        fmt = export_format(fpath)
+
+    methods = set()
+    for tr in task_results():
+        methods.update(tr.methods)
+    methods = sorted(methods)
+    dtypes = {a: _arg_dtype(tasks, a) for a in arg_names}
+
+    writer = {
+        'parquet': _ParquetWriter,
+        'arrow': _ArrowWriter,
+        'hdf5': _HDF5Writer
+    }[fmt](fpath)
+
+    nrows = 0
+    try:
+        for chunk in batches(task_results(), chunk_size):
+            writer.write(_columns(tasks, arg_names, dtypes, methods, chunk))
+            nrows += len(chunk)
+    finally:
+        writer.close()
+
+    return nrows
+
+
+def _arg_dtype(tasks, name):
+    # taken over every task, as chunks may see e.g. ints only while others
+    # have floats
+    values = np.asarray([getattr(t, name) for t in tasks.values()])
+    if values.dtype.kind not in 'biuf':
+        return np.dtype(object)
+    return values.dtype
+
+
+def _float(v):
+    return float('nan') if v is None else float(v)
+
+
+def _columns(tasks, arg_names, dtypes, methods, task_results):
+    cols = [('task_id', np.asarray([tr.task_id for tr in task_results]))]
+
+    for a in arg_names:
+        values = [getattr(tasks[tr.task_id], a) for tr in task_results]
+        if dtypes[a] == object:
+            values = np.asarray([str(v) for v in values], object)
+        else:
+            values = np.asarray(values, dtypes[a])
+        cols.append((a, values))
+
+    totals = ['total_elapsed', 'total_cpu_time', 'total_peak_memory']
+    for t in totals:
+        values = [_float(getattr(tr, t, None)) for tr in task_results]
+        cols.append((t, np.asarray(values, float)))
+
+    measures = [('elapsed', '_elapsed'), ('cpu_time', '_cpu_time'),
+                ('peak_memory', '_peak_memory')]
+    for m in methods:
+        for (name, attr) in measures:
+            values = [_float(_get_resource(tr, attr, m))
+                      for tr in task_results]
+            cols.append(('%s_%s' % (name, m), np.asarray(values, float)))
+
+        values = [_get_resource(tr, '_error_status', m) for tr in task_results]
+        values = [-1 if v is None else v for v in values]
+        cols.append(('error_status_%s' % m, np.asarray(values, int)))
+
+    return cols
+
+
+def _arrow_table(cols):
+    import pyarrow as pa
+    names = [c[0] for c in cols]
+    arrays = [pa.array(list(c[1]) if c[1].dtype == object else c[1])
+              for c in cols]
+    return pa.Table.from_arrays(arrays, names=names)
+
+
+class _ParquetWriter(object):
+    def __init__(self, fpath):
+        self._fpath = fpath
+        self._writer = None
+
+    def write(self, cols):
+        import pyarrow.parquet as pq
+        table = _arrow_table(cols)
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self._fpath, table.schema)
+        self._writer.write_table(table)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+class _ArrowWriter(object):
+    def __init__(self, fpath):
+        self._fpath = fpath
+        self._sink = None
+        self._writer = None
+
+    def write(self, cols):
+        import pyarrow as pa
+        table = _arrow_table(cols)
+        if self._writer is None:
+            self._sink = pa.OSFile(self._fpath, 'wb')
+            self._writer = pa.ipc.new_file(self._sink, table.schema)
+        self._writer.write_table(table)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._sink.close()
+
+
+class _HDF5Writer(object):
+    def __init__(self, fpath):
+        import h5py
+        self._file = h5py.File(fpath, 'w')
+        self._group = self._file.create_group('results')
+
+    def write(self, cols):
+        import h5py
+        for (name, values) in cols:
+            if values.dtype == object:
+                dtype = h5py.special_dtype(vlen=str)
+            else:
+                dtype = values.dtype
+            if name not in self._group:
+                self._group.create_dataset(
+                    name, shape=(0, ), maxshape=(None, ), dtype=dtype,
+                    chunks=True)
+            ds = self._group[name]
+            n = ds.shape[0]
+            ds.resize((n + len(values), ))
+            ds[n:] = values
+
+    def close(self):
+        self._file.close()
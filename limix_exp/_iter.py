@@ -0,0 +1,21 @@
+from __future__ import absolute_import
+
+
+def batches(iterable, size):
+    """Groups the items of `iterable` into lists of at most `size` items."""
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if len(batch) > 0:
+        yield batch
+
+
+def maybe_batches(iterable, size):
+    """Same as :func:`batches` but yields single items if `size` is
+    ``None``."""
+    if size is None:
+        return iter(iterable)
+    return batches(iterable, size)
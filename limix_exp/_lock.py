@@ -0,0 +1,53 @@
+from __future__ import absolute_import
+
+import errno
+import fcntl
+import os
+
+
+class FileLock(object):
+    """Exclusive lock on a file shared by processes of different hosts.
+
+    POSIX record locks (``fcntl.lockf``) are used because, unlike
+    ``flock``, they are honoured over NFS.
+
+    :param str fpath: lock file path. It is created if necessary and never
+                      removed.
+    """
+    def __init__(self, fpath):
+        self.fpath = fpath
+        self._fd = None
+
+    def acquire(self, blocking=True):
+        """Acquires the lock, returning ``False`` if it is held by another
+        process and `blocking` is ``False``."""
+        fd = os.open(self.fpath, os.O_RDWR | os.O_CREAT, 0o666)
+        flags = fcntl.LOCK_EX
+        if not blocking:
+            flags |= fcntl.LOCK_NB
+        try:
+            fcntl.lockf(fd, flags)
+        except (IOError, OSError) as e:
+            os.close(fd)
+            if e.errno in (errno.EACCES, errno.EAGAIN):
+                return False
+            raise
+        self._fd = fd
+        return True
+
+    def release(self):
+        if self._fd is not None:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+
+    @property
+    def locked(self):
+        return self._fd is not None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *args):
+        self.release()
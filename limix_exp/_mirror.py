@@ -0,0 +1,145 @@
+from __future__ import absolute_import
+
+import errno
+import os
+import shutil
+import uuid
+import zlib
+from os.path import basename, dirname, exists, join, relpath
+
+from humanfriendly import format_size
+from tabulate import tabulate
+
+from ._path import make_sure_path_exists
+
+# Files that are rebuilt locally or only matter to the processes of the
+# source host: merge caches, locks, temporary files of atomic writes and
+# job files being removed by a compaction.
+_excluded = set(['all.pkl', '.folder_hash', '.merge.lock', '.compact.lock',
+                 '.job_states.lock'])
+
+
+def _excluded_file(name):
+    return (name in _excluded or name.endswith('.tmp') or
+            name.endswith('.compacted'))
+
+
+def _files(folder, recursive=True):
+    """Relative paths of the files of `folder`."""
+    files = []
+    for (root, dirs, names) in os.walk(folder):
+        if recursive:
+            dirs[:] = [d for d in dirs if not d.startswith('.')]
+        else:
+            dirs[:] = []
+        files += [relpath(join(root, n), folder) for n in names
+                  if not _excluded_file(n)]
+    return files
+
+
+def _crc32(fpath, chunk=1 << 20):
+    crc = 0
+    with open(fpath, 'rb') as f:
+        for data in iter(lambda: f.read(chunk), b''):
+            crc = zlib.crc32(data, crc)
+    return crc & 0xffffffff
+
+
+def _uptodate(src, dst, checksum):
+    """Whether `dst` is up to date, or ``None`` if `src` has disappeared."""
+    try:
+        s = os.stat(src)
+    except OSError as e:
+        if e.errno != errno.ENOENT:
+            raise
+        return None
+    if not exists(dst):
+        return False
+    d = os.stat(dst)
+    if s.st_size != d.st_size:
+        return False
+    if checksum:
+        return _crc32(src) == _crc32(dst)
+    return int(s.st_mtime) == int(d.st_mtime)
+
+
+def _copy(src, dst):
+    """Copies `src` and returns its size, or ``None`` if `src` has
+    disappeared (e.g. removed by a compaction)."""
+    make_sure_path_exists(dirname(dst))
+    tmp = join(dirname(dst), '.%s.%s.tmp' % (os.path.basename(dst),
+                                             uuid.uuid4().hex))
+    try:
+        shutil.copy2(src, tmp)
+    except (IOError, OSError) as e:
+        if exists(tmp):
+            os.remove(tmp)
+        if e.errno != errno.ENOENT:
+            raise
+        return None
+    os.rename(tmp, dst)
+    return os.path.getsize(dst)
+
+
+def mirror(src, dst, nworkers=4, checksum=False, delete=True,
+           recursive=True):
+    """Copies the files of folder `src` that are new or have changed into
+    folder `dst`, like ``rsync -a``.
+
+    Files are compared by size and modification time, or by size and
+    checksum. Each file is copied to a temporary file and renamed, so that
+    readers of the mirror never see partial files. Shard indices are copied
+    last, once the shards they refer to are in place, and files removed
+    from `src` during the copy are skipped.
+
+    :param int nworkers: number of copying threads.
+    :param bool checksum: compares the content of files of equal size
+                          instead of their modification time.
+    :param bool delete: removes the files of `dst` that are not in `src`
+                        anymore, e.g. result files merged by compaction.
+    :param bool recursive: mirrors subfolders as well.
+    :returns: a dict with the number of ``copied``, ``unchanged`` and
+              ``deleted`` files and the number of copied ``bytes``.
+    """
+    from joblib import Parallel, delayed
+
+    def copy(files):
+        return Parallel(n_jobs=nworkers, backend='threading')(
+            delayed(_copy)(join(src, f), join(dst, f)) for f in files)
+
+    listed = _files(src, recursive)
+    uptodate = dict(
+        (f, _uptodate(join(src, f), join(dst, f), checksum)) for f in listed)
+    todo = [f for f in listed if uptodate[f] is False]
+
+    sizes = dict()
+    data = [f for f in todo if basename(f) != 'index.pkl']
+    sizes.update(zip(data, copy(data)))
+
+    # files written meanwhile, such as the shards of a compaction, are
+    # copied before the indices that may refer to them
+    late = [f for f in _files(src, recursive) if f not in uptodate]
+    data = [f for f in late if basename(f) != 'index.pkl']
+    sizes.update(zip(data, copy(data)))
+    indices = [f for f in todo + late if basename(f) == 'index.pkl']
+    sizes.update(zip(indices, copy(indices)))
+
+    copied = dict((f, n) for (f, n) in sizes.items() if n is not None)
+    unchanged = [f for f in listed if uptodate[f]]
+
+    deleted = 0
+    if delete and exists(dst):
+        for f in set(_files(dst, recursive)) - set(unchanged) - set(copied):
+            os.remove(join(dst, f))
+            deleted += 1
+
+    return dict(copied=len(copied), unchanged=len(unchanged),
+                deleted=deleted, bytes=sum(copied.values()))
+
+
+def format_stats(rows):
+    """Table of the `mirror` statistics of each ``(name, stats)`` pair."""
+    table = [[n, s['copied'], s['unchanged'], s['deleted'],
+              format_size(s['bytes'])] for (n, s) in rows]
+    return tabulate(table, headers=['folder', 'copied', 'unchanged',
+                                    'deleted', 'size'])
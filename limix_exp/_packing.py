@@ -0,0 +1,35 @@
+from __future__ import absolute_import
+
+import heapq
+
+
+def lpt_assignment(costs, nbins):
+    """Assigns items to bins using the longest-processing-time heuristic.
+
+    Items are taken in decreasing order of cost and each one is put in the
+    bin with the smallest total cost so far.
+
+    :param list costs: cost of each item.
+    :param int nbins: number of bins.
+    :returns: a list of `nbins` sorted lists of item indices.
+    """
+    order = sorted(range(len(costs)), key=lambda i: costs[i], reverse=True)
+
+    heap = [(0., b) for b in range(nbins)]
+    bins = [[] for _ in range(nbins)]
+    for i in order:
+        (load, b) = heapq.heappop(heap)
+        bins[b].append(i)
+        heapq.heappush(heap, (load + costs[i], b))
+
+    return [sorted(b) for b in bins]
+
+
+def fill_unknown_costs(costs):
+    """Replaces unknown costs (``None`` or NaN) by the mean of known ones."""
+    known = [c for c in costs if c is not None and c == c]
+    if len(known) == 0:
+        default = 1.
+    else:
+        default = sum(known) / float(len(known))
+    return [c if c is not None and c == c else default for c in costs]
@@ -3,18 +3,106 @@ from __future__ import print_function
 import contextlib
 import errno
 import hashlib
+import os
 import shutil
 import subprocess
+import sys
 import tempfile
+import uuid
 from distutils.spawn import find_executable
-from os import makedirs, utime, system
-from os.path import basename
+from multiprocessing.pool import ThreadPool
+from os import makedirs, utime
+from os.path import basename, isdir, islink, join, lexists
 from sys import stderr
 
+from tqdm import tqdm
+
 from ._elapsed import BeginEnd
 
-def rmtree(folder):
-    system("rm -rf %s" % folder)
+
+def rmtree(folder, nthreads=16, verbose=False, batch_size=4096):
+    """Removes a folder recursively, deleting its files with a pool of
+    threads.
+
+    The tree is walked bottom-up and its files are deleted in batches of
+    `batch_size`, so that memory does not grow with the number of files.
+    Symbolic links are removed, never followed.
+
+    :param str folder: folder path.
+    :param int nthreads: number of threads deleting files.
+    :param bool verbose: shows a progress bar.
+    """
+    if not lexists(folder):
+        return
+
+    if islink(folder) or not isdir(folder):
+        _remove(folder)
+        return
+
+    files = []
+    dirs = []
+    pool = ThreadPool(nthreads)
+    progress = tqdm(desc='Removing %s' % folder, unit='files',
+                    disable=not verbose)
+
+    def flush():
+        for _ in pool.imap_unordered(_remove, files, chunksize=64):
+            progress.update()
+        # subfolders come before their parents
+        for dir_ in dirs:
+            _rmdir(dir_)
+        del files[:]
+        del dirs[:]
+
+    try:
+        for (dir_, subdirs, fnames) in os.walk(folder, topdown=False):
+            files += [join(dir_, f) for f in fnames]
+            files += [join(dir_, d) for d in subdirs if islink(join(dir_, d))]
+            dirs.append(dir_)
+            if len(files) >= batch_size or len(dirs) >= batch_size:
+                flush()
+        flush()
+    finally:
+        pool.close()
+        pool.join()
+        progress.close()
+
+
+def _rmdir(folder):
+    try:
+        os.rmdir(folder)
+    except OSError as e:
+        if e.errno != errno.ENOENT:
+            raise
+
+
+def rmtree_background(folder, trash_folder):
+    """Moves a folder into `trash_folder` and removes it from there in a
+    background process, returning immediately.
+
+    `trash_folder` must be in the same file system as `folder`.
+    """
+    if not lexists(folder):
+        return
+
+    make_sure_path_exists(trash_folder)
+    dst = join(trash_folder, '%s-%s' % (basename(folder), uuid.uuid4().hex))
+    os.rename(folder, dst)
+
+    code = ('import sys; from limix_exp._path import rmtree;'
+            ' rmtree(sys.argv[1])')
+    with open(os.devnull, 'w') as devnull:
+        subprocess.Popen([sys.executable, '-c', code, dst], stdout=devnull,
+                         stderr=devnull, close_fds=True)
+
+
+def _remove(fpath):
+    try:
+        os.remove(fpath)
+    except OSError as e:
+        if e.errno != errno.ENOENT:
+            raise
+
 
 @contextlib.contextmanager
 def temp_folder():
@@ -50,27 +138,48 @@ def touch(fname, times=None):
 
 
 def folder_hash(folder, exclude_files=None):
-    """Recursively hash all files in a folder and sum it up."""
+    """Recursively hash all files in a folder and sum it up.
+
+    Uses md5deep if available and falls back to hashing the files in
+    Python otherwise; both give the same digest.
+    """
     if exclude_files is None:
         exclude_files = []
 
-    if not _bin_exists('md5deep'):
-        raise EnvironmentError("Couldn't not find md5deep.")
-
     with BeginEnd("Hashing folder %s" % folder):
-        out = subprocess.check_output('md5deep -r %s' % folder, shell=True)
-
-    lines = sorted(out.strip(b'\n').split(b'\n'))
+        if _bin_exists('md5deep'):
+            out = subprocess.check_output('md5deep -r %s' % folder,
+                                          shell=True)
+            lines = out.strip(b'\n').split(b'\n')
+            hashes = [(l[0:32], l[34:].decode('utf-8', 'replace'))
+                      for l in lines if len(l) > 0]
+        else:
+            hashes = _md5_files(folder)
 
     m = hashlib.md5()
-    for line in lines:
-        hash_ = line[0:32]
-        fp = line[34:]
+    for (hash_, fp) in sorted(hashes):
         if basename(fp) not in exclude_files:
             m.update(hash_)
     return m.hexdigest()
 
 
+def _md5_files(folder, block_size=1024 * 1024):
+    """Lists the hexadecimal md5 digest (as bytes) and path of every file
+    under `folder`, like ``md5deep -r`` does."""
+    hashes = []
+    for (dir_, _, fnames) in os.walk(folder):
+        for fname in fnames:
+            fp = join(dir_, fname)
+            if not os.path.isfile(fp):
+                continue
+            m = hashlib.md5()
+            with open(fp, 'rb') as f:
+                for block in iter(lambda: f.read(block_size), b''):
+                    m.update(block)
+            hashes.append((m.hexdigest().encode('ascii'), fp))
+    return hashes
+
+
 def _bin_exists(name):
     """Checks whether an executable file exists."""
     return find_executable(name) is not None
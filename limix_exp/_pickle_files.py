@@ -1,26 +1,269 @@
 from __future__ import absolute_import
 
 import collections
+import json
+import logging
+import os
+import pickle as pkl
+import struct
+import uuid
+import zlib
 from os import listdir, walk
-from os.path import basename, isdir, join
+from os.path import basename, dirname, isdir, join, relpath
 
-from pickle_blosc import pickle, unpickle
+import blosc
+import numpy as np
+from pickle_blosc import unpickle
 from tqdm import tqdm
 
+from ._codec import Codec, default_codec
 from ._elapsed import BeginEnd
 from ._path import cp, folder_hash, make_sure_path_exists, temp_folder
 
 
+# File layout written by `dump`:
+#
+#   magic | header size (uint64) | JSON header | padding | frames
+#
+# The first frame is the pickle stream. With pickle protocol 5, each
+# following frame is the raw memory of an out-of-band buffer, such as the
+# data of a NumPy array. A frame is stored as a sequence of blosc chunks or,
+# if it is small or does not compress well, as raw bytes aligned to
+# `_ALIGNMENT`. On request, raw frames of at least `_MMAP_MIN_SIZE` bytes
+# are memory-mapped by `load`. Frames are read into memory otherwise, as
+# every memory map holds a file descriptor for as long as it lives. The header
+# records the codec used and the CRC32 checksum of each stored frame. Files
+# without the magic prefix are plain `pickle_blosc` files.
+#
+# Files are written to a temporary file of the same folder and then renamed,
+# so that readers never see a partially written file.
+#
+# The package supports Python 2.7 and 3. Pickle protocol 5 is only used
+# where available (Python >= 3.8); elsewhere objects are pickled in-band
+# into a single frame, which any version can read back.
+_MAGIC = b'LXEXPPK1'
+_ALIGNMENT = 64
+_MIN_RATIO = 0.9
+_MMAP_MIN_SIZE = 1 << 20
+_OUT_OF_BAND = pkl.HIGHEST_PROTOCOL >= 5
+
+
+class CorruptFileError(ValueError):
+    """Raised when a stored file is truncated or fails its checksum."""
+    def __init__(self, fpath, reason):
+        super(CorruptFileError, self).__init__(
+            'File %s is corrupt: %s.' % (fpath, reason))
+        self.fpath = fpath
+
+
+def _align(n):
+    return (n + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+
+
+def dump(obj, fpath, codec=None):
+    """Pickles `obj` into `fpath` storing large buffers out-of-band.
+
+    :param codec: :class:`Codec` to use. Defaults to the configured one.
+    """
+    if codec is None:
+        codec = default_codec()
+
+    if _OUT_OF_BAND:
+        buffers = []
+        data = pkl.dumps(obj, protocol=5, buffer_callback=buffers.append)
+        frames = [memoryview(data)] + [b.raw() for b in buffers]
+    else:
+        frames = [pkl.dumps(obj, -1)]
+
+    metas = []
+    payloads = []
+    offset = 0
+    for frame in frames:
+        # frames are bytes or byte-formatted views, so their length is
+        # their size in bytes
+        size = len(frame)
+        chunks = codec.compress(frame)
+        clen = None if chunks is None else sum(len(c) for c in chunks)
+        if clen is not None and clen < _MIN_RATIO * size:
+            metas.append(dict(offset=offset, size=size,
+                              chunks=[len(c) for c in chunks],
+                              crc=_crc32(chunks)))
+            payloads.append(chunks)
+            offset += clen
+        else:
+            offset = _align(offset)
+            metas.append(dict(offset=offset, size=size, chunks=None,
+                              crc=_crc32([frame])))
+            payloads.append([frame])
+            offset += size
+
+    header = dict(codec=codec.name, min_size=codec.min_size, frames=metas)
+    header = json.dumps(header).encode('utf-8')
+    start = _align(len(_MAGIC) + 8 + len(header))
+
+    tmp = join(dirname(fpath), '.%s.%s.tmp' % (basename(fpath),
+                                               uuid.uuid4().hex))
+    try:
+        with open(tmp, 'wb') as f:
+            f.write(_MAGIC)
+            f.write(struct.pack('<Q', len(header)))
+            f.write(header)
+            for (meta, payload) in zip(metas, payloads):
+                f.write(b'\0' * (start + meta['offset'] - f.tell()))
+                for p in payload:
+                    f.write(p)
+            f.flush()
+            os.fsync(f.fileno())
+        os.rename(tmp, fpath)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def _crc32(payload):
+    crc = 0
+    for p in payload:
+        crc = zlib.crc32(p, crc)
+    return crc & 0xffffffff
+
+
+def read_header(fpath):
+    """Header of a file stored by `dump`, or ``None`` for other files."""
+    with open(fpath, 'rb') as f:
+        if f.read(len(_MAGIC)) != _MAGIC:
+            return None
+        (size, ) = struct.unpack('<Q', f.read(8))
+        return json.loads(f.read(size).decode('utf-8'))
+
+
+def load(fpath, mmap=False):
+    """Unpickles an object stored by `dump` or by `pickle_blosc.pickle`.
+
+    Frames are read or decompressed straight into their final buffer, so
+    that NumPy arrays are built on top of them without further copies.
+
+    :param bool mmap: memory-maps (copy-on-write) large frames stored
+                      uncompressed instead of reading them. Each mapped
+                      frame holds a file descriptor while it lives.
+    :raises CorruptFileError: if the file is truncated or any of its frames
+                              fails its checksum.
+    """
+    with open(fpath, 'rb') as f:
+        if f.read(len(_MAGIC)) != _MAGIC:
+            return _load_legacy(fpath)
+        try:
+            (size, ) = struct.unpack('<Q', f.read(8))
+            header = json.loads(f.read(size).decode('utf-8'))
+            codec = Codec.from_name(header['codec'],
+                                    nthreads=default_codec().nthreads)
+        except (struct.error, ValueError, KeyError):
+            raise CorruptFileError(fpath, 'unreadable header')
+        start = _align(len(_MAGIC) + 8 + size)
+        # frames below the codec's minimum size are never worth a map
+        mmap_min_size = max(_MMAP_MIN_SIZE, header.get('min_size', 0))
+
+        fsize = os.fstat(f.fileno()).st_size
+        for h in header['frames']:
+            end = start + h['offset'] + _stored_size(h)
+            if end > fsize:
+                raise CorruptFileError(fpath, 'truncated')
+
+        frames = []
+        for h in header['frames']:
+            if h['chunks'] is None:
+                if h['size'] == 0:
+                    frames.append(np.empty(0, np.uint8))
+                    continue
+                if mmap and h['size'] >= mmap_min_size:
+                    frame = np.memmap(fpath, np.uint8, 'c',
+                                      start + h['offset'], (h['size'], ))
+                else:
+                    frame = np.empty(h['size'], np.uint8)
+                    f.seek(start + h['offset'])
+                    f.readinto(frame)
+                _check_crc(fpath, h, [frame])
+                frames.append(frame)
+                continue
+            buf = np.empty(h['size'], np.uint8)
+            f.seek(start + h['offset'])
+            chunks = [f.read(clen) for clen in h['chunks']]
+            _check_crc(fpath, h, chunks)
+            try:
+                codec.decompress_into(chunks, buf.ctypes.data, h['size'])
+            except ValueError as e:
+                raise CorruptFileError(fpath, str(e).rstrip('.'))
+            frames.append(buf)
+
+    if len(frames) > 1:
+        if not _OUT_OF_BAND:
+            raise ValueError('File %s has out-of-band buffers, which require'
+                             ' pickle protocol 5 (Python >= 3.8).' % fpath)
+        return pkl.loads(frames[0], buffers=frames[1:])
+    if not _OUT_OF_BAND:
+        # older unpicklers only read byte strings
+        return pkl.loads(frames[0].tobytes())
+    return pkl.loads(frames[0])
+
+
+def _stored_size(h):
+    if h['chunks'] is None:
+        return h['size']
+    return sum(h['chunks'])
+
+
+def _check_crc(fpath, h, payload):
+    # files written before checksums were introduced have none
+    if 'crc' in h and _crc32(payload) != h['crc']:
+        raise CorruptFileError(fpath, 'checksum mismatch')
+
+
+def _load_legacy(fpath):
+    try:
+        return unpickle(fpath)
+    except (EOFError, ValueError, pkl.UnpicklingError,
+            blosc.blosc_extension.error) as e:
+        raise CorruptFileError(fpath, str(e) or type(e).__name__)
+
+
+def quarantine(fpath):
+    """Renames a corrupt file so that it is no longer picked up by readers,
+    and returns its new path."""
+    dst = fpath + '.corrupt'
+    os.rename(fpath, dst)
+    logging.getLogger(__name__).warn(
+        'Corrupt file %s has been moved to %s.', fpath, dst)
+    return dst
+
+
+def load_or_quarantine(fpath):
+    """Loads `fpath`, quarantining it and returning ``None`` if it is
+    corrupt."""
+    try:
+        return load(fpath)
+    except CorruptFileError:
+        quarantine(fpath)
+        return None
+
+
+# files of a merged folder that are not merged themselves
+cache_files = ['all.pkl', '.folder_hash', '.merge.lock']
+
+
 def pickle_merge(folder):
-    """Merges pickle files and save it to `all.pkl`."""
-    file_list = _get_file_list(folder)
+    """Merges pickle files and save it to `all.pkl`.
+
+    Callers running concurrently with other processes should hold the lock
+    on ``.merge.lock`` (see :func:`.job.collect_jobs`).
+    """
+    file_list = get_file_list(folder)
 
     if len(file_list) == 0:
         print('There is nothing to merge because no file' +
               ' has been found in %s.' % folder)
         return
 
-    ha = folder_hash(folder, ['all.pkl', '.folder_hash'])
+    ha = folder_hash(folder, cache_files)
 
     subfolders = [d for d in listdir(folder) if isdir(join(folder, d))]
 
@@ -29,11 +272,11 @@ def pickle_merge(folder):
             make_sure_path_exists(join(tf, sf))
             cp(join(folder, sf), join(tf, sf))
 
-        file_list = _get_file_list(tf)
-        out = _merge(file_list)
+        file_list = get_file_list(tf)
+        out = _merge(file_list, tf, folder)
 
     with BeginEnd('Storing pickles'):
-        pickle(out, join(folder, 'all.pkl'))
+        dump(out, join(folder, 'all.pkl'))
 
     _save_cache(folder, ha)
 
@@ -42,11 +285,15 @@ def pickle_merge(folder):
 
 def _save_cache(folder, lastmodif_hash):
     fpath = join(folder, '.folder_hash')
-    with open(fpath, 'w') as f:
+    tmp = join(folder, '.folder_hash.%s.tmp' % uuid.uuid4().hex)
+    with open(tmp, 'w') as f:
         f.write(lastmodif_hash)
+    os.rename(tmp, fpath)
 
 
-def _get_file_list(folder):
+def get_file_list(folder):
+    """Pickle files of the subfolders of `folder`, ordered by their
+    numeric names."""
     file_list = []
     for (dir_, _, files) in walk(folder):
         if dir_ == folder:
@@ -55,13 +302,25 @@ def _get_file_list(folder):
             fpath = join(dir_, f)
             if fpath.endswith('pkl') and basename(fpath) != 'all.pkl':
                 file_list.append(fpath)
-    return file_list
+    return sorted(file_list, key=_file_key)
+
 
+def _file_key(fpath):
+    key = basename(fpath).split('.')[0]
+    if key.isdigit():
+        return (int(key), fpath)
+    return (-1, fpath)
 
-def _merge(file_list):
+
+def _merge(file_list, copy_folder, folder):
     out = dict()
     for fpath in tqdm(file_list, desc='Merging files'):
-        d = unpickle(fpath)
+        try:
+            d = load(fpath)
+        except CorruptFileError:
+            # the copy is discarded; quarantine the original instead
+            quarantine(join(folder, relpath(fpath, copy_folder)))
+            continue
         if isinstance(d, collections.Iterable):
             out.update(d)
         else:
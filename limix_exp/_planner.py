@@ -0,0 +1,73 @@
+from __future__ import absolute_import
+
+import random
+
+import numpy as np
+
+from ._packing import fill_unknown_costs
+
+# Submission orders work on arrays of job IDs, so that planning does not
+# touch Job objects. Every order starts from the same seeded shuffle, which
+# makes plans reproducible and breaks ties at random.
+
+orders = ['shuffle', 'longest', 'interleave']
+
+
+def shuffled(jobids, seed=937628):
+    """Job IDs in a random order that only depends on `seed` and on the
+    number of jobs."""
+    jobids = [int(i) for i in jobids]
+    random.Random(seed).shuffle(jobids)
+    return np.asarray(jobids, int)
+
+
+def longest_first(jobids, costs):
+    """Job IDs in decreasing order of cost, so that the longest jobs do not
+    end up delaying the whole experiment.
+
+    Unknown costs (``None`` or NaN) are replaced by the mean of known ones.
+    """
+    jobids = np.asarray(jobids, int)
+    costs = np.asarray(fill_unknown_costs(list(costs)), float)
+    return jobids[np.argsort(-costs, kind='mergesort')]
+
+
+def interleaved(jobids, keys):
+    """Job IDs taken in turn from each group of jobs sharing a key (e.g. a
+    parameter value), so that early results cover every group.
+
+    Groups are visited in order of first appearance.
+    """
+    groups = []
+    index = dict()
+    for (i, k) in zip(jobids, keys):
+        if k not in index:
+            index[k] = len(groups)
+            groups.append([])
+        groups[index[k]].append(int(i))
+
+    plan = []
+    for j in range(max([len(g) for g in groups] + [0])):
+        plan += [g[j] for g in groups if j < len(g)]
+    return np.asarray(plan, int)
+
+
+def plan(jobids, order='shuffle', costs=None, keys=None, seed=937628):
+    """Order in which jobs are submitted.
+
+    :param jobids: IDs of the jobs to submit.
+    :param str order: ``'shuffle'``, ``'longest'`` (requires `costs`) or
+                      ``'interleave'`` (requires `keys`).
+    :param costs: callable mapping an array of job IDs to their costs.
+    :param keys: callable mapping an array of job IDs to their keys.
+    :returns: an array of job IDs.
+    """
+    if order not in orders:
+        raise ValueError("Unknown submission order %s. Please, use one of"
+                         " %s." % (order, orders))
+    jobids = shuffled(jobids, seed)
+    if order == 'longest':
+        return longest_first(jobids, costs(jobids))
+    if order == 'interleave':
+        return interleaved(jobids, keys(jobids))
+    return jobids
@@ -0,0 +1,101 @@
+from __future__ import absolute_import
+
+import cProfile
+import os
+import sys
+from collections import defaultdict
+from contextlib import contextmanager
+from os.path import join
+
+from ._path import make_sure_path_exists
+
+# Only one profiler can be enabled at a time, so the profiler of a task is
+# switched off while one of its measured methods runs, which has a profiler
+# of its own. The time spent in measured methods is then reported under the
+# method rather than under ``do_task``.
+
+_active = [None]
+
+
+class TaskProfiler(object):
+    """Profiles a task, with a separate profile per measured method.
+
+    :param bool enabled: does nothing if ``False``.
+    """
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.profiles = dict()
+        self._stack = []
+
+    def _switch(self, name):
+        if len(self._stack) > 0:
+            self.profiles[self._stack[-1]].disable()
+        if name is None:
+            self._stack.pop()
+            if len(self._stack) > 0:
+                self.profiles[self._stack[-1]].enable()
+        else:
+            self._stack.append(name)
+            self.profiles.setdefault(name, cProfile.Profile()).enable()
+
+    def __enter__(self):
+        if self.enabled:
+            _active[0] = self
+            self._switch('do_task')
+        return self
+
+    def __exit__(self, *_):
+        if self.enabled:
+            self._switch(None)
+            _active[0] = None
+
+    def dump(self, folder, task_id):
+        """Stores one ``<task_id>.<name>.prof`` file per profile."""
+        make_sure_path_exists(folder)
+        for (name, p) in self.profiles.items():
+            p.dump_stats(join(folder, '%d.%s.prof' % (task_id, name)))
+
+
+@contextmanager
+def profiling(method):
+    """Profiles the enclosed block as `method` if a task is being profiled."""
+    profiler = _active[0]
+    if profiler is None:
+        yield
+        return
+    profiler._switch(method)
+    try:
+        yield
+    finally:
+        profiler._switch(None)
+
+
+def profile_files(folder):
+    """Profile files found under `folder`, grouped by method name."""
+    files = defaultdict(list)
+    for (root, _, names) in os.walk(folder):
+        for n in names:
+            if n.endswith('.prof'):
+                name = n[:-len('.prof')].split('.', 1)[1]
+                files[name].append(join(root, n))
+    return files
+
+
+def print_report(folder, method=None, top=20, sort='cumulative'):
+    """Prints the hottest functions of each method, aggregated over every
+    profiled task."""
+    import pstats
+
+    files = profile_files(folder)
+    if len(files) == 0:
+        print('No profile has been found in %s.' % folder)
+        return
+    for name in sorted(files):
+        if method is not None and name != method:
+            continue
+        fps = sorted(files[name])
+        print('Method %s (%d profiled tasks):' % (name, len(fps)))
+        stats = pstats.Stats(fps[0], stream=sys.stdout)
+        for fp in fps[1:]:
+            stats.add(fp)
+        stats.strip_dirs().sort_stats(sort).print_stats(top)
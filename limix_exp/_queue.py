@@ -0,0 +1,154 @@
+from __future__ import absolute_import
+
+import errno
+import logging
+import os
+import random
+import socket
+import threading
+import time
+from os.path import exists, getmtime, join
+
+from ._path import make_sure_path_exists, touch
+
+
+class JobQueue(object):
+    """Queue of job IDs shared by workers through the file system.
+
+    Each queued job is an empty file named after its ID in ``pending/``. A
+    worker leases a job by renaming its file into ``leased/``, which is
+    atomic, and keeps the lease alive by touching it. Leases that have not
+    been renewed for `lease_time` seconds are considered lost and their jobs
+    are put back in ``pending/``. Jobs are finally moved to ``done/`` or, if
+    running them raised an exception, to ``failed/``.
+    """
+    states = ['pending', 'leased', 'done', 'failed']
+
+    def __init__(self, folder, lease_time=3600.):
+        self.folder = folder
+        self.lease_time = float(lease_time)
+        self._logger = logging.getLogger(__name__)
+
+    def exists(self):
+        return exists(join(self.folder, 'pending'))
+
+    def _path(self, state, jobid):
+        return join(self.folder, state, str(jobid))
+
+    def _list(self, state):
+        try:
+            return [int(f) for f in os.listdir(join(self.folder, state))
+                    if f.isdigit()]
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+            return []
+
+    def fill(self, jobids):
+        """Queues the given jobs unless they are already pending or leased."""
+        for state in self.states:
+            make_sure_path_exists(join(self.folder, state))
+
+        busy = set(self._list('pending')) | set(self._list('leased'))
+        for jobid in jobids:
+            if jobid in busy:
+                continue
+            for state in ['done', 'failed']:
+                _remove(self._path(state, jobid))
+            touch(self._path('pending', jobid))
+
+    def counts(self):
+        return {state: len(self._list(state)) for state in self.states}
+
+    def lease(self):
+        """Leases a pending job, returning its ID or ``None`` if there is no
+        job left to be leased."""
+        self.expire()
+        pending = self._list('pending')
+        random.Random(os.getpid()).shuffle(pending)
+        for jobid in pending:
+            try:
+                # fresh mtime so that the lease does not look expired
+                os.utime(self._path('pending', jobid), None)
+                os.rename(
+                    self._path('pending', jobid), self._path('leased', jobid))
+            except OSError as e:
+                if e.errno != errno.ENOENT:
+                    raise
+                continue
+            with open(self._path('leased', jobid), 'w') as f:
+                f.write('%s:%d\n' % (socket.gethostname(), os.getpid()))
+            return jobid
+        return None
+
+    def renew(self, jobid):
+        try:
+            os.utime(self._path('leased', jobid), None)
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+            self._logger.warn('Job %d is no longer leased.', jobid)
+
+    def release(self, jobid, failed=False, msg=''):
+        state = 'failed' if failed else 'done'
+        try:
+            os.rename(self._path('leased', jobid), self._path(state, jobid))
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+            self._logger.warn('Job %d is no longer leased.', jobid)
+            return
+        if failed:
+            with open(self._path(state, jobid), 'a') as f:
+                f.write(msg)
+
+    def expire(self):
+        """Puts back in the queue jobs whose leases have expired."""
+        now = time.time()
+        for jobid in self._list('leased'):
+            fp = self._path('leased', jobid)
+            try:
+                if now - getmtime(fp) < self.lease_time:
+                    continue
+                os.rename(fp, self._path('pending', jobid))
+            except OSError as e:
+                if e.errno != errno.ENOENT:
+                    raise
+                continue
+            self._logger.warn('Lease of job %d has expired.', jobid)
+
+    def keep_alive(self, jobid):
+        """Returns a context manager that renews the lease of `jobid` in a
+        background thread while the block of code runs."""
+        return _KeepAlive(self, jobid, self.lease_time / 4.)
+
+
+class _KeepAlive(object):
+    def __init__(self, queue, jobid, interval):
+        self._queue = queue
+        self._jobid = jobid
+        self._interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self._interval):
+            self._queue.renew(self._jobid)
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self._stop.set()
+        self._thread.join()
+
+
+def _remove(fpath):
+    try:
+        os.remove(fpath)
+    except OSError as e:
+        if e.errno != errno.ENOENT:
+            raise
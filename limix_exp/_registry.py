@@ -0,0 +1,104 @@
+from __future__ import absolute_import
+
+import errno
+import json
+import os
+import uuid
+from os.path import isdir, join
+
+from ._lock import FileLock
+from . import config
+
+# The registry lists the experiments of each workspace found under the base
+# directory, as {workspace_id: [experiment_id, ...]}, so that they can be
+# discovered with a single read instead of scanning folders. Hidden folders
+# and the ``dataset`` folder of a workspace are not experiments.
+
+
+def _base_dir(base_dir):
+    if base_dir is None:
+        return config.base_dir()
+    return base_dir
+
+
+def _path(base_dir):
+    return join(base_dir, '.registry.json')
+
+
+def load(base_dir=None):
+    """Registered experiments per workspace, or ``None`` if there is no
+    registry yet."""
+    try:
+        with open(_path(_base_dir(base_dir))) as f:
+            return json.load(f)
+    except IOError as e:
+        if e.errno != errno.ENOENT:
+            raise
+        return None
+    except ValueError:
+        return None
+
+
+def _store(registry, base_dir):
+    fp = _path(base_dir)
+    tmp = join(base_dir, '.registry.json.%s.tmp' % uuid.uuid4().hex)
+    with open(tmp, 'w') as f:
+        json.dump(registry, f, indent=1, sort_keys=True)
+    os.rename(tmp, fp)
+
+
+def _update(func, base_dir):
+    base_dir = _base_dir(base_dir)
+    with FileLock(join(base_dir, '.registry.lock')):
+        registry = load(base_dir)
+        if registry is None:
+            registry = scan(base_dir)
+        func(registry)
+        _store(registry, base_dir)
+    return registry
+
+
+def register(workspace_id, experiment_id, base_dir=None):
+    def add(registry):
+        exps = set(registry.get(workspace_id, []))
+        exps.add(experiment_id)
+        registry[workspace_id] = sorted(exps)
+
+    _update(add, base_dir)
+
+
+def unregister(workspace_id, experiment_id=None, base_dir=None):
+    """Removes an experiment, or a whole workspace if `experiment_id` is
+    ``None``, from the registry."""
+    def remove(registry):
+        if experiment_id is None:
+            registry.pop(workspace_id, None)
+        elif workspace_id in registry:
+            exps = set(registry[workspace_id]) - set([experiment_id])
+            registry[workspace_id] = sorted(exps)
+
+    _update(remove, base_dir)
+
+
+def scan(base_dir=None):
+    """Builds the registry by listing the folders of `base_dir`."""
+    base_dir = _base_dir(base_dir)
+    registry = dict()
+    for w in _subfolders(base_dir):
+        wfolder = join(base_dir, w)
+        registry[w] = [e for e in _subfolders(wfolder) if e != 'dataset']
+    return registry
+
+
+def rescan(base_dir=None):
+    """Rebuilds the registry from the folders of `base_dir` and stores it."""
+    base_dir = _base_dir(base_dir)
+    with FileLock(join(base_dir, '.registry.lock')):
+        registry = scan(base_dir)
+        _store(registry, base_dir)
+    return registry
+
+
+def _subfolders(folder):
+    return sorted(f for f in os.listdir(folder)
+                  if not f.startswith('.') and isdir(join(folder, f)))
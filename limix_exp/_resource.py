@@ -0,0 +1,130 @@
+from __future__ import absolute_import
+
+import sys
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+try:
+    import tracemalloc
+    if not hasattr(tracemalloc, 'reset_peak'):
+        tracemalloc = None
+except ImportError:
+    tracemalloc = None
+
+# ``tracemalloc`` keeps a single peak per process, which a traced measure
+# resets when it begins. Each running measure therefore keeps the traced memory at its
+# start and the highest peak seen so far, which nested measures update
+# before resetting the peak.
+_traced = []
+
+
+def peak_memory():
+    """Peak resident set size of the current process in bytes."""
+    if resource is None:
+        return None
+    r = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        return r
+    return r * 1024
+
+
+def cpu_time():
+    """User plus system CPU time of the current process in seconds."""
+    if resource is None:
+        return None
+    r = resource.getrusage(resource.RUSAGE_SELF)
+    return r.ru_utime + r.ru_stime
+
+
+def allocated_blocks():
+    """Number of memory blocks currently allocated by the interpreter."""
+    try:
+        return sys.getallocatedblocks()
+    except AttributeError:
+        return None
+
+
+def _begin_trace():
+    if tracemalloc is None:
+        return
+    if len(_traced) == 0:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _traced.append(None)
+    else:
+        _traced[-1][1] = max(_traced[-1][1],
+                             tracemalloc.get_traced_memory()[1])
+    tracemalloc.reset_peak()
+    current = tracemalloc.get_traced_memory()[0]
+    _traced.append([current, current])
+
+
+def _end_trace():
+    """Peak traced memory since the matching `_begin_trace`, in bytes."""
+    if tracemalloc is None:
+        return None
+    (start, peak) = _traced.pop()
+    peak = max(peak, tracemalloc.get_traced_memory()[1])
+    if len(_traced) > 0:
+        if _traced[-1] is None:
+            _traced.pop()
+            tracemalloc.stop()
+        else:
+            _traced[-1][1] = max(_traced[-1][1], peak)
+    return peak - start
+
+
+def _diff(end, start):
+    if end is None or start is None:
+        return None
+    return end - start
+
+
+class ResourceUsage(object):
+    """Measures the resources used by a block of code.
+
+    After the block finishes, ``elapsed`` and ``cpu_time`` hold the wall and
+    CPU time in seconds, ``peak_memory`` holds by how many bytes the peak
+    resident set size of the process has increased, and ``nallocs`` holds the
+    net number of memory blocks allocated. Measures that are not available on
+    the running platform are set to ``None``.
+
+    The peak resident set size only grows when a block uses more memory than
+    any earlier one of the process. With `trace`, ``peak_memory`` holds
+    instead the highest amount of memory the block had allocated at once,
+    traced with :mod:`tracemalloc`. Tracing slows down code that allocates
+    a lot, and requires :func:`tracemalloc.reset_peak` (Python >= 3.9).
+    Measures nested in a traced one are traced too.
+
+    :param bool trace: traces the peak memory of the block.
+    """
+    def __init__(self, trace=False):
+        self.elapsed = None
+        self.cpu_time = None
+        self.peak_memory = None
+        self.nallocs = None
+        self._trace = trace
+        self._start = None
+
+    def __enter__(self):
+        self._trace = tracemalloc is not None and (self._trace or
+                                                   len(_traced) > 0)
+        if self._trace:
+            _begin_trace()
+        self._start = (time.time(), cpu_time(), peak_memory(),
+                       allocated_blocks())
+        return self
+
+    def __exit__(self, *args):
+        (elapsed, cpu, peak, nallocs) = self._start
+        self.elapsed = time.time() - elapsed
+        self.cpu_time = _diff(cpu_time(), cpu)
+        self.nallocs = _diff(allocated_blocks(), nallocs)
+        if self._trace:
+            self.peak_memory = _end_trace()
+        else:
+            self.peak_memory = _diff(peak_memory(), peak)
@@ -0,0 +1,226 @@
+from __future__ import absolute_import
+
+import errno
+import os
+from os.path import basename, dirname, exists, join
+
+from tqdm import tqdm
+
+from ._lock import FileLock
+from ._path import make_sure_path_exists
+from ._pickle_files import (CorruptFileError, dump, get_file_list, load,
+                            load_or_quarantine, quarantine)
+
+# Result folder layout:
+#
+#   <jobid // 1000>/<jobid>.pkl   results of a single job, as written by the
+#                                 job itself
+#   shards/<n>.pkl                results of many jobs, {jobid: results}
+#   index.pkl                     {jobid: n} for every job in a shard
+#
+# Results of a job file take precedence over those found in a shard, so
+# that rerunning a compacted job needs no coordination with compaction. A
+# job file rewritten while being compacted is left in place for the same
+# reason. Readers that find a job file removed by a compaction read the job
+# from its shard instead.
+
+
+def _shards_folder(folder):
+    return join(folder, 'shards')
+
+
+def _shard_path(folder, n):
+    return join(_shards_folder(folder), '%d.pkl' % n)
+
+
+def _index_path(folder):
+    return join(folder, 'index.pkl')
+
+
+def _jobid(fpath):
+    return int(basename(fpath).split('.')[0])
+
+
+def load_index(folder):
+    fp = _index_path(folder)
+    if not exists(fp):
+        return dict()
+    return load(fp)
+
+
+def _store_index(folder, index):
+    dump(index, _index_path(folder))
+
+
+def _load_shard(folder, n):
+    # a missing or corrupt shard loses its jobs, which are then rerun
+    fp = _shard_path(folder, n)
+    if not exists(fp):
+        return dict()
+    shard = load_or_quarantine(fp)
+    return dict() if shard is None else shard
+
+
+def job_files(folder):
+    """Result files written by jobs and not yet compacted into shards."""
+    shards = _shards_folder(folder)
+    return {
+        _jobid(fp): fp
+        for fp in get_file_list(folder) if dirname(fp) != shards
+    }
+
+
+def _load_job_file(folder, jobid, fpath):
+    try:
+        return load_or_quarantine(fpath)
+    except (IOError, OSError) as e:
+        if e.errno != errno.ENOENT:
+            raise
+    # compacted since the job files were listed
+    index = load_index(folder)
+    if jobid not in index:
+        return None
+    return _load_shard(folder, index[jobid]).get(jobid)
+
+
+def iter_job_results(folder, jobids=None):
+    """Yields ``(jobid, results)`` pairs reading one file at a time.
+
+    Corrupt files are quarantined and their jobs skipped.
+
+    :param str folder: result folder.
+    :param jobids: jobs to read. All jobs are read by default.
+    """
+    files = job_files(folder)
+    index = load_index(folder)
+
+    if jobids is None:
+        shard_numbers = sorted(set(index.values()))
+        for n in shard_numbers:
+            shard = _load_shard(folder, n)
+            for jobid in sorted(shard.keys()):
+                if index.get(jobid) == n and jobid not in files:
+                    yield (jobid, shard[jobid])
+        for jobid in sorted(files.keys()):
+            results = _load_job_file(folder, jobid, files[jobid])
+            if results is not None:
+                yield (jobid, results)
+        return
+
+    # consecutive jobs usually share a shard, which is read only once
+    last = (None, None)
+    for jobid in jobids:
+        if jobid in files:
+            results = _load_job_file(folder, jobid, files[jobid])
+            if results is not None:
+                yield (jobid, results)
+        elif jobid in index:
+            n = index[jobid]
+            if last[0] != n:
+                last = (n, _load_shard(folder, n))
+            if jobid in last[1]:
+                yield (jobid, last[1][jobid])
+
+
+def compact(folder, shard_size=10000):
+    """Packs job result files into shards of about `shard_size` task
+    results each and removes the packed job files.
+
+    Concurrent compactions of the same folder run one after the other.
+
+    :returns: the number of job files compacted.
+    """
+    if not exists(folder):
+        return 0
+    with FileLock(join(folder, '.compact.lock')):
+        return _compact(folder, shard_size)
+
+
+def _compact(folder, shard_size):
+    files = job_files(folder)
+    if len(files) == 0:
+        return 0
+
+    index = load_index(folder)
+    make_sure_path_exists(_shards_folder(folder))
+    n = max(index.values()) + 1 if len(index) > 0 else 0
+
+    shard = dict()
+    nresults = 0
+    stats = dict()
+    for jobid in tqdm(sorted(files.keys()), desc='Compacting results'):
+        fp = files[jobid]
+        try:
+            stat = _stat(fp)
+            shard[jobid] = load(fp)
+        except CorruptFileError:
+            quarantine(fp)
+            continue
+        except (OSError, IOError):
+            # removed meanwhile
+            continue
+        stats[fp] = stat
+        nresults += len(shard[jobid])
+        if nresults >= shard_size:
+            _store_shard(folder, n, shard, index)
+            n += 1
+            shard = dict()
+            nresults = 0
+
+    if len(shard) > 0:
+        _store_shard(folder, n, shard, index)
+
+    removed = 0
+    for (fp, stat) in stats.items():
+        if _remove_compacted(fp, stat):
+            removed += 1
+
+    # shards whose jobs have all been compacted again into newer shards
+    referenced = set(index.values())
+    for f in os.listdir(_shards_folder(folder)):
+        if f.endswith('.pkl') and int(f.split('.')[0]) not in referenced:
+            os.remove(join(_shards_folder(folder), f))
+
+    for fp in [join(folder, 'all.pkl'), join(folder, '.folder_hash')]:
+        if exists(fp):
+            os.remove(fp)
+
+    return removed
+
+
+def _remove_compacted(fpath, stat):
+    """Removes a compacted job file unless it has been rewritten since.
+
+    The file is first renamed aside, so that it cannot be replaced between
+    checking and removing it. A rewritten file is linked back in place,
+    unless an even newer one has been written meanwhile.
+    """
+    aside = fpath + '.compacted'
+    try:
+        os.rename(fpath, aside)
+    except OSError as e:
+        if e.errno != errno.ENOENT:
+            raise
+        return False
+    if _stat(aside) != stat:
+        try:
+            os.link(aside, fpath)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        os.remove(aside)
+        return False
+    os.remove(aside)
+    return True
+
+
+def _stat(fpath):
+    st = os.stat(fpath)
+    return (st.st_ino, st.st_size, st.st_mtime)
+
+
+def _store_shard(folder, n, shard, index):
+    fp = _shard_path(folder, n)
+    dump(shard, fp)
+    index.update((jobid, n) for jobid in shard.keys())
+    _store_index(folder, index)
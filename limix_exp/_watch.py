@@ -0,0 +1,95 @@
+from __future__ import absolute_import
+
+import errno
+import os
+import time
+from collections import deque
+from os.path import basename, join
+
+from . import _shard
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime
+    except OSError as e:
+        if e.errno != errno.ENOENT:
+            raise
+        return None
+
+
+class ResultFiles(object):
+    """Detects incrementally which jobs have stored their results.
+
+    Only the subfolders whose modification times have changed since the
+    last call are listed again, and the shard index is read again only if
+    it has changed.
+    """
+    def __init__(self, folder):
+        self._folder = folder
+        self._mtimes = dict()
+        self._jobids = dict()
+        self._index_mtime = None
+        self._indexed = set()
+
+    def finished_jobids(self):
+        try:
+            subfolders = [
+                f for f in os.listdir(self._folder)
+                if f.isdigit() and os.path.isdir(join(self._folder, f))
+            ]
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+            subfolders = []
+
+        for sf in subfolders:
+            path = join(self._folder, sf)
+            mtime = _mtime(path)
+            if self._mtimes.get(sf) == mtime:
+                continue
+            self._mtimes[sf] = mtime
+            self._jobids[sf] = set(
+                int(basename(f).split('.')[0]) for f in os.listdir(path)
+                if f.endswith('.pkl') and f.split('.')[0].isdigit())
+
+        mtime = _mtime(join(self._folder, 'index.pkl'))
+        if mtime != self._index_mtime:
+            self._index_mtime = mtime
+            self._indexed = set(_shard.load_index(self._folder).keys())
+
+        jobids = set(self._indexed)
+        for s in self._jobids.values():
+            jobids |= s
+        return jobids
+
+
+class Throughput(object):
+    """Estimates the rate of finished tasks over a sliding time window and
+    the time left to finish the remaining ones."""
+    def __init__(self, window=600.):
+        self._window = window
+        self._history = deque()
+
+    def update(self, nfinished):
+        now = time.time()
+        self._history.append((now, nfinished))
+        while now - self._history[0][0] > self._window and\
+                len(self._history) > 2:
+            self._history.popleft()
+
+    @property
+    def rate(self):
+        if len(self._history) < 2:
+            return None
+        (t0, n0) = self._history[0]
+        (t1, n1) = self._history[-1]
+        if t1 <= t0:
+            return None
+        return (n1 - n0) / (t1 - t0)
+
+    def eta(self, nremaining):
+        rate = self.rate
+        if rate is None or rate <= 0:
+            return None
+        return nremaining / rate
@@ -1,7 +1,7 @@
 
 import os
 from argparse import ArgumentParser
-from .config import conf
+from .config import base_dir, conf, set_base_dir
 from . import task
 from . import workspace
 from ._inspect import fetch_functions
@@ -19,17 +19,31 @@ def _fetch_filter(fp_or_code):
     return eval("lambda task: " + fp_or_code)
 
 def do_root():
-    print(conf.get('default', 'base_dir'))
+    print(base_dir())
+
+def do_rescan():
+    from . import _registry
+    registry = _registry.rescan()
+    nexps = sum(len(v) for v in registry.values())
+    print('%d workspaces and %d experiments have been registered.' %
+          (len(registry), nexps))
 
 def do_save(args, rargs):
     w = workspace.get_workspace(args.workspace_id)
     e = w.get_experiment(args.experiment_id)
-    tasks = [task for task in e.get_tasks() if task.finished]
 
+    filter_ = None
     if args.task_filter is not None:
         filter_ = _fetch_filter(args.task_filter)
-        if filter_ is not None:
-            tasks = [t for t in tasks if filter_(t)]
+
+    # finished tasks are found reading one result file at a time
+    alltasks = {t.task_id: t for t in e.iter_tasks()}
+    tasks = []
+    for tr in e.iter_task_results():
+        t = alltasks[tr.task_id]
+        if filter_ is None or filter_(t):
+            tasks.append(t)
+    tasks.sort(key=lambda t: t.task_id)
 
     if len(tasks) == 0:
         print('No finished task has been found.')
@@ -38,6 +52,65 @@ def do_save(args, rargs):
     save_function_name = w.get_save_function(args.save_function_name)
     save_function_name(tasks, rargs)
 
+def do_export(args):
+    e = workspace.get_experiment(args.workspace_id, args.experiment_id)
+    nrows = e.export_results(args.filepath, fmt=args.format,
+                             chunk_size=args.chunk_size)
+    print('%d task results exported to %s.' % (nrows, args.filepath))
+
+def do_compact(args):
+    e = workspace.get_experiment(args.workspace_id, args.experiment_id)
+    n = e.compact_results(args.shard_size)
+    print('%d job result files have been compacted.' % n)
+
+def do_bench_io(args):
+    from ._bench import bench_io, format_bench_io
+    from ._codec import Codec
+    codecs = None
+    if args.codecs is not None:
+        codecs = [Codec(c, level=args.level) for c in args.codecs]
+    rows = bench_io(args.ntasks, args.array_size, codecs)
+    print(format_bench_io(rows))
+
+def _fetch_prune(fp_or_code):
+    if os.path.exists(fp_or_code):
+        funcs = fetch_functions(fp_or_code, r'prune_task')
+        if len(funcs) > 0:
+            return funcs[0]
+        return None
+    return eval("lambda task, results: " + fp_or_code)
+
+def do_prune(args):
+    e = workspace.get_experiment(args.workspace_id, args.experiment_id)
+    predicate = None
+    if args.predicate is not None:
+        predicate = _fetch_prune(args.predicate)
+    e.prune(predicate, dryrun=args.dryrun)
+
+def do_pull(args):
+    folder = args.to
+    if folder is None:
+        if not conf.has_option('mirror', 'base_dir'):
+            print('Please, provide a destination with --to or the base_dir'
+                  ' option of the [mirror] section.')
+            return
+        folder = conf.get('mirror', 'base_dir')
+    folder = os.path.abspath(os.path.expanduser(folder))
+    e = workspace.get_experiment(args.workspace_id, args.experiment_id)
+    e.pull(folder, nworkers=args.workers, checksum=args.checksum)
+
+def do_prof(args):
+    e = workspace.get_experiment(args.workspace_id, args.experiment_id)
+    e.profile_report(args.method, args.top, args.sort)
+
+# the cache belongs to the running process, so the cache command is only
+# offered by iarauto
+def do_cache(args):
+    from ._cache import cache_manager
+    if args.clear:
+        cache_manager.clear()
+    print(cache_manager.info())
+
 def do_jinfo(args):
     e = workspace.get_experiment(args.workspace_id, args.experiment_id)
     job = e.get_job(args.job)
@@ -52,40 +125,131 @@ def do_jinfo(args):
             print(job.get_bjob().stderr())
             print('--- STDERR END ---')
         if args.result:
-            tasks = job.get_tasks()
-            for task in tasks:
-                print(task.get_result())
+            for tr in e.iter_task_results(jobids=[job.jobid]):
+                print(tr)
+
+def _run_queue_worker(workspace_id, experiment_id, dryrun, force):
+    e = workspace.get_experiment(workspace_id, experiment_id)
+    e.run_queue(dryrun, force=force)
 
 def do_rjob(args):
     if args.debug:
         import pdb; pdb.set_trace()
     e = workspace.get_experiment(args.workspace_id, args.experiment_id)
-    e.run_job(args.job, args.dryrun, force=args.force)
+    if args.lease_time is not None:
+        e.lease_time = args.lease_time
+    if args.profile:
+        e.profile_rate = 1.
+    if args.array is not None or not args.pull:
+        if args.array is not None:
+            from ._array import mapped_jobids
+            jobids = mapped_jobids(args.array)
+        elif args.job is None:
+            print('Please, provide job IDs, --pull or --array.')
+            return
+        else:
+            from .job import parse_jobids
+            jobids = parse_jobids(args.job)
+        if len(jobids) == 1:
+            e.run_job(jobids[0], args.dryrun, force=args.force)
+        else:
+            e.run_jobs(jobids, args.dryrun, force=args.force,
+                       nworkers=args.workers)
+    elif args.workers is None:
+        e.run_queue(args.dryrun, force=args.force)
+    else:
+        from joblib import Parallel, delayed
+        e.fill_queue()
+        wid, eid = args.workspace_id, args.experiment_id
+        Parallel(n_jobs=args.workers, backend='multiprocessing')(
+            delayed(_run_queue_worker)(wid, eid, args.dryrun, args.force)
+            for _ in range(args.workers))
 
 def do_rm_exp(args):
     w = workspace.get_workspace(args.workspace_id)
-    w.rm_experiment(args.experiment_id)
+    w.rm_experiment(args.experiment_id, background=args.background)
 
 def do_err(args):
     e = workspace.get_experiment(args.workspace_id, args.experiment_id)
-    e.method_errors()
+    e.method_errors(top=args.top, rescan=args.rescan)
 
 def do_sjobs(args):
     e = workspace.get_experiment(args.workspace_id, args.experiment_id)
     requests = args.requests
     if requests is not None:
         requests = requests.split(',')
-    e.submit_jobs(args.dryrun, requests=requests, queue=args.queue)
+    if args.auto_memory:
+        e.auto_memory = True
+    if args.array:
+        e.array_submission = True
+    if args.bundle_size is not None:
+        e.bundle_size = args.bundle_size
+    if args.order is not None:
+        e.submission_order = args.order
+    if args.memory_margin is not None:
+        e.memory_margin = args.memory_margin
+    if args.workers is not None:
+        e.submit_workers(args.workers, args.dryrun, requests=requests,
+                         queue=args.queue)
+        return
+    e.submit_jobs(args.dryrun, requests=requests, queue=args.queue,
+                  pilot=args.pilot)
+
+def do_resubmit(args):
+    e = workspace.get_experiment(args.workspace_id, args.experiment_id)
+    if args.jobs is None:
+        jobs = e.failed_jobs()
+    else:
+        jobs = [e.get_job(int(i)) for i in args.jobs.split(',')]
+
+    if len(jobs) == 0:
+        print('There is no failed or lost job to resubmit.')
+        return
+
+    print('Resubmitting jobs: %s' % str(sorted(j.jobid for j in jobs)))
+    requests = args.requests
+    if requests is not None:
+        requests = requests.split(',')
+    e.resubmit_jobs(jobs, args.dryrun, requests=requests, queue=args.queue,
+                    memory=args.memory)
 
 def do_winfo(args):
     if workspace.exists(args.workspace_id):
         w = workspace.get_workspace(args.workspace_id)
-        print(w)
+        print(w.summary(nprocs=args.nprocs))
     else:
         print('Workspace %s does not exist.' % args.workspace_id)
 
+def _do_batch(args, operation, **kwargs):
+    from ._batch import format_rows
+    if not workspace.exists(args.workspace_id):
+        print('Workspace %s does not exist.' % args.workspace_id)
+        return
+    w = workspace.get_workspace(args.workspace_id)
+    experiment_ids = args.experiments
+    if experiment_ids is not None:
+        experiment_ids = experiment_ids.split(',')
+    rows = w.batch(operation, experiment_ids, args.nprocs, **kwargs)
+    print(format_rows(operation, rows))
+
+def do_wsjobs(args):
+    requests = args.requests
+    if requests is not None:
+        requests = requests.split(',')
+    _do_batch(args, 'submit', dryrun=args.dryrun, queue=args.queue,
+              requests=requests)
+
+def do_wcollect(args):
+    _do_batch(args, 'collect')
+
 def do_einfo(args):
     e = workspace.get_experiment(args.workspace_id, args.experiment_id)
+    if args.watch:
+        try:
+            e.watch(interval=args.interval)
+        except KeyboardInterrupt:
+            pass
+        return
     print(e)
     if args.tasks:
         tasks = e.get_tasks()
@@ -94,6 +258,8 @@ def do_einfo(args):
         jobs = [j for j in e.get_jobs() if j.finished]
         jobids = sorted([j.jobid for j in jobs])
         print('Finished job IDs: %s' % str(jobids))
+    if args.resources:
+        print(task.resources_summary(e.get_task_results()))
 
 def parse_einfo(args):
     p = ArgumentParser()
@@ -103,7 +269,13 @@ def parse_einfo(args):
     p.add_argument('--no_tasks', dest='tasks', action='store_false')
     p.add_argument('--finished_jobs', dest='finished_jobs', action='store_true')
     p.add_argument('--no_finished_jobs', dest='finished_jobs', action='store_false')
-    p.set_defaults(task_args=False, finished_jobs=False)
+    p.add_argument('--resources', dest='resources', action='store_true')
+    p.add_argument('--no_resources', dest='resources', action='store_false')
+    p.add_argument('--watch', dest='watch', action='store_true')
+    p.add_argument('--no_watch', dest='watch', action='store_false')
+    p.add_argument('--interval', default=5., type=float)
+    p.set_defaults(task_args=False, finished_jobs=False, resources=False,
+                   watch=False)
 
     args = p.parse_args(args)
     do_einfo(args)
@@ -128,7 +300,10 @@ def parse_rm_exp(args):
     p = ArgumentParser()
     p.add_argument('workspace_id')
     p.add_argument('experiment_id')
-    p.set_defaults(resubmit=False)
+    p.add_argument('--background', dest='background', action='store_true')
+    p.add_argument('--no-background', dest='background',
+                   action='store_false')
+    p.set_defaults(resubmit=False, background=False)
 
     args = p.parse_args(args)
     do_rm_exp(args)
@@ -139,25 +314,60 @@ def parse_sjobs(args):
     p.add_argument('experiment_id')
     p.add_argument('--queue', default=None)
     p.add_argument('--requests', default=None)
+    p.add_argument('--pilot', default=None, type=int)
+    p.add_argument('--workers', default=None, type=int)
+    p.add_argument('--memory-margin', default=None, type=float)
+    p.add_argument('--auto-memory', dest='auto_memory', action='store_true')
+    p.add_argument('--no-auto-memory', dest='auto_memory',
+                   action='store_false')
+    p.add_argument('--bundle-size', default=None, type=int)
+    p.add_argument('--order', default=None,
+                   choices=['shuffle', 'longest', 'interleave'])
+    p.add_argument('--array', dest='array', action='store_true')
+    p.add_argument('--no-array', dest='array', action='store_false')
     p.add_argument('--dryrun', dest='dryrun', action='store_true')
     p.add_argument('--no-dryrun', dest='dryrun', action='store_false')
-    p.set_defaults(dryrun=False)
+    p.set_defaults(dryrun=False, auto_memory=False, array=False)
 
     args = p.parse_args(args)
     do_sjobs(args)
 
+def parse_resubmit(args):
+    p = ArgumentParser()
+    p.add_argument('workspace_id')
+    p.add_argument('experiment_id')
+    p.add_argument('--jobs', default=None)
+    p.add_argument('--memory', default=None)
+    p.add_argument('--queue', default=None)
+    p.add_argument('--requests', default=None)
+    p.add_argument('--dryrun', dest='dryrun', action='store_true')
+    p.add_argument('--no-dryrun', dest='dryrun', action='store_false')
+    p.set_defaults(dryrun=False)
+
+    args = p.parse_args(args)
+    do_resubmit(args)
+
 def parse_rjob(args):
     p = ArgumentParser()
     p.add_argument('workspace_id')
     p.add_argument('experiment_id')
-    p.add_argument('job', type=int)
+    p.add_argument('job', nargs='?', default=None,
+                   help='job ID, range or list, e.g. 100-199 or 1,5,7-9')
+    p.add_argument('--pull', dest='pull', action='store_true')
+    p.add_argument('--no-pull', dest='pull', action='store_false')
+    p.add_argument('--array', default=None)
+    p.add_argument('--workers', default=None, type=int)
+    p.add_argument('--lease-time', default=None, type=float)
     p.add_argument('--debug', dest='debug', action='store_true')
     p.add_argument('--no-debug', dest='debug', action='store_false')
     p.add_argument('--dryrun', dest='dryrun', action='store_true')
     p.add_argument('--no-dryrun', dest='dryrun', action='store_false')
     p.add_argument('--force', dest='force', action='store_true')
     p.add_argument('--no-force', dest='force', action='store_false')
-    p.set_defaults(dryrun=False, force=False, debug=False)
+    p.add_argument('--profile', dest='profile', action='store_true')
+    p.add_argument('--no-profile', dest='profile', action='store_false')
+    p.set_defaults(dryrun=False, force=False, debug=False, pull=False,
+                   profile=False)
 
     args = p.parse_args(args)
     do_rjob(args)
@@ -173,17 +383,121 @@ def parse_save(args):
     args, rargs = p.parse_known_args(args)
     do_save(args, rargs)
 
+def parse_export(args):
+    p = ArgumentParser()
+    p.add_argument('workspace_id')
+    p.add_argument('experiment_id')
+    p.add_argument('filepath')
+    p.add_argument('--format', default=None,
+                   choices=['parquet', 'arrow', 'hdf5'])
+    p.add_argument('--chunk-size', default=100000, type=int)
+
+    args = p.parse_args(args)
+    do_export(args)
+
+def parse_compact(args):
+    p = ArgumentParser()
+    p.add_argument('workspace_id')
+    p.add_argument('experiment_id')
+    p.add_argument('--shard-size', default=None, type=int)
+
+    args = p.parse_args(args)
+    do_compact(args)
+
+def parse_bench_io(args):
+    p = ArgumentParser()
+    p.add_argument('--ntasks', default=10000, type=int)
+    p.add_argument('--array-size', default=0, type=int)
+    p.add_argument('--codecs', default=None, nargs='+')
+    p.add_argument('--level', default=None, type=int)
+
+    args = p.parse_args(args)
+    do_bench_io(args)
+
+def parse_prune(args):
+    p = ArgumentParser()
+    p.add_argument('workspace_id')
+    p.add_argument('experiment_id')
+    p.add_argument('--predicate', default=None)
+    p.add_argument('--dryrun', dest='dryrun', action='store_true')
+    p.add_argument('--no-dryrun', dest='dryrun', action='store_false')
+    p.set_defaults(dryrun=False)
+
+    args = p.parse_args(args)
+    do_prune(args)
+
+def parse_pull(args):
+    p = ArgumentParser()
+    p.add_argument('workspace_id')
+    p.add_argument('experiment_id')
+    p.add_argument('--to', default=None)
+    p.add_argument('--workers', default=4, type=int)
+    p.add_argument('--checksum', dest='checksum', action='store_true')
+    p.add_argument('--no-checksum', dest='checksum', action='store_false')
+    p.set_defaults(checksum=False)
+
+    args = p.parse_args(args)
+    do_pull(args)
+
+def parse_prof(args):
+    p = ArgumentParser()
+    p.add_argument('workspace_id')
+    p.add_argument('experiment_id')
+    p.add_argument('--method', default=None)
+    p.add_argument('--top', default=20, type=int)
+    p.add_argument('--sort', default='cumulative')
+
+    args = p.parse_args(args)
+    do_prof(args)
+
+def parse_cache(args):
+    p = ArgumentParser()
+    p.add_argument('--clear', dest='clear', action='store_true')
+    p.add_argument('--no-clear', dest='clear', action='store_false')
+    p.set_defaults(clear=False)
+
+    args = p.parse_args(args)
+    do_cache(args)
+
 def parse_winfo(args):
     p = ArgumentParser()
     p.add_argument('workspace_id')
+    p.add_argument('--nprocs', default=None, type=int)
 
     args = p.parse_args(args)
     do_winfo(args)
 
+def parse_wsjobs(args):
+    p = ArgumentParser()
+    p.add_argument('workspace_id')
+    p.add_argument('--experiments', default=None)
+    p.add_argument('--nprocs', default=None, type=int)
+    p.add_argument('--queue', default=None)
+    p.add_argument('--requests', default=None)
+    p.add_argument('--dryrun', dest='dryrun', action='store_true')
+    p.add_argument('--no-dryrun', dest='dryrun', action='store_false')
+    p.set_defaults(dryrun=False)
+
+    args = p.parse_args(args)
+    do_wsjobs(args)
+
+def parse_wcollect(args):
+    p = ArgumentParser()
+    p.add_argument('workspace_id')
+    p.add_argument('--experiments', default=None)
+    p.add_argument('--nprocs', default=None, type=int)
+
+    args = p.parse_args(args)
+    do_wcollect(args)
+
 def parse_err(args):
     p = ArgumentParser()
     p.add_argument('workspace_id')
     p.add_argument('experiment_id')
+    p.add_argument('--top', default=10, type=int)
+    p.add_argument('--rescan', dest='rescan', action='store_true')
+    p.add_argument('--no-rescan', dest='rescan', action='store_false')
+    p.set_defaults(rescan=False)
 
     args = p.parse_args(args)
     do_err(args)
@@ -192,16 +506,26 @@ def entry_point():
     p = ArgumentParser()
     p.add_argument("-v", "--verbose", help="increase output verbosity",
                    action="store_true")
+    p.add_argument("--base-dir", default=None,
+                   help="read workspaces from this folder, e.g. a mirror")
 
     sub = p.add_subparsers()
 
     s = sub.add_parser('root')
     s.set_defaults(func=lambda _: do_root())
 
+    s = sub.add_parser('rescan')
+    s.set_defaults(func=lambda _: do_rescan())
+
     s = sub.add_parser('winfo')
-    s.add_argument('workspace_id')
     s.set_defaults(func=parse_winfo)
 
+    s = sub.add_parser('wsjobs')
+    s.set_defaults(func=parse_wsjobs)
+
+    s = sub.add_parser('wcollect')
+    s.set_defaults(func=parse_wcollect)
+
     s = sub.add_parser('rm-exp')
     s.set_defaults(func=parse_rm_exp)
 
@@ -214,6 +538,9 @@ def entry_point():
     s = sub.add_parser('sjobs')
     s.set_defaults(func=parse_sjobs)
 
+    s = sub.add_parser('resubmit')
+    s.set_defaults(func=parse_resubmit)
+
     s = sub.add_parser('err')
     s.set_defaults(func=parse_err)
 
@@ -223,6 +550,24 @@ def entry_point():
     s = sub.add_parser('save')
     s.set_defaults(func=parse_save)
 
+    s = sub.add_parser('compact')
+    s.set_defaults(func=parse_compact)
+
+    s = sub.add_parser('export')
+    s.set_defaults(func=parse_export)
+
+    s = sub.add_parser('bench-io')
+    s.set_defaults(func=parse_bench_io)
+
+    s = sub.add_parser('prune')
+    s.set_defaults(func=parse_prune)
+
+    s = sub.add_parser('pull')
+    s.set_defaults(func=parse_pull)
+
+    s = sub.add_parser('prof')
+    s.set_defaults(func=parse_prof)
+
     args, rargs = p.parse_known_args()
 
     if args.verbose:
@@ -230,6 +575,8 @@ def entry_point():
     else:
         logging.basicConfig(level=logging.INFO)
 
+    set_base_dir(args.base_dir)
+
     func = args.func
     del args.func
     func(rargs)
@@ -15,3 +15,21 @@ def _conf():
 
 
 conf = _conf()
+
+_base_dir = [None]
+
+
+def base_dir():
+    """Folder of the workspaces: the ``[default] base_dir`` option unless
+    overridden by :func:`set_base_dir` (e.g. to read a local mirror)."""
+    if _base_dir[0] is not None:
+        return _base_dir[0]
+    return conf.get('default', 'base_dir')
+
+
+def set_base_dir(folder):
+    """Overrides the folder of the workspaces, or restores the configured
+    one if `folder` is ``None``."""
+    if folder is not None:
+        folder = os.path.abspath(os.path.expanduser(folder))
+    _base_dir[0] = folder
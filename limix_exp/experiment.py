@@ -2,34 +2,53 @@ import logging
 import os
 import random
 from math import ceil
-from operator import attrgetter
 from os.path import dirname, join
 
-from cachetools import LRUCache, cachedmethod
 from humanfriendly import format_size, parse_size
 from limix_lsf import clusterrun
 from limix_lsf.clusterrun import ClusterRun
 from tabulate import tabulate
 from tqdm import tqdm
 
-from . import task
+from . import _array, _planner, _registry, _shard, task
+from ._cache import cache_manager
+from ._iter import maybe_batches
+from ._lock import FileLock
+from ._packing import fill_unknown_costs, lpt_assignment
 from ._path import make_sure_path_exists, touch
-from .config import conf
-from .job import Job, collect_jobs, load_job, store_job
+from ._pickle_files import dump, load
+from ._queue import JobQueue
+from .config import base_dir
+from .job import (Job, collect_jobs, format_jobids, load_job, load_job_states,
+                  store_job, store_job_states)
 
 
 class Experiment(object):
     def __init__(self, workspace_id, experiment_id, properties):
-        self._cache_get_task_results = LRUCache(maxsize=1)
         self._workspace_id = workspace_id
         self._experiment_id = experiment_id
 
         self.script_filepath = None
         self._task_id_counter = -1
         self.njobs = None
+        self.packing = 'contiguous'
+        self.cost_experiment = None
+        self._job_task_ids = None
+        self.lease_time = 3600.
+        self.shard_size = 10000
+        self.array_submission = False
+        self.bundle_size = 1
+        self.submission_order = 'shuffle'
+        self.profile_rate = 0.
+        # traces the peak memory of tasks instead of the peak RSS increase
+        self.trace_memory = False
+        self.max_array_size = 1000
         self.mkl_nthreads = 1
         self.nprocs = 1
         self._job_megabytes = None
+        self.auto_memory = False
+        self.memory_margin = 0.25
+        self.memlimit_factor = 2.
         self._properties = properties
         self.auto_run_done = False
         self.finish_setup_done = False
@@ -38,24 +57,119 @@ class Experiment(object):
 
     @property
     def runid(self):
-        fp = join(self.folder, '.runid')
-        if os.path.exists(fp):
-            return open(fp, 'r').read()
+        """ID of the last cluster run or job array submitted."""
+        runids = self.runids
+        if len(runids) > 0:
+            return runids[-1]
 
     @runid.setter
     def runid(self, v):
+        self.runids = [v]
+
+    @property
+    def runids(self):
+        """IDs of the cluster runs and job arrays of the last submission,
+        one per memory request and array chunk."""
         fp = join(self.folder, '.runid')
-        open(fp, 'w').write(v)
+        if not os.path.exists(fp):
+            return []
+        with open(fp, 'r') as f:
+            return [l.strip() for l in f if len(l.strip()) > 0]
+
+    @runids.setter
+    def runids(self, v):
+        fp = join(self.folder, '.runid')
+        with open(fp, 'w') as f:
+            f.write(''.join('%s\n' % i for i in v))
 
     def kill_bjobs(self):
         jobs = self.get_jobs()
-        runids = set([j.brunid for j in jobs if j.submitted])
+        arrays = set([j.barray for j in jobs if j.submitted])
+        arrays.discard(None)
+        for fp in arrays:
+            _array.load_array_run(fp).kill()
+
+        runids = set([j.brunid for j in jobs
+                      if j.submitted and j.barray is None])
+        runids.update(self.worker_runids)
         for ri in runids:
             if clusterrun.exists(ri):
                 clusterrun.load(ri).kill()
                 clusterrun.rm(ri)
             else:
                 self._logger.warn('Cluster run %s does not exist.', ri)
+        if os.path.exists(self._workers_path):
+            os.remove(self._workers_path)
+
+    @property
+    def _pruned_path(self):
+        return join(self.folder, 'pruned.pkl')
+
+    def _load_pruned(self):
+        if not os.path.exists(self._pruned_path):
+            return dict(task_ids=set(), jobids=set())
+        return load(self._pruned_path)
+
+    def pruned_task_ids(self):
+        """IDs of the tasks that jobs skip, as set by :meth:`prune`."""
+        return self._load_pruned()['task_ids']
+
+    def pruned_jobids(self):
+        """IDs of the unfinished jobs all of whose tasks have been pruned."""
+        return self._load_pruned()['jobids']
+
+    def prune_task(self, task, task_results):
+        """Whether a task can be skipped given the task results collected
+        so far, e.g. because its arguments lie in a region that has turned
+        out to be uninteresting. Used by :meth:`prune`."""
+        return False
+
+    def prune(self, predicate=None, dryrun=False):
+        """Prunes the tasks without result that match `predicate`.
+
+        Pruned tasks are skipped by the jobs that run them later. Jobs left
+        with pruned tasks only are not submitted anymore. Pending or running
+        bjobs are killed with bulk bkill calls if every unfinished job they
+        run (see `bundle_size`) has been pruned.
+
+        :param callable predicate: function of a task and of the list of task
+                                   results collected so far. Defaults to
+                                   :meth:`prune_task`.
+        :returns: the number of pruned tasks and jobs, and of killed bjobs.
+        """
+        if predicate is None:
+            predicate = self.prune_task
+
+        results = list(self.iter_task_results())
+        done = set(tr.task_id for tr in results)
+        pruned = self._load_pruned()
+        for t in tqdm(self.get_tasks(), desc='Pruning tasks'):
+            if t.task_id not in done and t.task_id not in pruned['task_ids']:
+                if predicate(t, results):
+                    pruned['task_ids'].add(t.task_id)
+
+        jobs = [j for j in self.get_jobs() if not j.finished]
+        task_ids = pruned['task_ids']
+        pruned['jobids'] = set(
+            j.jobid for j in jobs
+            if all(i in task_ids for i in self.job_task_ids(j.jobid)))
+
+        bundles = dict()
+        for j in jobs:
+            if j.submitted:
+                key = (j.barray, j.brunid, j.bjobid)
+                bundles.setdefault(key, []).append(j)
+        kill = [b[0] for b in bundles.values()
+                if all(j.jobid in pruned['jobids'] for j in b) and
+                (b[0].get_bjob().ispending() or b[0].get_bjob().isrunning())]
+        print('%d tasks and %d jobs have been pruned; %d bjobs to kill.' %
+              (len(pruned['task_ids']), len(pruned['jobids']), len(kill)))
+        if not dryrun:
+            dump(pruned, self._pruned_path)
+            _array.get_scheduler().kill_jobs([_os_jobspec(j) for j in kill])
+
+        return dict(ntasks=len(pruned['task_ids']),
+                    njobs=len(pruned['jobids']), nkilled=len(kill))
 
     @property
     def job_memory(self):
@@ -64,8 +178,7 @@ class Experiment(object):
 
     @job_memory.setter
     def job_memory(self, siz):
-        nbytes = parse_size(siz)
-        self._job_megabytes = int(round(nbytes / 1024. / 1024.))
+        self._job_megabytes = _parse_megabytes(siz)
 
     def exists(self):
         folder = self.folder
@@ -79,10 +192,11 @@ class Experiment(object):
     def get_task(self, task_id):
         return self._get_tasks()[task_id]
 
-    @cachedmethod(attrgetter('_cache_get_task_results'))
     def _get_task_results(self):
         fpath = join(self.folder, 'result')
-        return task.collect_task_results(fpath, force_cache=False)
+        return cache_manager.get_or_load(
+            'results', fpath,
+            lambda: task.collect_task_results(fpath, force_cache=False))
 
     # @cachedmethod(attrgetter('_cache'))
     def get_task_results(self):
@@ -91,14 +205,170 @@ class Experiment(object):
     def get_task_result(self, task_id):
         return self._get_task_results().get(task_id)
 
+    def iter_task_results(self, batch_size=None, jobids=None, status=None):
+        """Iterates over task results without loading all of them.
+
+        :param int batch_size: yields lists of up to `batch_size` results
+                               instead of single results.
+        :param jobids: reads only the results of these jobs (e.g., a
+                       ``range``).
+        :param str status: ``'success'`` or ``'error'`` to keep only results
+                           whose methods all succeeded or that have an error.
+        """
+        folder = join(self.folder, 'result')
+        results = task.iter_task_results(folder, jobids)
+
+        if status == 'success':
+            results = (tr for tr in results if not task.has_error(tr))
+        elif status == 'error':
+            results = (tr for tr in results if task.has_error(tr))
+        elif status is not None:
+            raise ValueError("Unknown result status %s." % status)
+
+        return maybe_batches(results, batch_size)
+
+    def get_arrays(self, method, name, jobids=None):
+        """Concatenates the array `name` of `method` over task results,
+        reading one result file at a time."""
+        import numpy as np
+        arrays = []
+        for trs in self.iter_task_results(batch_size=10000, jobids=jobids):
+            a = task.concatenate_arrays(trs, method, name)
+            if a is not None:
+                arrays.append(a)
+        if len(arrays) == 0:
+            return None
+        return np.concatenate(arrays)
+
+    def load_dataset(self, name, loader=None):
+        """Loads a file of the workspace dataset folder once per process;
+        see :meth:`.Workspace.load_dataset`."""
+        from .workspace import get_workspace
+        return get_workspace(self._workspace_id).load_dataset(name, loader)
+
+    def iter_tasks(self, batch_size=None, jobids=None):
+        """Iterates over tasks, optionally only those of the given jobs."""
+        tasks = self._get_tasks()
+        if jobids is None:
+            items = (tasks[k] for k in sorted(tasks.keys()))
+        else:
+            items = (tasks[tid] for j in jobids
+                     for tid in self.job_task_ids(j))
+        return maybe_batches(items, batch_size)
+
+    def iter_jobs(self, batch_size=None, jobids=None, status=None):
+        """Iterates over jobs reading one job file at a time.
+
+        :param str status: ``'finished'``, ``'unfinished'``, ``'submitted'``
+                           or ``'waiting'`` to filter jobs.
+        """
+        if jobids is None:
+            jobids = range(self.njobs)
+
+        states = load_job_states(self._job_states_path)
+        jobs = (self._load_job(j, states) for j in jobids)
+        jobs = (j for j in jobs if j is not None)
+
+        filters = {
+            'finished': lambda j: j.finished,
+            'unfinished': lambda j: not j.finished,
+            'submitted': lambda j: j.submitted,
+            'waiting': lambda j: not j.submitted
+        }
+        if status is not None:
+            if status not in filters:
+                raise ValueError("Unknown job status %s." % status)
+            jobs = (j for j in jobs if filters[status](j))
+
+        return maybe_batches(jobs, batch_size)
+
+    def _load_job(self, jobid, states):
+        fp = self.job_path(jobid)
+        if not os.path.exists(fp):
+            return None
+        job = load_job(fp)
+        if job.jobid in states:
+            job.set_state(states[job.jobid])
+        return job
+
+    def export_results(self, fpath, fmt=None, chunk_size=100000):
+        """Exports task arguments and results to a Parquet, Arrow or HDF5
+        file, streaming the results from the result files."""
+        from ._export import export_task_results
+        names = sorted(self.get_task_args().get_names())
+        return export_task_results(self._get_tasks(), names,
+                                   self.iter_task_results, fpath, fmt=fmt,
+                                   chunk_size=chunk_size)
+
+    def compact_results(self, shard_size=None):
+        """Packs the result files and the error indices written by jobs
+        into shards.
+
+        :returns: the number of result files compacted.
+        """
+        if shard_size is None:
+            shard_size = self.shard_size
+        folder = join(self.folder, 'result')
+        n = task.compact_task_results(folder, shard_size)
+        cache_manager.invalidate('results', folder)
+        task.compact_error_indices(join(self.folder, 'error'), shard_size)
+        return n
+
     def has_task_result(self, task_id):
         return int(task_id) in self._get_task_results()
 
     @property
     def folder(self):
-        return join(
-            conf.get('default', 'base_dir'), self._workspace_id,
-            self._experiment_id)
+        return join(base_dir(), self._workspace_id, self._experiment_id)
+
+    def pull(self, folder, nworkers=4, checksum=False):
+        """Mirrors this experiment into the base folder `folder`, copying
+        only new or modified files (see :func:`._mirror.mirror`).
+
+        The mirror can then be read in place after
+        :func:`.config.set_base_dir` (or ``arauto --base-dir``).
+        """
+        from ._mirror import format_stats, mirror
+
+        wsrc = dirname(self.folder)
+        wdst = join(folder, self._workspace_id)
+        rows = []
+        rows.append((self._workspace_id,
+                     mirror(wsrc, wdst, nworkers, checksum, recursive=False)))
+        rows.append((self._experiment_id,
+                     mirror(self.folder, join(wdst, self._experiment_id),
+                            nworkers, checksum)))
+        _registry.register(self._workspace_id, self._experiment_id,
+                           base_dir=folder)
+        print(format_stats(rows))
+        return rows
+
+    def profiled(self, task_id):
+        """Whether a task is profiled when run, which happens for a fraction
+        `profile_rate` of the tasks. The same tasks are chosen every time."""
+        if self.profile_rate <= 0:
+            return False
+        if self.profile_rate >= 1:
+            return True
+        return random.Random(int(task_id)).random() < self.profile_rate
+
+    def profile_folder(self, jobid=None):
+        """Folder of the profiles of the tasks of `jobid`, or of every job."""
+        folder = join(self.folder, 'prof')
+        if jobid is None:
+            return folder
+        return join(folder, self.split_folder(jobid), str(jobid))
+
+    def profile_report(self, method=None, top=20, sort='cumulative'):
+        """Prints the hottest functions of ``do_task`` and of each measured
+        method, aggregated over the profiled tasks.
+
+        :param str method: reports only this method.
+        :param int top: number of functions per method.
+        :param str sort: :mod:`pstats` sort key, e.g. ``'tottime'``.
+        """
+        from ._profile import print_report
+        print_report(self.profile_folder(), method, top, sort)
 
     @property
     def figures_folder(self):
@@ -139,6 +409,29 @@ class Experiment(object):
     def do_task(self, task):
         raise NotImplementedError
 
+    def task_cost(self, task):
+        """Expected cost of a task, used by the ``'cost'`` packing.
+
+        Defaults to the elapsed time measured for the task with the same ID
+        in `cost_experiment`, an experiment of the same workspace. Returns
+        ``None`` if the cost is unknown.
+        """
+        from .workspace import get_experiment
+
+        if self.cost_experiment is None:
+            return None
+        e = get_experiment(self._workspace_id, self.cost_experiment)
+        tr = e.get_task_result(task.task_id)
+        if tr is None:
+            return None
+        return tr.total_elapsed
+
+    def _pack_tasks(self, tasks):
+        costs = [self.task_cost(t) for t in tasks]
+        costs = fill_unknown_costs(costs)
+        bins = lpt_assignment(costs, self.njobs)
+        return {i: [tasks[j].task_id for j in b] for (i, b) in enumerate(bins)}
+
     @property
     def tasks_setup_done(self):
         fpath = join(self.folder, 'tasks.pkl')
@@ -182,6 +475,121 @@ class Experiment(object):
             fp = self.task_result_path(job_.jobid)
             make_sure_path_exists(os.path.dirname(fp))
             task.store_task_results(task_results, fp)
+            self._store_error_index(job_.jobid, task_results)
+
+    def run_jobs(self, jobids, dryrun=False, force=False, nworkers=None):
+        """Runs a bundle of jobs in this process, or in `nworkers` forked
+        processes sharing the tasks already loaded.
+
+        A failing job does not stop the others. An exception is raised at
+        the end if any has failed.
+        """
+        self.get_tasks()
+        if nworkers is None or nworkers <= 1:
+            failed = [j for j in jobids
+                      if not _run_bundled_job(self, j, dryrun, force)]
+        else:
+            from joblib import Parallel, delayed
+            wid, eid = self._workspace_id, self._experiment_id
+            ok = Parallel(n_jobs=nworkers, backend='multiprocessing')(
+                delayed(_run_bundled_job_worker)(wid, eid, j, dryrun, force)
+                for j in jobids)
+            failed = [j for (j, o) in zip(jobids, ok) if not o]
+
+        if len(failed) > 0:
+            raise RuntimeError('Jobs %s have failed.' % format_jobids(failed))
+
+    def error_index_path(self, jobid):
+        fp = join(self.folder, 'error', self.split_folder(jobid))
+        fp = join(fp, str(jobid) + '.pkl')
+        return fp
+
+    def _store_error_index(self, jobid, task_results):
+        fp = self.error_index_path(jobid)
+        make_sure_path_exists(os.path.dirname(fp))
+        task.store_error_index(task.error_index(task_results), fp)
+
+    def error_index(self, rescan=False):
+        """Failed task results per method and error class, read from the
+        error indices stored by each job.
+
+        :param bool rescan: rebuilds the error indices from the results,
+                            e.g. for results stored before error indexing.
+        """
+        if rescan:
+            folder = join(self.folder, 'result')
+            for (jobid, trs) in tqdm(_shard.iter_job_results(folder),
+                                     desc='Indexing errors'):
+                self._store_error_index(jobid, list(trs.values()))
+        return task.collect_error_index(join(self.folder, 'error'))
+
+    @property
+    def queue(self):
+        return JobQueue(join(self.folder, 'queue'), self.lease_time)
+
+    def fill_queue(self):
+        """Puts every unfinished job in the shared job queue."""
+        jobids = [j.jobid for j in self.get_jobs() if not j.finished]
+        self.queue.fill(jobids)
+        return len(jobids)
+
+    def run_queue(self, dryrun=False, force=False):
+        """Runs jobs leased from the shared job queue until it is empty."""
+        import traceback
+
+        queue = self.queue
+        if not queue.exists():
+            print("There is no job queue for this experiment.")
+            return
+
+        jobid = queue.lease()
+        while jobid is not None:
+            self._logger.info('Running job %d from the queue.', jobid)
+            try:
+                with queue.keep_alive(jobid):
+                    self.run_job(jobid, dryrun=dryrun, force=force)
+            except Exception:
+                msg = traceback.format_exc()
+                self._logger.error('Job %d has failed:\n%s', jobid, msg)
+                queue.release(jobid, failed=True, msg=msg)
+            else:
+                queue.release(jobid)
+            jobid = queue.lease()
+
+    @property
+    def _workers_path(self):
+        return join(self.folder, '.workers')
+
+    @property
+    def worker_runids(self):
+        """IDs of the cluster runs of the queue workers submitted by
+        :meth:`submit_workers`."""
+        if not os.path.exists(self._workers_path):
+            return []
+        with open(self._workers_path, 'r') as f:
+            return [l.strip() for l in f if len(l.strip()) > 0]
+
+    def submit_workers(self, nworkers, dryrun, requests=None, queue=None):
+        """Submits `nworkers` cluster jobs that run jobs from the shared
+        job queue."""
+        jobs = self.get_jobs()
+        peak = self._observe_memory(jobs)
+        jobs = [j for j in jobs if not j.finished]
+        if len(jobs) == 0:
+            print('There is no unfinished job.')
+            return
+
+        self.fill_queue()
+        mb = max(self.job_request_megabytes(j, peak) for j in jobs)
+        cmd = self._new_cluster_run(mb, requests, queue)
+        for _ in range(min(nworkers, len(jobs))):
+            cmd.add(self._rjob_cmd(None, dryrun))
+
+        self.runid = cmd.run(dryrun=dryrun)
+        if not dryrun:
+            cmd.store()
+            with open(self._workers_path, 'a') as f:
+                f.write('%s\n' % self.runid)
 
     @property
     def are_init_jobs_files_generated(self):
@@ -189,7 +597,9 @@ class Experiment(object):
         return os.path.exists(fp)
 
     def finish_setup(self):
-        make_sure_path_exists(self.folder)
+        if not os.path.exists(self.folder):
+            make_sure_path_exists(self.folder)
+            _registry.register(self._workspace_id, self._experiment_id)
 
         ta = task.TaskArgs()
         self.define_task_args(ta)
@@ -215,6 +625,9 @@ class Experiment(object):
                 raise Exception('No job has been generated.')
 
             print('   %d generated jobs   ' % len(jobs))
+            if self.packing == 'cost':
+                job_task_ids = self._pack_tasks(tasks)
+                task.store_job_task_ids(job_task_ids, self._job_tasks_path)
             self._store_jobs(jobs)
             fp = join(self.folder, '.init_jobs_files_generated')
             touch(fp)
@@ -223,89 +636,391 @@ class Experiment(object):
 
     # @cachedmethod(attrgetter('_cache'))
     def get_job(self, jobid):
-        return load_job(self.job_path(jobid))
+        job = load_job(self.job_path(jobid))
+        self._apply_job_states([job])
+        return job
 
     # @cachedmethod(attrgetter('_cache'))
     def get_jobs(self):
         folder = join(self.folder, 'job')
-        jobs = collect_jobs(folder)
+        jobs = dict(collect_jobs(folder) or dict())
+        self._restore_jobs(jobs)
         keys = list(jobs.keys())
         vals = list(jobs.values())
-        return [j for (_, j) in sorted(zip(keys, vals))]
+        jobs = [j for (_, j) in sorted(zip(keys, vals))]
+        self._apply_job_states(jobs)
+        return jobs
+
+    def _restore_jobs(self, jobs):
+        # job files found corrupt are quarantined while merging; their jobs
+        # are stored again, finished if their results are there
+        if not self.njobs:
+            return
+        missing = sorted(set(range(self.njobs)) - set(jobs.keys()))
+        if len(missing) == 0:
+            return
+        self._logger.warn('Jobs %s have no valid job file and have been'
+                          ' regenerated.', format_jobids(missing))
+        index = _shard.load_index(join(self.folder, 'result'))
+        for jobid in missing:
+            j = Job(self._workspace_id, self._experiment_id, jobid)
+            j.finished = (jobid in index or
+                          os.path.exists(self.task_result_path(jobid)))
+            self._store_jobs([j])
+            jobs[jobid] = j
+
+    @property
+    def _job_states_path(self):
+        return join(self.folder, 'job_states.pkl')
+
+    def _apply_job_states(self, jobs):
+        # submission states are kept in a single file, written at once by
+        # the submitting process, and take precedence over the job files
+        states = load_job_states(self._job_states_path)
+        for j in jobs:
+            if j.jobid in states:
+                j.set_state(states[j.jobid])
+
+    def _store_job_states(self, jobs):
+        # submitting processes, e.g. a resubmission running alongside a
+        # submission, must not overwrite each other's states
+        with FileLock(join(self.folder, '.job_states.lock')):
+            states = load_job_states(self._job_states_path)
+            changed = {j.jobid: j.get_state() for j in jobs
+                       if states.get(j.jobid) != j.get_state()}
+            if len(changed) == 0:
+                return
+            states.update(changed)
+            store_job_states(states, self._job_states_path)
 
-    def _get_job_task_ids(self, jobid):
+    @property
+    def _job_tasks_path(self):
+        return join(self.folder, 'job_tasks.pkl')
+
+    def job_task_ids(self, jobid):
+        """IDs of the tasks run by the job `jobid`.
+
+        Tasks are split into equal-size contiguous blocks unless a packing
+        has been stored by :meth:`finish_setup`.
+        """
         import numpy as np
-        ntasks = len(self.get_tasks())
+
+        if self._job_task_ids is None:
+            fp = self._job_tasks_path
+            if os.path.exists(fp):
+                self._job_task_ids = task.load_job_task_ids(fp)
+            else:
+                self._job_task_ids = False
+
+        if self._job_task_ids:
+            return list(self._job_task_ids[jobid])
+
+        ntasks = self.ntasks
         task2job = np.floor(self.njobs * np.arange(ntasks) / ntasks)
         task2job = np.asarray(task2job, int)
         task_ids = list(np.where(task2job == jobid)[0])
         return task_ids
 
-    def resubmit(self, jobid):
-        job = self.get_job(jobid)
-        cr = clusterrun.load(self.runid)
-        cr.resubmit(job.bjobid)
-
-    def submit_jobs(self, dryrun, requests=None, queue=None, verbose=False):
+    def resubmit(self, jobid, requests=None, queue=None, memory=None):
+        self.resubmit_jobs([self.get_job(jobid)], False, requests=requests,
+                           queue=queue, memory=memory)
+
+    def failed_jobs(self):
+        """Jobs that have failed or whose bjobs have been lost."""
+        pruned = self.pruned_jobids()
+        jobs = [j for j in self.get_jobs() if j.jobid not in pruned]
+        return [j for j in tqdm(jobs, desc='Checking jobs')
+                if j.failed or j.lost]
+
+    def resubmit_jobs(self, jobs, dryrun, requests=None, queue=None,
+                      memory=None):
+        """Resubmits the given jobs as a single batch.
+
+        :param str memory: memory to request for every job (e.g., ``'8GB'``)
+                           instead of the usual request.
+        """
+        peak = self._observe_memory(jobs)
+        megabytes = None
+        if memory is not None:
+            megabytes = _parse_megabytes(memory)
+        self._submit(jobs, peak, dryrun, requests, queue, megabytes)
+
+    def submit_jobs(self, dryrun, requests=None, queue=None, verbose=False,
+                    pilot=None):
         jobs = self.get_jobs()
-        myrand = random.Random(937628)
-        myrand.shuffle(jobs)
+        peak = self._observe_memory(jobs)
+        jobs = {j.jobid: j for j in jobs}
+        pruned = self.pruned_jobids()
+        jobids = [i for i in sorted(jobs.keys())
+                  if not jobs[i].finished and i not in pruned]
+
+        jobids = self.plan_submission(jobids)
+        if pilot is not None:
+            jobids = jobids[:pilot]
+
+        self._submit([jobs[i] for i in jobids], peak, dryrun, requests, queue)
+
+    def plan_submission(self, jobids, order=None):
+        """Order in which the given jobs are submitted.
+
+        :param str order: ``'shuffle'``, ``'longest'`` (see :meth:`job_costs`)
+                          or ``'interleave'`` (see :meth:`submission_key`).
+                          Defaults to `submission_order`.
+        :returns: an array of job IDs.
+        """
+        if order is None:
+            order = self.submission_order
+        return _planner.plan(jobids, order, costs=self.job_costs,
+                             keys=self.job_keys)
+
+    def job_costs(self, jobids):
+        """Expected cost of each job: the sum of the elapsed times measured
+        for its tasks in this experiment or, failing that, of their
+        :meth:`task_cost`. Unknown if no task cost is known."""
+        tasks = self._get_tasks()
+        costs = []
+        for jobid in jobids:
+            known = []
+            for i in self.job_task_ids(jobid):
+                tr = self.get_task_result(i)
+                if tr is not None and tr.total_elapsed == tr.total_elapsed:
+                    known.append(tr.total_elapsed)
+                else:
+                    c = self.task_cost(tasks[i])
+                    if c is not None and c == c:
+                        known.append(c)
+            costs.append(sum(known) if len(known) > 0 else None)
+        return costs
+
+    def submission_key(self, task):
+        """Key used by the ``'interleave'`` submission order, typically a
+        parameter value of the task. Jobs are keyed by their first task."""
+        return None
+
+    def job_keys(self, jobids):
+        tasks = self._get_tasks()
+        keys = []
+        for jobid in jobids:
+            task_ids = self.job_task_ids(jobid)
+            if len(task_ids) == 0:
+                keys.append(None)
+            else:
+                keys.append(self.submission_key(tasks[task_ids[0]]))
+        return keys
 
+    def _submit(self, jobs, peak, dryrun, requests, queue, megabytes=None):
+        groups = dict()
+        for j in jobs:
+            mb = megabytes
+            if mb is None:
+                mb = self.job_request_megabytes(j, peak)
+            groups.setdefault(mb, []).append(j)
+
+        runids = []
+        for mb in sorted(groups.keys()):
+            group = groups[mb]
+            size = max(int(self.bundle_size), 1)
+            bundles = [group[i:i + size] for i in range(0, len(group), size)]
+            if self.array_submission:
+                runids += self._submit_arrays(bundles, mb, dryrun, requests,
+                                              queue)
+                continue
+            cmd = self._new_cluster_run(mb, requests, queue)
+            for b in bundles:
+                cmd.add(self._rjob_cmd(_bundle_spec(b), dryrun))
+
+            runids.append(cmd.run(dryrun=dryrun))
+            for (b, bjob) in zip(bundles, cmd.jobs):
+                for j in b:
+                    j.set_bjob(bjob, mb)
+
+            if not dryrun:
+                cmd.store()
+
+        if len(runids) > 0:
+            self.runids = runids
+        if not dryrun:
+            self._store_job_states(jobs)
+
+    def _submit_arrays(self, bundles, megabytes, dryrun, requests, queue):
+        """Submits bundles of jobs as job arrays of at most `max_array_size`
+        elements, one scheduler call per array.
+
+        :returns: the run IDs of the arrays.
+        """
+        size = self.max_array_size
+        runids = []
+        for i in range(0, len(bundles), size):
+            chunk = bundles[i:i + size]
+            run = _array.ArrayRun(join(self.folder, 'array'),
+                                  [_bundle_spec(b) for b in chunk])
+            cmd = self._rjob_cmd(None, dryrun, array=run.mapping_fpath)
+            bcmd = run.bsub_cmd(
+                cmd, megabytes, self.nprocs, self.mkl_nthreads, queue,
+                requests, name='%s.%s' % (self._workspace_id,
+                                          self._experiment_id))
+            njobs = sum(len(b) for b in chunk)
+            if run.submit(bcmd) is None:
+                self._logger.warn('Job array %s could not be submitted: %s',
+                                  run.runid, run.edata.strip())
+            else:
+                print('Job array %s of %d jobs has been submitted.' %
+                      (run.runid, njobs))
+            runids.append(run.runid)
+            for (b, element) in zip(chunk, run.elements()):
+                for j in b:
+                    j.set_bjob(element, megabytes)
+        return runids
+
+    def _new_cluster_run(self, megabytes, requests, queue):
         title = '/%s/%s' % (self._workspace_id, self._experiment_id)
         cmd = ClusterRun(title)
         cmd.queue = queue
-        cmd.memory = self.job_memory
+        cmd.megabytes = megabytes
         cmd.mkl_nthreads = self.mkl_nthreads
         cmd.nprocs = self.nprocs
         if requests is not None:
             for request in requests:
                 cmd.request(request)
+        return cmd
+
+    def _rjob_cmd(self, jobid, dryrun, array=None):
+        a = ['arauto']
+        if self._logger.isEnabledFor(logging.DEBUG):
+            a += ['--verbose']
+        a += ['rjob', self._workspace_id]
+        a += [self._experiment_id]
+        if array is not None:
+            a += ['--array', array]
+        elif jobid is None:
+            a += ['--pull']
+        else:
+            a += [jobid]
+        if dryrun:
+            a += ['--dryrun']
+        else:
+            a += ['--no-dryrun']
+        return a
+
+    def _observe_memory(self, jobs):
+        """Peak memory used by any of the given jobs in earlier runs."""
+        if not self.auto_memory:
+            return None
+
+        peaks = []
+        for j in tqdm(jobs, desc='Observing memory usage'):
+            j.observe_memory()
+            if j.max_memory is not None:
+                peaks.append(j.max_memory)
+
+        if len(peaks) == 0:
+            return None
+        return max(peaks)
+
+    def job_request_megabytes(self, job, peak=None):
+        """Memory in megabytes to be requested for `job`.
+
+        In auto memory mode, the request is the peak memory observed for this
+        job in an earlier run or, failing that, the largest peak observed
+        for any job (e.g., pilot jobs) plus a safety margin. Jobs killed for
+        reaching the memory limit get at least `memlimit_factor` times their
+        previous request.
+        """
+        if not self.auto_memory:
+            return self._job_megabytes
+
+        nbytes = job.max_memory
+        if nbytes is None:
+            nbytes = peak
+        if nbytes is None:
+            return self._job_megabytes
+
+        mb = nbytes * (1 + self.memory_margin) / 1024. / 1024.
+        if job.memlimit_reached:
+            previous = job.memory
+            if previous is None:
+                previous = self._job_megabytes
+            mb = max(mb, self.memlimit_factor * previous)
+
+        return _round_megabytes(mb)
+
+    def watch(self, interval=5., max_interval=120.):
+        """Periodically prints job counts, task throughput and ETA until no
+        job is left pending or running. Jobs that were never submitted are
+        counted as waiting but do not keep the loop alive.
+
+        Scheduler state is queried and result files are scanned
+        incrementally at each poll without reloading the experiment. The
+        polling interval grows while nothing changes, up to `max_interval`
+        seconds.
+        """
+        import time
+        from humanfriendly import format_timespan
+        from limix_lsf import util
+        from ._watch import ResultFiles, Throughput, _mtime
 
-        for j in jobs:
-            a = ['arauto']
-            if self._logger.isEnabledFor(logging.DEBUG):
-                a += ['--verbose']
-            a += ['rjob', self._workspace_id]
-            a += [self._experiment_id]
-            a += [j.jobid]
-            if dryrun:
-                a += ['--dryrun']
+        jobs = self.get_jobs()
+        ntasks = {j.jobid: len(self.job_task_ids(j.jobid)) for j in jobs}
+        total = sum(ntasks.values())
+        results = ResultFiles(join(self.folder, 'result'))
+        throughput = Throughput()
+        states_mtime = _mtime(self._job_states_path)
+
+        delay = interval
+        last = None
+        while True:
+            util.get_jobs_stat.stats = None
+            _array.get_scheduler().reset()
+            mtime = _mtime(self._job_states_path)
+            if mtime != states_mtime:
+                states_mtime = mtime
+                self._apply_job_states(jobs)
+
+            finished = results.finished_jobids()
+            counts = dict(waiting=0, pending=0, running=0, finished=0,
+                          failed=0, lost=0, unknown=0)
+            for j in jobs:
+                counts[_watch_status(j, finished)] += 1
+
+            nfinished = sum(ntasks[i] for i in finished if i in ntasks)
+            throughput.update(nfinished)
+
+            rate = throughput.rate
+            rate = 'n/a' if rate is None else '%.3f' % rate
+            eta = throughput.eta(total - nfinished)
+            table = [['# %s jobs' % k, str(counts[k])] for k in sorted(counts)]
+            table.append(['# finished tasks', '%d/%d' % (nfinished, total)])
+            table.append(['tasks/s', rate])
+            eta = 'n/a' if eta is None else format_timespan(eta)
+            table.append(['ETA', eta])
+            print(time.strftime('%Y-%m-%d %H:%M:%S'))
+            print(tabulate(table))
+
+            if counts['pending'] + counts['running'] == 0:
+                break
+
+            state = sorted(counts.items())
+            if state == last:
+                delay = min(delay * 1.5, max_interval)
             else:
-                a += ['--no-dryrun']
-            cmd.add(a)
+                delay = interval
+            last = state
+            time.sleep(delay)
 
-        self.runid = cmd.run(dryrun=dryrun)
-        for (i, j) in enumerate(cmd.jobs):
-            jobs[i].bjobid = j.jobid
-            jobs[i].brunid = j.runid
-            jobs[i].submitted = True
-
-        if not dryrun:
-            self._store_jobs(jobs)
-            cmd.store()
-
-    def method_errors(self):
-        tasks = self.get_tasks()
-        if len(tasks) == 0:
-            return
-        task_results = self.get_task_results()
+    def method_errors(self, top=10, rescan=False):
+        """Prints the `top` most frequent error classes of each method."""
+        index = self.error_index(rescan=rescan)
         properties = self._properties
 
-        methods = task_results[0].methods
-        err_msgs = {m: set() for m in methods}
-        for tr in task_results:
-            for method in methods:
-                s = err_msgs[method]
-                if tr.error_status != 0:
-                    s.add(tr.error_msg(method))
-
-        ml = {m: properties[m]['label'] for m in methods}
-
-        for m in methods:
-            print('Error messages for %s:' % ml[m])
-            if len(err_msgs[m]) > 0:
-                for msg in err_msgs[m]:
-                    print(msg)
+        for m in sorted(index.keys()):
+            label = properties.get(m, dict()).get('label', m)
+            entries = sorted(index[m].values(), key=lambda e: -e['count'])
+            nerrors = sum(e['count'] for e in entries)
+            print('Error messages for %s (%d failed tasks, %d classes):' %
+                  (label, nerrors, len(entries)))
+            table = [[e['count'], str(e['task_ids']), e['msg']]
+                     for e in entries[:top]]
+            print(tabulate(table, headers=['count', 'task ids', 'message']))
 
     def _store_task_results(self, folder_split, jobid, task_results):
         base = join(self.folder, 'result', folder_split)
@@ -317,15 +1032,11 @@ class Experiment(object):
     def bgroup(self):
         return '/' + self._workspace_id + '/' + self._experiment_id
 
-    def __str__(self):
-        table = []
-        table.append(['# jobs', str(self.njobs)])
-        table.append(['# tasks', str(self.ntasks)])
-
+    def _jobs_info(self):
         jobs = list(self.get_jobs())
 
         data = []
-        size = int(ceil(len(jobs) / 100))
+        size = max(int(ceil(len(jobs) / 100)), 1)
         niters = int(ceil(len(jobs) / size))
         for i in tqdm(range(niters), 'Getting jobs'):
             left = i * size
@@ -334,14 +1045,37 @@ class Experiment(object):
             r = map(_get_job_info, jslice)
             data += list(r)
 
+        pruned = self.pruned_jobids()
+        for (j, d) in zip(jobs, data):
+            if j.jobid in pruned and d['status'] != 'finished':
+                d['status'] = 'pruned'
+        return data
+
+    def job_status_counts(self):
+        """Number of jobs per status: waiting, pending, running, finished,
+        failed, lost, pruned and unknown."""
+        counts = {s: 0 for s in _job_statuses}
+        for d in self._jobs_info():
+            counts[d['status']] += 1
+        return counts
+
+    def __str__(self):
+        table = []
+        table.append(['# jobs', str(self.njobs)])
+        table.append(['# tasks', str(self.ntasks)])
+
+        data = self._jobs_info()
+
         nfin = sum(r['status'] == 'finished' for r in data)
         nfail = sum(r['status'] == 'failed' for r in data)
         npend = sum(r['status'] == 'pending' for r in data)
         nrun = sum(r['status'] == 'running' for r in data)
         nunk = sum(r['status'] == 'unknown' for r in data)
+        nlost = sum(r['status'] == 'lost' for r in data)
         nwait = sum(r['status'] == 'waiting' for r in data)
+        npruned = sum(r['status'] == 'pruned' for r in data)
 
-        nsub = nfin + nfail + npend + nrun + nunk
+        nsub = nfin + nfail + npend + nrun + nunk + nlost
 
         table.append(['# waiting jobs', str(nwait)])
         table.append(['# submitted jobs', str(nsub)])
@@ -349,10 +1083,20 @@ class Experiment(object):
         table.append(['# running jobs', str(nrun)])
         table.append(['# finished jobs', str(nfin)])
         table.append(['# failed jobs', str(nfail)])
+        table.append(['# lost jobs', str(nlost)])
+        if npruned > 0:
+            table.append(['# pruned jobs', str(npruned)])
+
+        if self.queue.exists():
+            counts = self.queue.counts()
+            for state in JobQueue.states:
+                table.append(['# %s jobs in queue' % state,
+                              str(counts[state])])
 
         max_memories = []
         req_memories = []
         failed_jobids = [d['jobid'] for d in data if d['status'] == 'failed']
+        lost_jobids = [d['jobid'] for d in data if d['status'] == 'lost']
         for d in data:
             if d['resource_info'] is not None:
                 dri = d['resource_info']
@@ -389,6 +1133,13 @@ class Experiment(object):
             msg += '\nFailed jobs: ' + str(failed_jobids)
             msg += '\n'
 
+        if nlost > 0:
+            msg += '\nLost jobs: ' + str(lost_jobids)
+            msg += '\n'
+
+        if nfail + nlost > 0:
+            msg += "Use 'arauto resubmit' to resubmit them.\n"
+
         return msg
 
 
@@ -400,10 +1151,77 @@ def _namespace2task(workspace_id, experiment_id, n):
     return t
 
 
+def _parse_megabytes(siz):
+    nbytes = parse_size(siz)
+    return int(round(nbytes / 1024. / 1024.))
+
+
+def _round_megabytes(mb, step=128):
+    # coarse sizes keep the number of cluster runs per submission small
+    return int(ceil(mb / float(step)) * step)
+
+
+def _watch_status(j, finished):
+    if j.jobid in finished:
+        return 'finished'
+    if not j.submitted:
+        return 'waiting'
+    bjob = j.get_bjob()
+    if bjob.ispending():
+        return 'pending'
+    if bjob.isrunning():
+        return 'running'
+    if j.failed:
+        return 'failed'
+    if j.lost:
+        return 'lost'
+    return 'unknown'
+
+
+def _bundle_spec(jobs):
+    return format_jobids(sorted(j.jobid for j in jobs))
+
+
+def _run_bundled_job(e, jobid, dryrun, force):
+    import traceback
+    try:
+        e.run_job(jobid, dryrun=dryrun, force=force)
+    except Exception:
+        e._logger.error('Job %d has failed:\n%s', jobid,
+                        traceback.format_exc())
+        return False
+    return True
+
+
+def _run_bundled_job_worker(workspace_id, experiment_id, jobid, dryrun,
+                            force):
+    # forked workers find the experiment already set up by their parent
+    from .workspace import get_experiment
+    e = get_experiment(workspace_id, experiment_id)
+    return _run_bundled_job(e, jobid, dryrun, force)
+
+
+_job_statuses = [
+    'waiting', 'pending', 'running', 'finished', 'failed', 'lost', 'pruned',
+    'unknown'
+]
+
+
+def _os_jobspec(job):
+    bjob = job.get_bjob()
+    if job.barray is not None:
+        return '%d[%d]' % (bjob.os_jobid, bjob.index)
+    return str(bjob.os_jobid)
+
+
 def _get_job_info(j):
     d = dict(status=None, bjob=None, jobid=-1, resource_info=None)
 
-    if j.submitted:
+    if j.finished and not j.submitted:
+        # run by a worker of the shared job queue
+        d['status'] = 'finished'
+
+    elif j.submitted:
         if j.finished:
             d['status'] = 'finished'
             bj = j.get_bjob()
@@ -420,6 +1238,10 @@ def _get_job_info(j):
         elif j.get_bjob().isrunning():
             d['status'] = 'running'
 
+        elif j.lost:
+            d['status'] = 'lost'
+            d['jobid'] = j.jobid
+
         else:
             d['status'] = 'unknown'
     else:
@@ -10,9 +10,33 @@ class IArauto(cmd.Cmd):
     def do_root(self, _):
         arauto.do_root()
 
+    def do_rescan(self, _):
+        arauto.do_rescan()
+
     def do_save(self, cmdline):
         arauto.parse_save(shlex.split(cmdline))
 
+    def do_compact(self, cmdline):
+        arauto.parse_compact(shlex.split(cmdline))
+
+    def do_bench_io(self, cmdline):
+        arauto.parse_bench_io(shlex.split(cmdline))
+
+    def do_prune(self, cmdline):
+        arauto.parse_prune(shlex.split(cmdline))
+
+    def do_pull(self, cmdline):
+        arauto.parse_pull(shlex.split(cmdline))
+
+    def do_prof(self, cmdline):
+        arauto.parse_prof(shlex.split(cmdline))
+
+    def do_cache(self, cmdline):
+        arauto.parse_cache(shlex.split(cmdline))
+
+    def do_export(self, cmdline):
+        arauto.parse_export(shlex.split(cmdline))
+
     def do_jinfo(self, cmdline):
         arauto.parse_jinfo(shlex.split(cmdline))
 
@@ -22,12 +46,21 @@ class IArauto(cmd.Cmd):
     def do_winfo(self, cmdline):
         arauto.parse_winfo(shlex.split(cmdline))
 
+    def do_wsjobs(self, cmdline):
+        arauto.parse_wsjobs(shlex.split(cmdline))
+
+    def do_wcollect(self, cmdline):
+        arauto.parse_wcollect(shlex.split(cmdline))
+
     def do_rjob(self, cmdline):
         arauto.parse_rjob(shlex.split(cmdline))
 
     def do_rm_exp(self, cmdline):
         arauto.parse_rm_exp(shlex.split(cmdline))
 
+    def do_resubmit(self, cmdline):
+        arauto.parse_resubmit(shlex.split(cmdline))
+
     def do_err(self, cmdline):
         arauto.parse_err(shlex.split(cmdline))
 
@@ -1,19 +1,31 @@
+import logging
 import os
 from operator import attrgetter
 
-import numpy as np
-
 from cachetools import LRUCache, cachedmethod
+from humanfriendly import format_size
 from limix_lsf import clusterrun
-from pickle_blosc import pickle, unpickle
 from tqdm import tqdm
 
+from . import _array
+from ._cache import cache_manager
+from ._dataset import dataset_cache
+from ._lock import FileLock
 from ._path import folder_hash
-from ._pickle_files import pickle_merge
+from ._pickle_files import (CorruptFileError, cache_files, dump, load,
+                            pickle_merge, quarantine)
+from ._profile import TaskProfiler
+from ._resource import ResourceUsage
 from ._timer import Timer
 
 
 class Job(object):
+    # defaults for jobs stored before memory sizing was introduced
+    memory = None
+    max_memory = None
+    memlimit_reached = False
+    barray = None
+
     def __init__(self, workspace_id, experiment_id, jobid):
         super(Job, self).__init__()
         self._cache = LRUCache(maxsize=1)
@@ -24,6 +36,10 @@ class Job(object):
         self.submitted = False
         self.bjobid = None
         self.brunid = None
+        self.barray = None
+        self.memory = None
+        self.max_memory = None
+        self.memlimit_reached = False
 
     @property
     def failed(self):
@@ -35,20 +51,66 @@ class Job(object):
 
     @cachedmethod(attrgetter('_cache'))
     def get_bjob(self):
+        if self.barray is not None:
+            return _array.get_element(self.barray, self.bjobid)
         bjob = clusterrun.get_bjob(self.brunid, self.bjobid)
         return bjob
 
+    @property
+    def lost(self):
+        """Whether its bjob has ended or disappeared without the job having
+        finished or failed."""
+        if not self.submitted or self.finished:
+            return False
+        bjob = self.get_bjob()
+        if bjob.stat() == 'UNKNOWN':
+            return True
+        return bjob.hasfinished() and not self.failed
+
+    def set_bjob(self, bjob, megabytes):
+        """Associates this job with a newly submitted bjob."""
+        self._cache.clear()
+        self.bjobid = bjob.jobid
+        self.brunid = bjob.runid
+        self.barray = getattr(bjob, 'array_fpath', None)
+        self.submitted = True
+        self.memory = megabytes
+
+    def get_state(self):
+        """Submission state, stored apart from the job file."""
+        return dict(bjobid=self.bjobid, brunid=self.brunid,
+                    barray=self.barray, memory=self.memory,
+                    max_memory=self.max_memory,
+                    memlimit_reached=self.memlimit_reached)
+
+    def set_state(self, state):
+        state = dict(state)
+        # states stored before job arrays were introduced have no array
+        state.setdefault('barray', None)
+        key = (state['bjobid'], state['brunid'], state['barray'])
+        if key != (self.bjobid, self.brunid, self.barray):
+            self._cache.clear()
+        for (k, v) in state.items():
+            setattr(self, k, v)
+        self.submitted = True
+
+    def observe_memory(self):
+        """Reads the peak memory of the last bjob once it has finished."""
+        if not self.submitted:
+            return
+        bjob = self.get_bjob()
+        info = bjob.resource_info()
+        if info is None or info['max_memory'] is None:
+            return
+        self.max_memory = info['max_memory']
+        self.memlimit_reached = 'TERM_MEMLIMIT' in (bjob.stdout() or '')
+
     @property
     def task_ids(self):
         from . import workspace
 
         e = workspace.get_experiment(self._workspace_id, self._experiment_id)
-
-        task2job = np.floor(e.njobs * np.arange(e.ntasks) / e.ntasks)
-        task2job = np.asarray(task2job, int)
-        task_ids = list(np.where(task2job == self.jobid)[0])
-
-        return task_ids
+        return e.job_task_ids(self.jobid)
 
     def get_tasks(self):
         from . import workspace
@@ -58,18 +120,46 @@ class Job(object):
         e = workspace.get_experiment(self._workspace_id, self._experiment_id)
 
         tasks = e.get_tasks()
+        pruned = e.pruned_task_ids()
+        if len(pruned) > 0:
+            n = len(task_ids)
+            task_ids = [tid for tid in task_ids if tid not in pruned]
+            if len(task_ids) < n:
+                print('Skipping %d pruned tasks.' % (n - len(task_ids)))
         return [tasks[tid] for tid in task_ids]
 
     def run(self):
+        from . import workspace
+
+        e = workspace.get_experiment(self._workspace_id, self._experiment_id)
         tasks = self.get_tasks()
         task_results = []
 
+        cache = dataset_cache
+        first = cache.stats()
         for task in tqdm(tasks):
-            with Timer() as timer:
+            before = cache.stats()
+            profiler = TaskProfiler(e.profiled(task.task_id))
+            usage = ResourceUsage(e.trace_memory)
+            with Timer() as timer, usage, profiler:
                 tr = task.run()
+            if profiler.enabled:
+                profiler.dump(e.profile_folder(self.jobid), task.task_id)
             tr.total_elapsed = timer.elapsed
+            tr.total_cpu_time = usage.cpu_time
+            tr.total_peak_memory = usage.peak_memory
+            tr.total_nallocs = usage.nallocs
+            tr.dataset_hits = cache.hits - before['hits']
+            tr.dataset_misses = cache.misses - before['misses']
+            tr.dataset_load_time = cache.load_time - before['load_time']
             task_results.append(tr)
 
+        if cache.hits + cache.misses > first['hits'] + first['misses']:
+            logging.getLogger(__name__).info(
+                'Dataset cache: %d hits, %d misses, %.2f s loading.',
+                cache.hits - first['hits'], cache.misses - first['misses'],
+                cache.load_time - first['load_time'])
+
         self.finished = True
 
         return task_results
@@ -95,33 +185,125 @@ class Job(object):
         table.append(['Bjob exit status', bjob_exit_status])
         table.append(['Bjob OS id', bjob_os_id])
 
+        if self.memory is not None:
+            table.append(['Req. memory', format_size(self.memory * 1024**2)])
+        if self.max_memory is not None:
+            table.append(['Max used memory', format_size(self.max_memory)])
+
         return tabulate(table)
 
 
+def parse_jobids(spec):
+    """Job IDs of a comma-separated list of IDs and inclusive ranges.
+
+    >>> parse_jobids('3,10-12,7')
+    [3, 10, 11, 12, 7]
+    """
+    jobids = []
+    for item in str(spec).split(','):
+        item = item.strip()
+        if len(item) == 0:
+            continue
+        if '-' in item:
+            (first, last) = item.split('-')
+            jobids += list(range(int(first), int(last) + 1))
+        else:
+            jobids.append(int(item))
+    return jobids
+
+
+def format_jobids(jobids):
+    """Shortest specification of `jobids` understood by `parse_jobids`.
+
+    >>> format_jobids([3, 10, 11, 12, 7])
+    '3,10-12,7'
+    """
+    items = []
+    for jobid in jobids:
+        if len(items) > 0 and items[-1][1] + 1 == jobid:
+            items[-1][1] = jobid
+        else:
+            items.append([jobid, jobid])
+    return ','.join(
+        str(a) if a == b else '%d-%d' % (a, b) for (a, b) in items)
+
+
 def store_jobs(jobs, fpath):
     print('Storing jobs...')
-    pickle({t.jobid: t for t in jobs}, fpath)
+    dump({t.jobid: t for t in jobs}, fpath)
     print('   %d jobs stored   ' % len(jobs))
 
 
 def store_job(job, fpath):
-    pickle(job, fpath)
+    dump(job, fpath)
 
 
 def load_job(fpath):
-    return unpickle(fpath)
+    return load(fpath)
 
 
-def collect_jobs(folder):
-    exist = os.path.exists(os.path.join(folder, 'all.pkl'))
+def load_job_states(fpath):
+    if not os.path.exists(fpath):
+        return dict()
+    return load(fpath)
 
-    if exist:
-        ha = folder_hash(folder, ['all.pkl', '.folder_hash'])
-        fh = os.path.join(folder, '.folder_hash')
-        ok = os.path.exists(fh)
-        ok = ok and ha == open(os.path.join(folder, '.folder_hash')).read(32)
-        if ok:
-            print('Unpickling jobs')
-            return unpickle(os.path.join(folder, 'all.pkl'))
 
-    return pickle_merge(folder)
+def store_job_states(states, fpath):
+    dump(states, fpath)
+
+
+def collect_jobs(folder):
+    """Loads all jobs of `folder`, merging the job files into ``all.pkl``
+    if they have changed since the last merge.
+
+    Only one process merges at a time. Meanwhile, other processes read the
+    previous ``all.pkl`` if there is one, or wait for the merge to finish.
+    """
+    jobs = _load_merged_jobs(folder, check=True)
+    if jobs is not None:
+        return jobs
+
+    lock = FileLock(os.path.join(folder, '.merge.lock'))
+    if not lock.acquire(blocking=False):
+        jobs = _load_merged_jobs(folder, check=False)
+        if jobs is not None:
+            print('Another process is merging job files. Using the previous'
+                  ' merge.')
+            return jobs
+        print('Waiting for another process to merge job files...')
+        lock.acquire()
+
+    try:
+        # the merge might have been done while waiting for the lock
+        jobs = _load_merged_jobs(folder, check=True)
+        if jobs is None:
+            jobs = pickle_merge(folder)
+        return jobs
+    finally:
+        lock.release()
+
+
+def _load_merged_jobs(folder, check):
+    fpath = os.path.join(folder, 'all.pkl')
+    if not os.path.exists(fpath):
+        return None
+
+    if check:
+        ha = folder_hash(folder, cache_files)
+        fh = os.path.join(folder, '.folder_hash')
+        if not os.path.exists(fh) or ha != open(fh).read(32):
+            return None
+
+    key = (fpath, os.path.getmtime(fpath))
+    jobs = cache_manager.get('jobs', key)
+    if jobs is not None:
+        return jobs
+
+    print('Unpickling jobs')
+    try:
+        jobs = load(fpath)
+    except CorruptFileError:
+        quarantine(fpath)
+        return None
+    cache_manager.put('jobs', key, jobs)
+    return jobs
@@ -1,13 +1,17 @@
+import hashlib
 import os
+import re
+from contextlib import contextmanager
 
-from pickle_blosc import pickle, unpickle
 from pickle_mixin import PickleByName, SlotPickleMixin
 from tabulate import tabulate
-from cachetools import cached
 
+from . import _shard
+from ._cache import cache_manager
 from ._elapsed import BeginEnd
-from ._path import folder_hash
-from ._pickle_files import pickle_merge
+from ._pickle_files import dump, load
+from ._profile import profiling
+from ._resource import ResourceUsage
 
 
 def extract_successes_and_failures(tasks):
@@ -66,7 +70,10 @@ class Task(PickleByName):
 class TaskResult(SlotPickleMixin):
     __slots__ = [
         'total_elapsed', 'workspace_id', 'experiment_id', 'task_id',
-        '_elapsed', '_error_status', '_error_msg', '_methods'
+        '_elapsed', '_error_status', '_error_msg', '_methods',
+        'total_cpu_time', 'total_peak_memory', 'total_nallocs', '_cpu_time',
+        '_peak_memory', '_nallocs', '_error_key', '_arrays', 'dataset_hits',
+        'dataset_misses', 'dataset_load_time'
     ]
 
     def __init__(self, workspace_id, experiment_id, task_id):
@@ -79,6 +86,17 @@ class TaskResult(SlotPickleMixin):
         self._error_status = dict()
         self._error_msg = dict()
         self._methods = set()
+        self.total_cpu_time = None
+        self.total_peak_memory = None
+        self.total_nallocs = None
+        self._cpu_time = dict()
+        self._peak_memory = dict()
+        self._nallocs = dict()
+        self._error_key = dict()
+        self._arrays = dict()
+        self.dataset_hits = None
+        self.dataset_misses = None
+        self.dataset_load_time = None
 
     def get_task(self):
         from .workspace import get_experiment
@@ -88,12 +106,35 @@ class TaskResult(SlotPickleMixin):
     def elapsed(self, method):
         return self._elapsed[method]
 
+    def cpu_time(self, method):
+        return _get_resource(self, '_cpu_time', method)
+
+    def peak_memory(self, method):
+        return _get_resource(self, '_peak_memory', method)
+
+    def nallocs(self, method):
+        return _get_resource(self, '_nallocs', method)
+
     def error_status(self, method):
         return self._error_status[method]
 
+    def array(self, method, name):
+        """NumPy array `name` attached to `method`."""
+        return getattr(self, '_arrays', dict())[method][name]
+
+    def arrays(self, method):
+        return dict(getattr(self, '_arrays', dict()).get(method, dict()))
+
     def error_msg(self, method):
         return self._error_msg[method]
 
+    def error_key(self, method):
+        """Hash of the normalised error message of `method`."""
+        key = _get_resource(self, '_error_key', method)
+        if key is None:
+            key = error_key(_get_resource(self, '_error_msg', method) or '')
+        return key
+
     @property
     def methods(self):
         return list(self._methods)
@@ -105,57 +146,207 @@ class TaskResult(SlotPickleMixin):
     def set_error_msg(self, method, error_msg):
         self._add_method(method)
         self._error_msg[method] = str(error_msg)
+        self._error_key[method] = error_key(self._error_msg[method])
 
     def set_elapsed(self, method, elapsed):
         self._add_method(method)
         self._elapsed[method] = float(elapsed)
 
+    def set_array(self, method, name, array):
+        """Attaches a NumPy array to `method`.
+
+        Arrays are stored as raw buffers next to the pickled result instead
+        of being pickled as generic objects, and are loaded back without
+        extra copies.
+        """
+        import numpy as np
+        self._add_method(method)
+        arrays = self._arrays.setdefault(method, dict())
+        arrays[name] = np.ascontiguousarray(array)
+
+    def set_resource_usage(self, method, usage):
+        """Stores the measures of a :class:`ResourceUsage` for `method`."""
+        self.set_elapsed(method, usage.elapsed)
+        self._cpu_time[method] = usage.cpu_time
+        self._peak_memory[method] = usage.peak_memory
+        self._nallocs[method] = usage.nallocs
+
+    @contextmanager
+    def measure(self, method):
+        """Records elapsed time, CPU time, peak memory and
+        allocations of the enclosed block of code as those of `method`.
+        The block is also profiled if the task is (see
+        :meth:`.Experiment.profiled`).
+        """
+        with ResourceUsage() as usage, profiling(method):
+            yield usage
+        self.set_resource_usage(method, usage)
+
     def _add_method(self, method):
         self._methods.add(method)
 
-@cached(cache={})
+
+_hex_number = re.compile(r'0x[0-9a-fA-F]+')
+_number = re.compile(r'\b\d+(\.\d+)?([eE][-+]?\d+)?\b')
+
+
+def normalize_error_msg(msg):
+    """Replaces addresses and numbers in an error message so that messages
+    differing only on them are considered the same.
+
+    >>> normalize_error_msg('Singular matrix at 0x7f3a, iteration 12.')
+    'Singular matrix at 0x?, iteration #.'
+    """
+    msg = _hex_number.sub('0x?', msg)
+    msg = _number.sub('#', msg)
+    return ' '.join(msg.split())
+
+
+def error_key(msg):
+    msg = normalize_error_msg(msg)
+    return hashlib.md5(msg.encode('utf-8')).hexdigest()[:16]
+
+
+def _get_resource(task_result, name, method):
+    # results stored before resource accounting have no such attributes
+    return getattr(task_result, name, dict()).get(method)
+
+
 def load_tasks(fpath):
-    print(fpath)
-    with BeginEnd('Loading tasks'):
-        tasks = unpickle(fpath)
-    return tasks
+    """Tasks stored in `fpath`, kept by the cache manager until the file
+    changes or they are evicted."""
+    def _load():
+        print(fpath)
+        with BeginEnd('Loading tasks'):
+            return load(fpath)
+
+    key = (fpath, os.path.getmtime(fpath))
+    return cache_manager.get_or_load('tasks', key, _load)
 
 def store_tasks(tasks, fpath):
     if os.path.exists(fpath):
         return
-    pickle({t.task_id: t for t in tasks}, fpath)
+    dump({t.task_id: t for t in tasks}, fpath)
 
 
 def load_task_args(fpath):
-    return unpickle(fpath)
+    return load(fpath)
 
 
 def store_task_args(task_args, fpath):
     if os.path.exists(fpath):
         return
-    pickle(task_args, fpath)
+    dump(task_args, fpath)
+
+
+def load_job_task_ids(fpath):
+    return load(fpath)
+
+
+def store_job_task_ids(job_task_ids, fpath):
+    dump(job_task_ids, fpath)
 
 
 def collect_task_results(folder, force_cache=False):
     assert force_cache is False
-    fpath = os.path.join(folder, 'all.pkl')
-    exist = os.path.exists(fpath)
+    task_results = dict()
+    for tr in iter_task_results(folder):
+        task_results[tr.task_id] = tr
+    return task_results
+
+
+def iter_task_results(folder, jobids=None):
+    """Iterates over task results reading one result file or shard at a
+    time.
+
+    :param str folder: result folder.
+    :param jobids: reads only the results of these jobs.
+    """
+    for (_, task_results) in _shard.iter_job_results(folder, jobids):
+        for task_id in sorted(task_results.keys()):
+            yield task_results[task_id]
+
+
+def compact_task_results(folder, shard_size):
+    return _shard.compact(folder, shard_size)
+
+
+def has_error(task_result):
+    """Whether any method of a task result has a non-zero error status."""
+    return any(
+        _get_resource(task_result, '_error_status', m) not in (None, 0)
+        for m in task_result.methods)
 
-    if exist:
-        ha = folder_hash(folder, ['all.pkl', '.folder_hash'])
-        fh = os.path.join(folder, '.folder_hash')
-        ok = os.path.exists(fh)
-        ok = ok and ha == open(os.path.join(folder, '.folder_hash')).read(32)
-        if ok:
-            print('Unpickling tasks')
-            return unpickle(os.path.join(folder, 'all.pkl'))
 
-    return pickle_merge(folder)
+def concatenate_arrays(task_results, method, name, axis=0):
+    """Concatenates the array `name` of `method` across task results.
+
+    Task results without such an array are skipped.
+    """
+    import numpy as np
+    arrays = [tr.arrays(method).get(name) for tr in task_results]
+    arrays = [a for a in arrays if a is not None]
+    if len(arrays) == 0:
+        return None
+    return np.concatenate(arrays, axis=axis)
+
+
+def error_index(task_results, nsamples=5):
+    """Counts the failed task results per method and error class.
+
+    :returns: ``{method: {key: entry}}`` where each entry holds an example
+              message `msg`, the `count` of results and up to `nsamples`
+              example `task_ids`.
+    """
+    index = dict()
+    for tr in task_results:
+        for m in tr.methods:
+            if _get_resource(tr, '_error_status', m) in (None, 0):
+                continue
+            msg = _get_resource(tr, '_error_msg', m) or ''
+            entries = index.setdefault(m, dict())
+            entry = entries.setdefault(
+                tr.error_key(m), dict(msg=msg, count=0, task_ids=[]))
+            entry['count'] += 1
+            if len(entry['task_ids']) < nsamples:
+                entry['task_ids'].append(tr.task_id)
+    return index
+
+
+def merge_error_indices(indices, nsamples=5):
+    out = dict()
+    for index in indices:
+        for (m, entries) in index.items():
+            oentries = out.setdefault(m, dict())
+            for (key, entry) in entries.items():
+                if key not in oentries:
+                    oentries[key] = dict(msg=entry['msg'], count=0,
+                                         task_ids=[])
+                oentry = oentries[key]
+                oentry['count'] += entry['count']
+                n = nsamples - len(oentry['task_ids'])
+                oentry['task_ids'] += entry['task_ids'][:max(n, 0)]
+    return out
+
+
+def store_error_index(index, fpath):
+    dump(index, fpath)
+
+
+def collect_error_index(folder):
+    """Merges the error indices of every job, read from their own files or
+    from the shards they have been compacted into."""
+    indices = _shard.iter_job_results(folder)
+    return merge_error_indices(index for (_, index) in indices)
+
+
+def compact_error_indices(folder, shard_size):
+    return _shard.compact(folder, shard_size)
 
 
 def store_task_results(task_results, fpath):
     print('Storing task results')
-    pickle({tr.task_id: tr for tr in task_results}, fpath)
+    dump({tr.task_id: tr for tr in task_results}, fpath)
     print('   %d task results stored   ' % len(task_results))
 
 
@@ -189,6 +380,68 @@ def tasks_summary(tasks):
     return '*** Task summary ***\n' + tabulate(table)
 
 
+def resources_summary(task_results):
+    """Distributions of the resources used per method.
+
+    :param list task_results: task results.
+    :returns: a table of p50/p95/max of elapsed time, CPU time, peak memory
+              and allocations per method. Rows of ``do_task`` are measured
+              for every task, around the whole call.
+    """
+    if len(task_results) == 0:
+        return ''
+
+    methods = sorted(set(m for tr in task_results for m in tr.methods))
+
+    measures = [('elapsed', '_elapsed', _format_seconds),
+                ('cpu time', '_cpu_time', _format_seconds),
+                ('peak memory', '_peak_memory', _format_size),
+                ('allocations', '_nallocs', _format_count)]
+
+    table = []
+    for m in methods:
+        for (name, attr, fmt) in measures:
+            values = [_get_resource(tr, attr, m) for tr in task_results]
+            table.append([m, name] + _percentiles(values, fmt))
+
+    totals = [('elapsed', 'total_elapsed', _format_seconds),
+              ('cpu time', 'total_cpu_time', _format_seconds),
+              ('peak memory', 'total_peak_memory', _format_size),
+              ('allocations', 'total_nallocs', _format_count),
+              ('dataset load', 'dataset_load_time', _format_seconds),
+              ('dataset hits', 'dataset_hits', _format_count),
+              ('dataset misses', 'dataset_misses', _format_count)]
+
+    for (name, attr, fmt) in totals:
+        values = [getattr(tr, attr, None) for tr in task_results]
+        table.append(['do_task', name] + _percentiles(values, fmt))
+
+    header = ['method', 'measure', '# tasks', 'p50', 'p95', 'max']
+    return '*** Resources summary ***\n' + tabulate(table, headers=header)
+
+
+def _percentiles(values, fmt):
+    import numpy as np
+    values = [v for v in values if v is not None and v == v]
+    if len(values) == 0:
+        return [0, 'n/a', 'n/a', 'n/a']
+    percentiles = np.percentile(values, [50, 95, 100])
+    return [len(values)] + [fmt(v) for v in percentiles]
+
+
+def _format_seconds(v):
+    return '%.2f s' % v
+
+
+def _format_size(v):
+    from humanfriendly import format_size
+    return format_size(int(v))
+
+
+def _format_count(v):
+    return str(int(v))
+
+
 def _isfloat(value):
     try:
         float(value)
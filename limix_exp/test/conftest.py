@@ -0,0 +1,112 @@
+import json
+
+import pytest
+
+from limix_exp import _array, config, workspace
+from limix_exp._cache import cache_manager
+
+_script = '''
+from limix_exp import TaskResult
+
+
+def auto_run_exp(e):
+    e.njobs = 4
+    e.array_submission = True
+    e.job_memory = '1 GB'
+
+    def define_task_args(ta):
+        ta.add('a')
+
+    def generate_tasks():
+        for i in range(8):
+            t = e.create_task()
+            t.a = i % 2
+            yield t
+
+    def do_task(task):
+        tr = TaskResult(task.workspace_id, task.experiment_id, task.task_id)
+        with tr.measure('m'):
+            x = [0] * 1000
+        if task.a == 1:
+            tr.set_error_status('m', 1)
+            tr.set_error_msg('m', 'Failed task %d' % task.task_id)
+        else:
+            tr.set_error_status('m', 0)
+            tr.set_error_msg('m', '')
+        return tr
+
+    e.define_task_args = define_task_args
+    e.generate_tasks = generate_tasks
+    e.do_task = do_task
+
+
+def auto_run_other(e):
+    auto_run_exp(e)
+    e.njobs = 2
+
+
+def auto_run_bad(e):
+    raise RuntimeError('broken setup')
+'''
+
+
+class FakeScheduler(object):
+    """Scheduler of job arrays that records calls instead of running bsub,
+    bjobs and bkill."""
+    def __init__(self):
+        self.submitted = []
+        self.killed = []
+        self.njobs = 0
+        self.states = dict()
+
+    def submit(self, bcmd):
+        self.submitted.append(bcmd)
+        self.njobs += 1
+        return ('Job <%d> is submitted to default queue <normal>.\n' %
+                (41 + self.njobs), '')
+
+    def stats(self):
+        return dict(self.states)
+
+    def reset(self):
+        pass
+
+    def kill(self, os_jobid):
+        self.killed.append(str(os_jobid))
+
+    def kill_jobs(self, os_jobids):
+        self.killed += [str(i) for i in os_jobids]
+
+
+@pytest.fixture
+def scheduler():
+    old = _array.get_scheduler()
+    s = FakeScheduler()
+    _array.set_scheduler(s)
+    yield s
+    _array.set_scheduler(old)
+
+
+@pytest.fixture
+def ws(tmpdir, monkeypatch, scheduler):
+    """Workspace ``ws`` of a temporary base folder, with experiments
+    ``exp`` (8 tasks, 4 jobs, odd tasks failing), ``other`` and ``bad``."""
+    home = tmpdir.mkdir('home')
+    home.mkdir('.config').mkdir('lsf').join('config').write(
+        '[default]\nstdoe_folder = %s\n' % tmpdir.join('stdoe'))
+    monkeypatch.setenv('HOME', str(home))
+
+    base = tmpdir.mkdir('base')
+    folder = base.mkdir('ws')
+    script = tmpdir.join('script.py')
+    script.write(_script)
+    folder.join('auto_run.json').write(json.dumps([str(script)]))
+    folder.join('properties.json').write('{}')
+
+    config.set_base_dir(str(base))
+    workspace._workspaces.clear()
+    cache_manager.clear()
+    yield workspace.get_workspace('ws')
+    config.set_base_dir(None)
+    workspace._workspaces.clear()
+    cache_manager.clear()
@@ -0,0 +1,70 @@
+import os
+
+from limix_exp import _array
+from limix_exp._array import ArrayRun, mapped_jobids
+
+
+def test_array_run(tmpdir, scheduler):
+    scheduler.states = {(42, 1): 'RUN', (42, 2): 'PEND'}
+    try:
+        folder = str(tmpdir.join('array'))
+        run = ArrayRun(folder, ['7', '3,8-9', 5], str(tmpdir.join('out')))
+        bcmd = run.bsub_cmd(['arauto', 'rjob'], 2048, name='ws.exp')
+        assert run.submit(bcmd) == 42
+        assert len(scheduler.submitted) == 1
+        assert 'ws.exp[1-3]' in scheduler.submitted[0]
+
+        assert mapped_jobids(run.mapping_fpath, 2) == [3, 8, 9]
+        os.environ['LSB_JOBINDEX'] = '3'
+        assert mapped_jobids(run.mapping_fpath) == [5]
+
+        elements = _array.load_array_run(run.fpath).elements()
+        assert [e.stat() for e in elements] == ['RUN', 'PEND', 'DONE_OR_EXIT']
+        assert elements[0].isrunning()
+        assert elements[2].hasfinished()
+
+        with open(str(tmpdir.join('out', 'out_3.txt')), 'w') as f:
+            f.write('Your job looked like:\n' + '\n' * 6 +
+                    'Successfully completed.\n')
+        assert elements[2].exit_status() == 0
+    finally:
+        os.environ.pop('LSB_JOBINDEX', None)
+
+
+def test_bsub_cmd(tmpdir):
+    run = ArrayRun(str(tmpdir), ['0', '1'], str(tmpdir.join('out')))
+    assert '-M' not in run.bsub_cmd(['arauto'], None)
+    assert '2048' in run.bsub_cmd(['arauto'], 2048)
+
+
+def test_watch_refreshes_status(ws, scheduler, monkeypatch):
+    e = ws.get_experiment('exp')
+    e.submit_jobs(False)
+    scheduler.states = {(42, i): 'RUN' for i in range(1, 5)}
+    resets = []
+
+    def reset():
+        resets.append(True)
+        if len(resets) == 3:
+            scheduler.states = {(42, i): 'DONE' for i in range(1, 5)}
+
+    monkeypatch.setattr(scheduler, 'reset', reset)
+    e.watch(interval=0., max_interval=0.)
+    assert len(resets) == 3
+
+
+def test_watch_partial_submission(ws, scheduler):
+    e = ws.get_experiment('exp')
+    e.submit_jobs(False, pilot=2)
+    scheduler.states = {(42, i): 'DONE' for i in range(1, 3)}
+    e.watch(interval=0., max_interval=0.)
+
+
+def test_lsf_kill(monkeypatch):
+    calls = []
+    monkeypatch.setattr(_array.subprocess, 'call',
+                        lambda argv, **kwargs: calls.append(argv))
+    scheduler = _array.LSFScheduler()
+    scheduler.kill(42)
+    scheduler.kill_jobs(['42[1]', '43'])
+    assert calls == [['bkill', '42'], ['bkill', '42[1]', '43']]
@@ -0,0 +1,23 @@
+from limix_exp import workspace
+from limix_exp._batch import format_rows, map_experiments
+
+
+def test_map_experiments(ws, scheduler):
+    for nprocs in [1, 2]:
+        # experiments set up in this process are kept, even failed ones
+        workspace._workspaces.clear()
+        rows = map_experiments('status', 'ws', ['exp', 'other', 'bad'],
+                               nprocs)
+        assert [r['experiment'] for r in rows] == ['bad', 'exp', 'other']
+        assert 'broken setup' in rows[0]['error']
+        assert (rows[1]['njobs'], rows[1]['ntasks']) == (4, 8)
+        assert rows[1]['waiting'] == 4
+    assert 'Failed experiments' in format_rows('status', rows)
+
+    rows = map_experiments('submit', 'ws', ['exp', 'other'], nprocs=2)
+    assert [r['submitted'] for r in rows] == [4, 2]
+    assert len(scheduler.submitted) == 2
+
+    ws.get_experiment('exp').run_job(0)
+    rows = map_experiments('collect', 'ws', ['exp'], nprocs=1)
+    assert (rows[0]['results'], rows[0]['errors']) == (2, 1)
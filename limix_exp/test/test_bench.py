@@ -0,0 +1,16 @@
+from limix_exp import _bench
+from limix_exp._codec import Codec
+
+
+def test_bench_io(monkeypatch):
+    monkeypatch.setattr(_bench, '_best', lambda func, repeat: (func(), 1.)[1])
+    codecs = [Codec('none'), Codec('blosclz')]
+    rows = _bench.bench_io(ntasks=100, array_size=1000, codecs=codecs,
+                           repeat=1)
+    assert [r[0] for r in rows] == ['none', 'blosclz:5:byte']
+
+    # throughputs are of the same uncompressed data whatever the codec
+    ((_, size0, w0, r0), (_, size1, w1, r1)) = rows
+    assert size1 < size0
+    assert w0 == w1 == r0 == r1
+    assert w0 * 1e6 < size0
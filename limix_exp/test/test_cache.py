@@ -0,0 +1,32 @@
+import numpy as np
+
+from limix_exp._cache import CacheManager, estimate_size
+
+
+def test_cache_manager():
+    cache = CacheManager(4000)
+    a = np.zeros(100)
+    cache.put('results', 'a', a)
+    assert cache.get('results', 'a') is a
+    assert estimate_size(a) > a.nbytes
+
+    cache.put('results', 'b', np.zeros(200))
+    assert cache.get('results', 'b') is not None
+    cache.put('tasks', 'c', np.zeros(200))
+    assert cache.get('results', 'a') is None
+    assert cache.get('results', 'b') is not None
+    assert cache.size <= cache.max_size
+
+    # the last large object of each kind is kept apart from the budget
+    d = np.zeros(1000)
+    cache.put('tasks', 'd', d)
+    assert cache.get('tasks', 'd') is d
+    assert cache.get('results', 'b') is not None
+    cache.put('tasks', 'e', np.zeros(1000))
+    assert cache.get('tasks', 'd') is None
+    assert cache.get('tasks', 'e') is not None
+    assert cache.size > cache.max_size
+
+    cache.invalidate('tasks')
+    assert [e[0] for e in cache.entries()] == ['results']
+    assert cache.get_or_load('jobs', 1, lambda: [1, 2]) == [1, 2]
@@ -0,0 +1,50 @@
+import numpy as np
+from numpy.testing import assert_array_equal
+
+from limix_exp._dataset import DatasetCache, store_dataset
+
+
+def test_dataset_cache(tmpdir):
+    fp = str(tmpdir.join('X.npy'))
+    store_dataset(fp, np.arange(6.).reshape((2, 3)))
+
+    cache = DatasetCache()
+    X = cache.load(fp)
+    assert isinstance(X, np.memmap)
+    assert cache.load(fp) is X
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    names = str(tmpdir.join('names.txt'))
+    tmpdir.join('names.txt').write('a\nb\n')
+    assert cache.load(names, lambda f: open(f).read().split()) == ['a', 'b']
+    assert_array_equal(X, [[0., 1., 2.], [3., 4., 5.]])
+
+
+def test_dataset_cache_budget(tmpdir):
+    from limix_exp._cache import CacheManager
+
+    manager = CacheManager(20000)
+    cache = DatasetCache(manager)
+    fps = []
+    for i in range(3):
+        fps.append(str(tmpdir.join('%d.npy' % i)))
+        store_dataset(fps[-1], np.arange(1000.))
+
+    def loader(f):
+        return np.load(f).copy()
+
+    # each loaded array holds 8000 bytes, so only two fit in the budget
+    for fp in fps:
+        cache.load(fp, loader)
+    assert cache.misses == 3
+    assert len(manager.entries()) == 2
+    cache.load(fps[0], loader)
+    assert cache.misses == 4
+
+    # memory-mapped arrays barely count
+    for fp in fps:
+        cache.load(fp)
+    assert len(manager.entries()) == 5
+
+    cache.clear()
+    assert manager.entries() == []
@@ -0,0 +1,90 @@
+import shutil
+from os.path import join
+
+from limix_exp.task import TaskResult, error_index, merge_error_indices
+
+
+def _result(task_id, msgs):
+    tr = TaskResult('ws', 'exp', task_id)
+    for (m, msg) in msgs.items():
+        tr.set_error_status(m, 0 if msg is None else 1)
+        tr.set_error_msg(m, msg or '')
+    return tr
+
+
+def _results():
+    return [
+        _result(0, dict(fit='Singular matrix at 0x1f, iteration 3.',
+                        test=None)),
+        _result(1, dict(fit='Singular matrix at 0x2a, iteration 12.',
+                        test='Did not converge.')),
+        _result(2, dict(fit='Singular matrix at 0x3b, iteration 1.',
+                        test=None)),
+        _result(3, dict(fit='Out of memory.', test=None)),
+        _result(4, dict(fit=None, test=None)),
+    ]
+
+
+def test_error_index():
+    index = error_index(_results(), nsamples=2)
+    assert sorted(index.keys()) == ['fit', 'test']
+
+    fit = sorted(index['fit'].values(), key=lambda e: -e['count'])
+    assert [e['count'] for e in fit] == [3, 1]
+    assert fit[0]['task_ids'] == [0, 1]
+    assert fit[0]['msg'].startswith('Singular matrix')
+    assert fit[1]['msg'] == 'Out of memory.'
+    assert list(index['test'].values())[0]['task_ids'] == [1]
+
+    # per-job indices add up to the index of all results
+    trs = _results()
+    merged = merge_error_indices(
+        [error_index(trs[:2], 2), error_index(trs[2:], 2)], nsamples=2)
+    assert merged == index
+
+
+def test_method_errors(ws, capsys):
+    e = ws.get_experiment('exp')
+    for jobid in range(4):
+        e.run_job(jobid)
+
+    # every odd task fails with the same message but for its number
+    entries = list(e.error_index()['m'].values())
+    assert len(entries) == 1
+    assert entries[0]['count'] == 4
+    assert set(entries[0]['task_ids']) == set([1, 3, 5, 7])
+
+    shutil.rmtree(join(e.folder, 'error'))
+    assert e.error_index() == dict()
+    assert e.error_index(rescan=True)['m'] == e.error_index()['m']
+
+    e._store_error_index(99, _results())
+    capsys.readouterr()
+    e.method_errors(top=1)
+    out = capsys.readouterr().out
+    assert 'Error messages for fit (4 failed tasks, 2 classes):' in out
+    assert 'Singular matrix' in out
+    assert 'Out of memory' not in out
+    assert 'Error messages for m (4 failed tasks, 1 classes):' in out
+
+
+def test_compact_error_indices(ws):
+    import os
+    from limix_exp import _shard
+
+    e = ws.get_experiment('exp')
+    for jobid in range(4):
+        e.run_job(jobid)
+    index = e.error_index()
+
+    e.compact_results()
+    folder = join(e.folder, 'error')
+    assert _shard.job_files(folder) == dict()
+    assert os.listdir(join(folder, 'shards')) == ['0.pkl']
+    assert e.error_index() == index
+
+    # indices of rerun jobs take precedence over compacted ones
+    e._store_error_index(0, [])
+    index = e.error_index()
+    assert index['m'][list(index['m'])[0]]['count'] == 4 - len(
+        [i for i in e.job_task_ids(0) if i % 2 == 1])
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+from numpy.testing import assert_array_equal
+
+from limix_exp import TaskResult
+from limix_exp._export import export_task_results
+
+
+class _Task(object):
+    def __init__(self, a, b):
+        self.a = a
+        self.b = b
+
+
+def _data():
+    # 'a' holds ints in the first chunk only and method 'late' appears in
+    # the last chunk only
+    tasks = {i: _Task(i if i < 3 else i + 0.5, 'x%d' % i) for i in range(6)}
+    results = []
+    for i in range(6):
+        tr = TaskResult('ws', 'exp', i)
+        tr.set_elapsed('m', 1.)
+        tr.set_error_status('m', 0)
+        if i == 5:
+            tr.set_elapsed('late', 2.)
+            tr.set_error_status('late', 1)
+        results.append(tr)
+    return (tasks, results)
+
+
+def _read(fpath, fmt):
+    if fmt == 'hdf5':
+        import h5py
+        with h5py.File(fpath, 'r') as f:
+            return {k: f['results'][k][:] for k in f['results']}
+    import pyarrow as pa
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        table = pq.read_table(fpath)
+    else:
+        table = pa.ipc.open_file(pa.OSFile(fpath, 'rb')).read_all()
+    return {k: np.asarray(table.column(k).to_pylist())
+            for k in table.column_names}
+
+
+@pytest.mark.parametrize('ext', ['parquet', 'arrow', 'h5'])
+def test_export(tmpdir, ext):
+    fmt = dict(h5='hdf5').get(ext, ext)
+    pytest.importorskip('h5py' if fmt == 'hdf5' else 'pyarrow')
+    (tasks, results) = _data()
+    fpath = str(tmpdir.join('results.%s' % ext))
+    n = export_task_results(tasks, ['a', 'b'], lambda: iter(results), fpath,
+                            chunk_size=2)
+    assert n == 6
+
+    cols = _read(fpath, fmt)
+    assert_array_equal(cols['task_id'], range(6))
+    assert_array_equal(cols['a'], [0., 1., 2., 3.5, 4.5, 5.5])
+    assert [str(b.decode() if isinstance(b, bytes) else b)
+            for b in cols['b']] == ['x%d' % i for i in range(6)]
+    assert_array_equal(cols['error_status_late'], [-1] * 5 + [1])
+    assert_array_equal(cols['elapsed_late'][5], 2.)
+    assert np.isnan(cols['elapsed_late'][0])
@@ -0,0 +1,65 @@
+import json
+
+from limix_exp import arauto
+from limix_exp._iter import batches, maybe_batches
+
+
+def test_batches():
+    assert list(batches(range(5), 2)) == [[0, 1], [2, 3], [4]]
+    assert list(batches([], 2)) == []
+    assert list(maybe_batches(range(3), None)) == [0, 1, 2]
+    assert list(maybe_batches(range(3), 3)) == [[0, 1, 2]]
+
+
+def test_iter_task_results(ws):
+    e = ws.get_experiment('exp')
+    for jobid in [0, 2, 3]:
+        e.run_job(jobid)
+    task_ids = {j: e.job_task_ids(j) for j in range(4)}
+
+    trs = list(e.iter_task_results())
+    assert sorted(tr.task_id for tr in trs) == sorted(
+        task_ids[0] + task_ids[2] + task_ids[3])
+
+    trs = list(e.iter_task_results(jobids=[2, 1]))
+    assert [tr.task_id for tr in trs] == sorted(task_ids[2])
+
+    ok = [tr.task_id for tr in e.iter_task_results(status='success')]
+    failed = [tr.task_id for tr in e.iter_task_results(status='error')]
+    assert all(i % 2 == 0 for i in ok) and all(i % 2 == 1 for i in failed)
+    assert len(ok) + len(failed) == 6
+
+    sizes = [len(b) for b in e.iter_task_results(batch_size=4)]
+    assert sizes == [4, 2]
+    sizes = [len(b) for b in e.iter_task_results(batch_size=2,
+                                                 status='error')]
+    assert sizes == [2, 1]
+
+    tasks = list(e.iter_tasks(jobids=[3]))
+    assert [t.task_id for t in tasks] == task_ids[3]
+
+
+_save = '''
+def save_ids(tasks, rargs):
+    with open(rargs[0], 'w') as f:
+        f.write(' '.join(str(t.task_id) for t in tasks))
+'''
+
+
+def test_save(ws, tmpdir):
+    e = ws.get_experiment('exp')
+    e.run_job(0)
+    e.run_job(1)
+    script = tmpdir.join('save.py')
+    script.write(_save)
+    tmpdir.join('base', 'ws', 'save.json').write(json.dumps([str(script)]))
+
+    out = str(tmpdir.join('out.txt'))
+    arauto.parse_save(['ws', 'exp', 'save_ids', out])
+    expected = sorted(e.job_task_ids(0) + e.job_task_ids(1))
+    assert open(out).read() == ' '.join(str(i) for i in expected)
+
+    arauto.parse_save(['ws', 'exp', 'save_ids', out,
+                       '--task_filter', 'task.a == 0'])
+    expected = [i for i in expected if i % 2 == 0]
+    assert open(out).read() == ' '.join(str(i) for i in expected)
@@ -0,0 +1,76 @@
+import multiprocessing
+import os
+
+from limix_exp import workspace
+from limix_exp.job import load_job
+
+_exited = 'Your job looked like:\n' + '\n' * 6 + 'Exited with exit code 1.\n'
+
+
+def _write_output(run, index, data):
+    if not os.path.exists(run.output_folder):
+        os.makedirs(run.output_folder)
+    with open(os.path.join(run.output_folder, 'out_%d.txt' % index),
+              'w') as f:
+        f.write(data)
+
+
+def test_failed_and_lost_jobs(ws, scheduler):
+    e = ws.get_experiment('exp')
+    e.submit_jobs(False)
+    e.run_job(0)
+    index = {j.jobid: j.bjobid for j in e.get_jobs()}
+    run = e.get_job(1).get_bjob().array_run
+
+    # job 1 has exited with an error, job 2 has ended without storing its
+    # results and job 3 is still running
+    _write_output(run, index[1], _exited)
+    scheduler.states = {(42, index[0]): 'DONE', (42, index[1]): 'EXIT',
+                        (42, index[2]): 'DONE', (42, index[3]): 'RUN'}
+
+    jobs = {j.jobid: j for j in e.get_jobs()}
+    assert [jobs[i].failed for i in range(4)] == [False, True, False, False]
+    assert [jobs[i].lost for i in range(4)] == [False, False, True, False]
+    assert [j.jobid for j in e.failed_jobs()] == [1, 2]
+
+    # jobs whose array element is not known to the scheduler anymore have
+    # ended too
+    scheduler.states = dict()
+    assert [j.jobid for j in e.failed_jobs()] == [1, 2, 3]
+
+
+def test_apply_job_states(ws, scheduler):
+    e = ws.get_experiment('exp')
+    job = e.get_job(2)
+    assert not job.submitted
+
+    e.submit_jobs(False)
+    # job files are not rewritten on submission
+    stored = load_job(e.job_path(2))
+    assert not stored.submitted
+
+    e._apply_job_states([stored])
+    assert stored.submitted
+    assert stored.memory == e.job_request_megabytes(stored)
+    assert stored.get_state() == e.get_job(2).get_state()
+
+
+def _store_states(ws_id, jobid, n):
+    e = workspace.get_experiment(ws_id, 'exp')
+    job = e.get_job(jobid)
+    for i in range(n):
+        job.memory = i
+        e._store_job_states([job])
+
+
+def test_concurrent_job_states(ws):
+    e = ws.get_experiment('exp')
+    e.get_jobs()
+    procs = [multiprocessing.Process(target=_store_states, args=('ws', i, 30))
+             for i in range(4)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    assert [p.exitcode for p in procs] == [0] * 4
+    assert [j.memory for j in e.get_jobs()] == [29] * 4
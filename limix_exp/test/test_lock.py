@@ -0,0 +1,31 @@
+import subprocess
+import sys
+
+from limix_exp._lock import FileLock
+
+_hold = """
+import sys, time
+from limix_exp._lock import FileLock
+l = FileLock(sys.argv[1])
+l.acquire()
+sys.stdout.write('locked\\n')
+sys.stdout.flush()
+sys.stdin.readline()
+"""
+
+
+def test_file_lock(tmpdir):
+    fp = str(tmpdir.join('.lock'))
+    p = subprocess.Popen([sys.executable, '-c', _hold, fp],
+                         stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    try:
+        assert p.stdout.readline().strip() == b'locked'
+        lock = FileLock(fp)
+        assert not lock.acquire(blocking=False)
+        assert not lock.locked
+    finally:
+        p.communicate(b'\n')
+
+    with FileLock(fp) as lock:
+        assert lock.locked
+    assert not lock.locked
@@ -0,0 +1,57 @@
+import os
+
+from limix_exp._mirror import mirror
+
+
+def test_mirror(tmpdir):
+    src = tmpdir.mkdir('src')
+    src.mkdir('result').join('0.pkl').write('abc')
+    src.join('all.pkl').write('cache')
+    dst = str(tmpdir.join('dst'))
+
+    stats = mirror(str(src), dst, nworkers=2)
+    assert (stats['copied'], stats['bytes']) == (1, 3)
+    assert not os.path.exists(os.path.join(dst, 'all.pkl'))
+
+    stats = mirror(str(src), dst, checksum=True)
+    assert (stats['copied'], stats['unchanged']) == (0, 1)
+
+    src.join('result', '0.pkl').remove()
+    src.join('result', '1.pkl').write('de')
+    stats = mirror(str(src), dst)
+    assert (stats['copied'], stats['deleted']) == (1, 1)
+    assert os.listdir(os.path.join(dst, 'result')) == ['1.pkl']
+
+
+def test_mirror_order(tmpdir, monkeypatch):
+    from limix_exp import _mirror
+
+    src = tmpdir.mkdir('src')
+    result = src.mkdir('result')
+    result.join('index.pkl').write('index')
+    result.mkdir('shards').join('0.pkl').write('shard')
+    result.mkdir('0').join('1.pkl').write('job')
+    result.join('0', '2.pkl').write('job')
+    dst = tmpdir.join('dst')
+
+    copy = _mirror._copy
+    order = []
+
+    def compacting_copy(s, d):
+        order.append(os.path.relpath(s, str(src)))
+        if len(order) == 1:
+            # a compaction packs the job files into a new shard
+            result.join('shards', '1.pkl').write('new shard')
+            for f in ['1.pkl', '2.pkl']:
+                if not s.endswith(f):
+                    result.join('0', f).remove()
+        return copy(s, d)
+
+    monkeypatch.setattr(_mirror, '_copy', compacting_copy)
+    stats = mirror(str(src), str(dst), nworkers=1)
+    assert order[-1] == os.path.join('result', 'index.pkl')
+    assert dst.join('result', 'shards', '1.pkl').read() == 'new shard'
+    copied = set(os.path.relpath(str(f), str(dst))
+                 for f in dst.visit() if f.isfile())
+    assert stats['copied'] == len(copied)
+    assert len([f for f in copied if f.startswith('result/0/')]) <= 1
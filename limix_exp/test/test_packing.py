@@ -0,0 +1,20 @@
+from limix_exp._packing import fill_unknown_costs, lpt_assignment
+
+
+def test_lpt_assignment():
+    costs = [100., 1., 1., 1., 50., 50.]
+    bins = lpt_assignment(costs, 2)
+    assert bins == [[0, 1, 3], [2, 4, 5]]
+
+    loads = [sum(costs[i] for i in b) for b in lpt_assignment(costs, 3)]
+    assert sorted(loads) == [51., 52., 100.]
+
+
+def test_lpt_assignment_uses_every_bin():
+    bins = lpt_assignment([1.] * 5, 5)
+    assert sorted(len(b) for b in bins) == [1] * 5
+
+
+def test_fill_unknown_costs():
+    assert fill_unknown_costs([1., None, 3., float('nan')]) == [1., 2., 3., 2.]
+    assert fill_unknown_costs([None, None]) == [1., 1.]
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+import os
+import time
+
+import pytest
+
+from limix_exp import _path
+from limix_exp._path import folder_hash, rmtree, rmtree_background
+
+_names = ['plain', 'with space', "single'quote", 'double"quote',
+          'new\nline', '-leading-dash', '$(echo x)', u'\xfcnicode']
+
+
+def _make_tree(root):
+    os.makedirs(root)
+    for (i, name) in enumerate(_names):
+        sub = os.path.join(root, name, 'deeper %d' % i)
+        os.makedirs(sub)
+        for fname in _names:
+            with open(os.path.join(sub, fname), 'w') as f:
+                f.write(fname)
+        with open(os.path.join(root, name, name + '.txt'), 'w') as f:
+            f.write(name)
+    os.makedirs(os.path.join(root, 'empty', 'empty'))
+
+
+@pytest.mark.parametrize('batch_size', [1, 7, 4096])
+def test_rmtree(tmpdir, batch_size):
+    root = os.path.join(str(tmpdir), 'to be "removed"')
+    _make_tree(root)
+
+    # links are removed without touching their targets
+    target = tmpdir.mkdir('target')
+    target.join('kept').write('')
+    os.symlink(str(target), os.path.join(root, 'link to dir'))
+    os.symlink(str(target.join('kept')), os.path.join(root, 'link to file'))
+
+    rmtree(root, nthreads=4, batch_size=batch_size)
+    assert not os.path.lexists(root)
+    assert target.join('kept').check()
+
+    rmtree(root)
+
+
+def test_rmtree_file(tmpdir):
+    fp = tmpdir.join('a file\n')
+    fp.write('')
+    rmtree(str(fp))
+    assert not fp.check()
+
+
+def test_rmtree_background(tmpdir):
+    root = os.path.join(str(tmpdir), "exp 'quoted'\n")
+    _make_tree(root)
+    trash = str(tmpdir.join('.trash'))
+
+    rmtree_background(root, trash)
+    assert not os.path.lexists(root)
+    for _ in range(100):
+        if len(os.listdir(trash)) == 0:
+            break
+        time.sleep(0.1)
+    assert os.listdir(trash) == []
+
+
+def test_folder_hash_fallback(tmpdir, monkeypatch):
+    folder = tmpdir.mkdir('folder')
+    folder.join('a').write('a')
+    folder.mkdir('sub').join('b').write('b')
+    folder.join('sub', 'c').write('a')
+
+    monkeypatch.setattr(_path, '_bin_exists', lambda name: False)
+    digest = folder_hash(str(folder))
+    assert digest != folder_hash(str(folder), exclude_files=['c'])
+    folder.join('sub', 'c').write('c')
+    assert digest != folder_hash(str(folder))
+    folder.join('sub', 'c').write('a')
+
+    if _path.find_executable('md5deep') is None:
+        pytest.skip('md5deep is not installed.')
+    monkeypatch.undo()
+    assert folder_hash(str(folder)) == digest
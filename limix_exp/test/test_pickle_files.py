@@ -0,0 +1,122 @@
+import numpy as np
+import pytest
+from numpy.testing import assert_array_equal
+from pickle_blosc import pickle
+
+from limix_exp._codec import Codec
+from limix_exp._pickle_files import (CorruptFileError, dump, load,
+                                     load_or_quarantine, read_header)
+
+
+def test_dump_load(tmpdir):
+    fp = str(tmpdir.join('a.pkl'))
+    obj = dict(x=np.arange(200000.), y=np.random.RandomState(0).randn(1000),
+               z='text')
+    dump(obj, fp)
+    obj2 = load(fp)
+    assert_array_equal(obj['x'], obj2['x'])
+    assert_array_equal(obj['y'], obj2['y'])
+    assert obj2['z'] == 'text'
+
+    # large raw frames are memory-mapped copy-on-write on request
+    dump(obj, fp, Codec('none'))
+    obj2 = load(fp, mmap=True)
+    obj2['x'][0] = 1.
+    assert obj2['x'][0] == 1.
+    assert load(fp)['x'][0] == 0.
+
+
+def test_load_many(tmpdir):
+    import resource
+    (soft, hard) = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (min(256, hard), hard))
+    try:
+        objs = []
+        for i in range(300):
+            fp = str(tmpdir.join('%d.pkl' % i))
+            # large enough to be memory-mapped on request
+            dump(np.full(150000, float(i)), fp, Codec('none'))
+            objs.append(load(fp))
+    finally:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (soft, hard))
+    assert [o[0] for o in objs] == list(range(300))
+
+
+def test_load_legacy(tmpdir):
+    fp = str(tmpdir.join('a.pkl'))
+    pickle(dict(a=1), fp)
+    assert load(fp) == dict(a=1)
+
+
+def test_dump_codecs(tmpdir):
+    fp = str(tmpdir.join('a.pkl'))
+    obj = dict(x=np.zeros(100000))
+    for c in [Codec('none'), Codec('lz4', level=9, shuffle='bit')]:
+        dump(obj, fp, c)
+        assert read_header(fp)['codec'] == c.name
+        assert_array_equal(load(fp)['x'], obj['x'])
+    assert Codec.from_name('lz4:9:bit').name == 'lz4:9:bit'
+
+
+def test_load_corrupt(tmpdir):
+    fp = str(tmpdir.join('a.pkl'))
+    dump(dict(x=np.arange(100000.)), fp, Codec('none'))
+    data = open(fp, 'rb').read()
+
+    with open(fp, 'wb') as f:
+        f.write(data[:len(data) // 2])
+    with pytest.raises(CorruptFileError):
+        load(fp)
+
+    with open(fp, 'wb') as f:
+        f.write(data[:-1] + b'\1')
+    with pytest.raises(CorruptFileError):
+        load(fp)
+
+    assert load_or_quarantine(fp) is None
+    assert tmpdir.join('a.pkl.corrupt').check()
+    assert not tmpdir.join('a.pkl').check()
+
+
+def test_in_band(tmpdir, monkeypatch):
+    from limix_exp import _pickle_files
+
+    fp = str(tmpdir.join('a.pkl'))
+    obj = dict(x=np.arange(200000.), z='text')
+    dump(obj, fp)
+
+    monkeypatch.setattr(_pickle_files, '_OUT_OF_BAND', False)
+    with pytest.raises(ValueError):
+        load(fp)
+
+    dump(obj, fp)
+    assert len(read_header(fp)['frames']) == 1
+    obj2 = load(fp)
+    assert_array_equal(obj['x'], obj2['x'])
+    assert obj2['z'] == 'text'
+
+
+def test_load_bad_size(tmpdir):
+    fp = str(tmpdir.join('a.pkl'))
+    dump(dict(x=np.zeros(100000)), fp, Codec('blosclz'))
+    size = [h['size'] for h in read_header(fp)['frames']
+            if h['chunks'] is not None][0]
+    assert size == 800000
+
+    # the header is not covered by checksums
+    data = open(fp, 'rb').read()
+    for wrong in [b'700000', b'900000']:
+        with open(fp, 'wb') as f:
+            f.write(data.replace(b'"size": 800000', b'"size": ' + wrong))
+        with pytest.raises(CorruptFileError):
+            load(fp)
+
+
+def test_old_task_result():
+    from limix_exp.task import TaskResult
+
+    tr = TaskResult('ws', 'exp', 0)
+    del tr._arrays
+    assert tr.arrays('m') == dict()
+    with pytest.raises(KeyError):
+        tr.array('m', 'x')
@@ -0,0 +1,19 @@
+from numpy.testing import assert_array_equal
+
+from limix_exp._planner import interleaved, longest_first, plan
+
+
+def test_plan():
+    jobids = list(range(10))
+    assert_array_equal(plan(jobids), plan(jobids))
+    assert sorted(plan(jobids)) == jobids
+
+    assert_array_equal(longest_first([3, 4, 5], [1., None, 5.]), [5, 4, 3])
+    assert_array_equal(interleaved([0, 1, 2, 3, 4], 'aabbb'),
+                       [0, 2, 1, 3, 4])
+
+    costs = lambda ids: [float(i) for i in ids]
+    assert_array_equal(plan(jobids, 'longest', costs=costs), jobids[::-1])
+    keys = lambda ids: [i % 2 for i in ids]
+    p = plan(jobids, 'interleave', keys=keys)
+    assert [i % 2 for i in p[:2]] in ([0, 1], [1, 0])
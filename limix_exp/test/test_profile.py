@@ -0,0 +1,24 @@
+from limix_exp._profile import TaskProfiler, profile_files, profiling
+
+
+def _work(n):
+    return sum(i * i for i in range(n))
+
+
+def test_task_profiler(tmpdir):
+    with TaskProfiler() as p:
+        _work(100)
+        with profiling('m1'):
+            _work(1000)
+    with profiling('m2'):
+        _work(10)
+    assert sorted(p.profiles) == ['do_task', 'm1']
+
+    p.dump(str(tmpdir), 3)
+    files = profile_files(str(tmpdir))
+    assert sorted(files) == ['do_task', 'm1']
+
+    with TaskProfiler(enabled=False) as p:
+        with profiling('m1'):
+            _work(10)
+    assert p.profiles == dict()
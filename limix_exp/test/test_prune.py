@@ -0,0 +1,33 @@
+def test_prune(ws, scheduler):
+    e = ws.get_experiment('exp')
+    e.bundle_size = 2
+    e.submit_jobs(False)
+    jobs = {j.jobid: j for j in e.get_jobs()}
+    bundles = dict()
+    for j in jobs.values():
+        bundles.setdefault(j.bjobid, set()).add(j.jobid)
+    assert sorted(len(b) for b in bundles.values()) == [2, 2]
+    scheduler.states = {(42, 1): 'PEND', (42, 2): 'RUN'}
+
+    # tasks 0 to 5 belong to jobs 0, 1 and 2
+    r = e.prune(lambda task, results: task.task_id < 6)
+    assert (r['ntasks'], r['njobs']) == (6, 3)
+    expected = ['42[%d]' % i for (i, b) in bundles.items()
+                if b <= set([0, 1, 2])]
+    assert scheduler.killed == expected
+    assert r['nkilled'] == len(expected)
+
+    assert e.pruned_jobids() == set([0, 1, 2])
+    assert e.job_status_counts()['pruned'] == 3
+    assert [t.task_id for t in e.get_job(3).get_tasks()] == [6, 7]
+
+    # the last job runs its unpruned tasks only
+    e.prune(lambda task, results: task.task_id == 7)
+    assert e.pruned_jobids() == set([0, 1, 2])
+    assert [t.task_id for t in e.get_job(3).get_tasks()] == [6]
+    e.run_job(3)
+    assert [tr.task_id for tr in e.iter_task_results()] == [6]
+
+    scheduler.submitted = []
+    e.submit_jobs(False)
+    assert len(scheduler.submitted) == 0
@@ -0,0 +1,129 @@
+import os
+import time
+
+from limix_exp import experiment
+from limix_exp._queue import JobQueue
+
+
+def _age(queue, state, jobid, seconds):
+    fp = queue._path(state, jobid)
+    t = time.time() - seconds
+    os.utime(fp, (t, t))
+
+
+def test_lease_release(tmpdir):
+    queue = JobQueue(str(tmpdir.join('queue')), lease_time=60.)
+    assert not queue.exists()
+    queue.fill([0, 1, 2])
+    assert queue.exists()
+    assert queue.counts() == dict(pending=3, leased=0, done=0, failed=0)
+
+    leased = [queue.lease() for _ in range(3)]
+    assert sorted(leased) == [0, 1, 2]
+    assert queue.lease() is None
+    assert queue.counts()['leased'] == 3
+
+    queue.release(leased[0])
+    queue.release(leased[1], failed=True, msg='Traceback')
+    assert queue.counts() == dict(pending=0, leased=1, done=1, failed=1)
+    with open(queue._path('failed', leased[1])) as f:
+        assert f.read().endswith('Traceback')
+
+    # releasing a job twice only warns
+    queue.release(leased[0])
+    assert queue.counts()['done'] == 1
+
+    # refilling requeues finished jobs but not leased ones
+    queue.fill([0, 1, 2])
+    assert queue.counts() == dict(pending=2, leased=1, done=0, failed=0)
+
+
+def test_lease_expire_renew(tmpdir):
+    queue = JobQueue(str(tmpdir.join('queue')), lease_time=60.)
+    queue.fill([0, 1])
+    (a, b) = (queue.lease(), queue.lease())
+
+    _age(queue, 'leased', a, 120)
+    _age(queue, 'leased', b, 120)
+    queue.renew(b)
+    queue.expire()
+    assert queue.counts() == dict(pending=1, leased=1, done=0, failed=0)
+
+    # the expired job is leased again while the renewed one is kept
+    assert queue.lease() == a
+    assert queue.lease() is None
+
+    # the worker that lost its lease cannot release the job anymore
+    _age(queue, 'leased', a, 120)
+    queue.expire()
+    queue.release(a)
+    assert queue.counts() == dict(pending=1, leased=1, done=0, failed=0)
+
+
+def test_keep_alive(tmpdir):
+    queue = JobQueue(str(tmpdir.join('queue')), lease_time=0.2)
+    queue.fill([0])
+    jobid = queue.lease()
+    with queue.keep_alive(jobid):
+        time.sleep(0.5)
+        queue.expire()
+        assert queue.counts()['leased'] == 1
+    time.sleep(0.3)
+    queue.expire()
+    assert queue.counts()['pending'] == 1
+
+
+class _FakeClusterRun(object):
+    runs = []
+
+    def __init__(self, title):
+        self.cmds = []
+
+    def add(self, cmd):
+        self.cmds.append(cmd)
+
+    def run(self, dryrun=False):
+        _FakeClusterRun.runs.append(self)
+        return 'run%d' % len(_FakeClusterRun.runs)
+
+    def store(self):
+        pass
+
+
+class _FakeClusterRuns(object):
+    def __init__(self):
+        self.killed = []
+
+    def exists(self, runid):
+        return True
+
+    def load(self, runid):
+        killed = self.killed
+
+        class _Run(object):
+            def kill(self):
+                killed.append(runid)
+
+        return _Run()
+
+    def rm(self, runid):
+        pass
+
+
+def test_kill_workers(ws, monkeypatch):
+    runs = _FakeClusterRuns()
+    monkeypatch.setattr(experiment, 'ClusterRun', _FakeClusterRun)
+    monkeypatch.setattr(experiment, 'clusterrun', runs)
+
+    e = ws.get_experiment('exp')
+    e.submit_workers(3, False)
+    e.submit_workers(2, False)
+    assert [len(r.cmds) for r in _FakeClusterRun.runs[-2:]] == [3, 2]
+    n = len(_FakeClusterRun.runs)
+    runids = ['run%d' % (n - 1), 'run%d' % n]
+    assert e.worker_runids == runids
+    assert e.queue.counts()['pending'] == 4
+
+    e.kill_bjobs()
+    assert sorted(runs.killed) == runids
+    assert e.worker_runids == []
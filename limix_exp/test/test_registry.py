@@ -0,0 +1,21 @@
+import os
+
+from limix_exp import _registry
+
+
+def test_registry(tmpdir):
+    base = str(tmpdir)
+    for f in ['ws1/e1', 'ws1/dataset', 'ws1/.hidden', 'ws2', '.trash/x']:
+        os.makedirs(os.path.join(base, f))
+
+    assert _registry.load(base) is None
+    assert _registry.rescan(base) == dict(ws1=['e1'], ws2=[])
+    assert _registry.load(base) == dict(ws1=['e1'], ws2=[])
+
+    _registry.register('ws2', 'e2', base)
+    _registry.register('ws3', 'e1', base)
+    _registry.unregister('ws1', 'e1', base)
+    assert _registry.load(base) == dict(ws1=[], ws2=['e2'], ws3=['e1'])
+
+    _registry.unregister('ws3', base_dir=base)
+    assert sorted(_registry.load(base)) == ['ws1', 'ws2']
@@ -0,0 +1,63 @@
+import pytest
+
+from limix_exp import _resource
+from limix_exp._resource import ResourceUsage
+from limix_exp.task import resources_summary
+
+requires_tracemalloc = pytest.mark.skipif(
+    _resource.tracemalloc is None, reason='requires tracemalloc.reset_peak')
+
+
+@requires_tracemalloc
+def test_peak_memory():
+    mb = 1 << 20
+    with ResourceUsage(trace=True) as outer:
+        with ResourceUsage() as first:
+            x = bytearray(40 * mb)
+            del x
+        with ResourceUsage() as second:
+            x = bytearray(10 * mb)
+            del x
+    assert 40 * mb <= first.peak_memory < 41 * mb
+    assert 10 * mb <= second.peak_memory < 11 * mb
+    assert 40 * mb <= outer.peak_memory < 41 * mb
+    assert not _resource.tracemalloc.is_tracing()
+
+    # a later measure does not inherit the peak of earlier ones
+    with ResourceUsage(trace=True) as later:
+        x = bytearray(mb)
+        del x
+    assert mb <= later.peak_memory < 2 * mb
+
+
+def test_rss_peak_memory():
+    with ResourceUsage() as usage:
+        x = bytearray(10 << 20)
+        del x
+    assert not _resource.tracemalloc or\
+        not _resource.tracemalloc.is_tracing()
+    if _resource.resource is not None:
+        assert usage.peak_memory >= 0
+
+
+@pytest.mark.parametrize('trace', [False, True])
+def test_job_resources(ws, trace):
+    if trace and _resource.tracemalloc is None:
+        pytest.skip('requires tracemalloc.reset_peak')
+    e = ws.get_experiment('exp')
+    e.trace_memory = trace
+    e.run_job(0)
+    trs = list(e.iter_task_results())
+    assert len(trs) == 2
+    for tr in trs:
+        assert tr.total_elapsed > 0
+        assert tr.total_cpu_time is not None
+        assert tr.total_peak_memory >= 0
+        if trace:
+            assert tr.peak_memory('m') > 0
+            assert tr.total_peak_memory >= tr.peak_memory('m')
+
+    table = resources_summary(trs)
+    rows = [l.split() for l in table.splitlines()[3:]]
+    assert set(r[0] for r in rows) == set(['m', 'do_task'])
+    assert ['do_task', 'peak', 'memory', '2'] == rows[-5][:4]
@@ -0,0 +1,87 @@
+import os
+
+from limix_exp import _shard
+from limix_exp._pickle_files import dump
+
+
+def _store(folder, jobid, results):
+    sub = folder.join(str(jobid // 1000))
+    sub.ensure(dir=True)
+    dump(results, str(sub.join('%d.pkl' % jobid)))
+
+
+def test_compact(tmpdir):
+    folder = tmpdir.mkdir('result')
+    for jobid in range(5):
+        _store(folder, jobid, [jobid] * 2)
+
+    assert _shard.compact(str(folder), shard_size=4) == 5
+    assert _shard.job_files(str(folder)) == dict()
+    index = _shard.load_index(str(folder))
+    assert index == {0: 0, 1: 0, 2: 1, 3: 1, 4: 2}
+
+    # job files take precedence over shards
+    _store(folder, 3, ['rerun'])
+    assert dict(_shard.iter_job_results(str(folder)))[3] == ['rerun']
+    assert list(_shard.iter_job_results(str(folder), [4, 3, 0])) ==\
+        [(4, [4, 4]), (3, ['rerun']), (0, [0, 0])]
+
+    assert _shard.compact(str(folder)) == 1
+    assert _shard.load_index(str(folder))[3] == 3
+    assert sorted(os.listdir(str(folder.join('shards')))) ==\
+        ['0.pkl', '1.pkl', '2.pkl', '3.pkl']
+    assert dict(_shard.iter_job_results(str(folder)))[3] == ['rerun']
+
+
+def test_compact_rewritten(tmpdir, monkeypatch):
+    folder = tmpdir.mkdir('result')
+    _store(folder, 0, ['old'])
+    _store(folder, 1, ['old'])
+    load = _shard.load
+
+    def load_and_rerun(fpath):
+        obj = load(fpath)
+        if fpath.endswith('0.pkl'):
+            _store(folder, 0, ['new'])
+        return obj
+
+    monkeypatch.setattr(_shard, 'load', load_and_rerun)
+    assert _shard.compact(str(folder)) == 1
+    assert list(_shard.job_files(str(folder))) == [0]
+    assert dict(_shard.iter_job_results(str(folder))) ==\
+        {0: ['new'], 1: ['old']}
+
+
+def test_compact_while_reading(tmpdir):
+    folder = tmpdir.mkdir('result')
+    for jobid in range(4):
+        _store(folder, jobid, [jobid])
+
+    it = _shard.iter_job_results(str(folder))
+    assert next(it) == (0, [0])
+    _shard.compact(str(folder))
+    assert list(it) == [(1, [1]), (2, [2]), (3, [3])]
+
+    _store(folder, 5, [5])
+    _store(folder, 6, [6])
+    it = _shard.iter_job_results(str(folder), [5, 6, 1])
+    assert next(it) == (5, [5])
+    _shard.compact(str(folder))
+    assert list(it) == [(6, [6]), (1, [1])]
+
+
+def test_remove_compacted(tmpdir):
+    folder = tmpdir.mkdir('result')
+    _store(folder, 0, ['old'])
+    fp = str(folder.join('0', '0.pkl'))
+    stat = _shard._stat(fp)
+
+    # rewritten between the check and the removal
+    _store(folder, 0, ['new'])
+    assert not _shard._remove_compacted(fp, stat)
+    assert _shard.load(fp) == ['new']
+    assert os.listdir(str(folder.join('0'))) == ['0.pkl']
+
+    assert _shard._remove_compacted(fp, _shard._stat(fp))
+    assert not os.path.exists(fp)
+    assert not _shard._remove_compacted(fp, stat)
@@ -0,0 +1,38 @@
+def _memory(bcmd):
+    return int(bcmd[bcmd.index('-M') + 1])
+
+
+def test_memory_groups(ws, scheduler, monkeypatch):
+    e = ws.get_experiment('exp')
+    e.max_array_size = 1
+    monkeypatch.setattr(
+        e, 'job_request_megabytes',
+        lambda job, peak=None: 1024 if job.jobid < 3 else 4096)
+    e.submit_jobs(False)
+
+    # one array per memory request and per chunk of `max_array_size`
+    assert sorted(_memory(b) for b in scheduler.submitted) == [
+        1024, 1024, 1024, 4096]
+    runids = e.runids
+    assert len(runids) == 4 and len(set(runids)) == 4
+    assert e.runid == runids[-1]
+
+    jobs = {j.jobid: j for j in e.get_jobs()}
+    assert [jobs[i].memory for i in range(4)] == [1024, 1024, 1024, 4096]
+    assert set(j.brunid for j in jobs.values()) == set(runids)
+
+
+def test_pilot(ws, scheduler):
+    e = ws.get_experiment('exp')
+    e.submit_jobs(False, pilot=2)
+    submitted = [j.jobid for j in e.get_jobs() if j.submitted]
+    assert sorted(submitted) == sorted(e.plan_submission(range(4))[:2])
+    assert len(scheduler.submitted) == 1
+    assert 'ws.exp[1-2]' in scheduler.submitted[0]
+
+    # a full submission follows the pilot
+    e.submit_jobs(False)
+    assert 'ws.exp[1-4]' in scheduler.submitted[1]
+    assert sorted(j.jobid for j in e.get_jobs() if j.submitted) == [
+        0, 1, 2, 3]
+    assert len(e.runids) == 1
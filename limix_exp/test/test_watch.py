@@ -0,0 +1,74 @@
+import os
+import time
+
+from limix_exp import _shard, _watch
+from limix_exp._watch import ResultFiles, Throughput
+
+
+def test_throughput(monkeypatch):
+    now = [1000.]
+    monkeypatch.setattr(_watch.time, 'time', lambda: now[0])
+    t = Throughput(window=100.)
+    t.update(0)
+    assert t.rate is None
+    assert t.eta(10) is None
+
+    now[0] += 10.
+    t.update(20)
+    assert t.rate == 2.
+    assert t.eta(10) == 5.
+
+    # older measures leave the window
+    now[0] += 200.
+    t.update(20)
+    now[0] += 10.
+    t.update(40)
+    assert t.rate == 2.
+
+    # no progress over the whole window
+    now[0] += 200.
+    t.update(40)
+    now[0] += 10.
+    t.update(40)
+    assert t.rate == 0.
+    assert t.eta(10) is None
+
+
+def _touch(folder, name):
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+    with open(os.path.join(folder, name), 'w'):
+        pass
+
+
+def test_result_files(tmpdir, monkeypatch):
+    folder = str(tmpdir.join('result'))
+    files = ResultFiles(folder)
+    assert files.finished_jobids() == set()
+
+    _touch(os.path.join(folder, '0'), '0.pkl')
+    _touch(os.path.join(folder, '0'), '1.pkl')
+    _touch(os.path.join(folder, '0'), 'notes.txt')
+    assert files.finished_jobids() == set([0, 1])
+
+    # unchanged subfolders are not listed again
+    listed = []
+    listdir = os.listdir
+
+    def counting_listdir(path):
+        listed.append(path)
+        return listdir(path)
+
+    monkeypatch.setattr(_watch.os, 'listdir', counting_listdir)
+    assert files.finished_jobids() == set([0, 1])
+    assert listed == [folder]
+
+    _touch(os.path.join(folder, '1'), '1000.pkl')
+    assert files.finished_jobids() == set([0, 1, 1000])
+
+    monkeypatch.setattr(_shard, 'load_index', lambda f: {5: None, 6: None})
+    index = os.path.join(folder, 'index.pkl')
+    _touch(folder, 'index.pkl')
+    t = time.time() + 10
+    os.utime(index, (t, t))
+    assert files.finished_jobids() == set([0, 1, 1000, 5, 6])
@@ -0,0 +1,39 @@
+from limix_exp._cache import cache_manager
+
+
+def test_experiment_identity(ws):
+    e = ws.get_experiment('exp')
+    assert e.ntasks == 8
+    e.lease_time = 10.
+    cache_manager.clear()
+    assert ws.get_experiment('exp') is e
+
+
+def test_corrupt_job_files(ws):
+    e = ws.get_experiment('exp')
+    e.run_job(0)
+    assert len(e.get_jobs()) == 4
+    for jobid in [0, 2]:
+        with open(e.job_path(jobid), 'wb') as f:
+            f.write(b'garbage')
+
+    jobs = e.get_jobs()
+    assert [j.jobid for j in jobs] == [0, 1, 2, 3]
+    assert [j.finished for j in jobs] == [True, False, False, False]
+    assert e.get_job(2).task_ids == [4, 5]
+
+
+def test_auto_run_dryrun_unregisters(ws, monkeypatch):
+    from limix_exp import _registry
+
+    script = ws._auto_run_filepaths()[0]
+    lista = [r for r in ws._get_generate_tasks(script) if r[0] == 'exp']
+    monkeypatch.setattr(ws, '_get_generate_tasks', lambda fp: lista)
+    ws._auto_run(script, ['--dryrun'])
+    assert not ws.get_experiment('exp').exists()
+    assert 'exp' not in _registry.load()['ws']
+
+    ws.get_experiment('other')
+    assert 'other' in _registry.load()['ws']
+    ws.rm_experiment('other')
+    assert 'other' not in _registry.load()['ws']
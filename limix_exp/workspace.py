@@ -5,18 +5,18 @@ import logging
 import re
 import shutil
 from argparse import ArgumentParser
-from os import listdir, system, walk
-from os.path import basename, isdir, join, splitext
+from os import system
+from os.path import basename, join, splitext
 from os.path import exists as _exists
 
 import limix_lsf
-from tqdm import tqdm
 
-from . import experiment
+from . import _batch, _registry, experiment
+from ._dataset import dataset_cache, store_dataset
 from ._elapsed import BeginEnd
 from ._inspect import fetch_functions
-from ._path import rmtree
-from .config import conf
+from ._path import make_sure_path_exists, rmtree, rmtree_background
+from .config import base_dir
 
 _workspaces = dict()
 
@@ -42,13 +42,15 @@ def get_experiment(workspace_id, experiment_id):
 
 
 def exists(workspace_id):
-    folder = join(conf.get('default', 'base_dir'), workspace_id)
+    folder = join(base_dir(), workspace_id)
     return _exists(folder)
 
 
 def get_workspace_ids():
-    files = listdir(conf.get('default', 'base_dir'))
-    return [f for f in files if isdir(f)]
+    registry = _registry.load()
+    if registry is None:
+        registry = _registry.rescan()
+    return sorted(registry.keys())
 
 
 class Workspace(object):
@@ -62,20 +64,27 @@ class Workspace(object):
         self._logger = logging.getLogger(__name__)
         self._logger.debug('Workspace %s has been created.', workspace_id)
 
-    def rm_experiment(self, experiment_id):
+    def rm_experiment(self, experiment_id, background=False):
         e = self.get_experiment(experiment_id)
         e.kill_bjobs()
+        self._rm_folder(experiment_id, background, verbose=True)
 
-        if not _exists(e.folder):
+    def _rm_folder(self, experiment_id, background=False, verbose=False):
+        # experiment folders are always removed along with their registry
+        # entry, so that they are not listed anymore
+        _registry.unregister(self._workspace_id, experiment_id)
+        folder = join(self.folder, experiment_id)
+        if not _exists(folder):
             return
 
-        folders = []
-        for (d, _, _) in walk(e.folder):
-            folders.insert(0, d)
+        if background:
+            rmtree_background(folder, self.trash_folder)
+        else:
+            rmtree(folder, verbose=verbose)
 
-        desc = "Removing folder %s" % e.folder
-        for f in tqdm(reversed(folders), desc=desc):
-            rmtree(f)
+    @property
+    def trash_folder(self):
+        return join(base_dir(), '.trash')
 
     def get_properties(self):
         try:
@@ -108,7 +117,7 @@ class Workspace(object):
 
     @property
     def folder(self):
-        return join(conf.get('default', 'base_dir'), self._workspace_id)
+        return join(base_dir(), self._workspace_id)
 
     def _get_auto_run(self, experiment_id):
         self._load_auto_runs()
@@ -142,6 +151,22 @@ class Workspace(object):
     def dataset_folder(self):
         return join(self.folder, 'dataset')
 
+    def load_dataset(self, name, loader=None):
+        """Loads a file of the dataset folder once per process.
+
+        ``.npy`` files are memory-mapped read-only; other files are read by
+        `loader`. Hits and load times are reported in the task results.
+
+        :param str name: file path relative to the dataset folder.
+        :param callable loader: function reading a file path.
+        """
+        return dataset_cache.load(join(self.dataset_folder, name), loader)
+
+    def store_dataset(self, name, array):
+        """Stores an array in the dataset folder as a ``.npy`` file."""
+        make_sure_path_exists(self.dataset_folder)
+        store_dataset(join(self.dataset_folder, name), array)
+
     def _auto_run_filepaths(self):
         f = join(self.folder, 'auto_run.json')
         if not _exists(f):
@@ -175,11 +200,11 @@ class Workspace(object):
             try:
                 exp.submit_jobs(args.dryrun, queue=args.queue)
             except KeyboardInterrupt:
-                rmtree(exp.folder)
+                self._rm_folder(experiment_id)
                 raise
 
             if args.dryrun:
-                rmtree(exp.folder)
+                self._rm_folder(experiment_id)
 
     def remove(self, experiment_id, jobs_too=False):
         if experiment_id is None:
@@ -190,7 +215,7 @@ class Workspace(object):
             return
         folder = join(self.folder, experiment_id)
         with BeginEnd("Removing folder %s" % folder):
-            rmtree(folder)
+            self._rm_folder(experiment_id)
 
         if jobs_too:
             bgroup = '/%s/%s' % (self._workspace_id, experiment_id)
@@ -224,51 +249,55 @@ class Workspace(object):
 
         return lista
 
-    def __str__(self):
+    def experiment_ids(self):
+        registry = _registry.load()
+        if registry is None or self._workspace_id not in registry:
+            registry = _registry.rescan()
+        return list(registry.get(self._workspace_id, []))
+
+    def batch(self, operation, experiment_ids=None, nprocs=None, **kwargs):
+        """Runs `operation` (``'status'``, ``'submit'`` or ``'collect'``)
+        on experiments in parallel processes.
+
+        :returns: one row per experiment; see :func:`._batch.map_experiments`.
+        """
+        if experiment_ids is None:
+            experiment_ids = self.experiment_ids()
+        return _batch.map_experiments(operation, self._workspace_id,
+                                      experiment_ids, nprocs, **kwargs)
+
+    def summary(self, nprocs=None):
         from tabulate import tabulate
 
-        files = listdir(self.folder)
-        exp_ids = [
-            f for f in files
-            if (isdir(join(self.folder, f)) and join(self.folder, f,
-                                                     'generate_tasks.txt'))
-        ]
+        rows = self.batch('status', nprocs=nprocs)
 
-        auto_run_err = set()
-        tasks_setup_err = set()
-        finish_setup_err = set()
-        imp_err = set()
-        suc = set()
+        def count(setup):
+            return sum(r.get('setup') == setup for r in rows)
 
-        for ei in exp_ids:
-            try:
-                e = self.get_experiment(ei)
-                if not e.auto_run_done:
-                    auto_run_err.add(ei)
-                elif not e.tasks_setup_done:
-                    tasks_setup_err.add(ei)
-                elif not e.finish_setup_done:
-                    finish_setup_err.add(ei)
-                else:
-                    suc.add(ei)
-            except ImportError:
-                imp_err.add(ei)
+        imp_err = sum(r['error'] is not None and
+                      r['error'].startswith('ImportError') for r in rows)
 
         table = []
         auto_run_fps = '\n'.join(self._auto_run_filepaths())
         table.append(['auto_run files', auto_run_fps])
-        table.append(['# experiments', str(len(exp_ids))])
+        table.append(['# experiments', str(len(rows))])
 
-        table.append(["# auto_run err", len(auto_run_err)])
-        table.append(["# tasks setup err", len(tasks_setup_err)])
-        table.append(["# finish setup err", len(finish_setup_err)])
-        table.append(["# import err", len(imp_err)])
-        table.append(["# successful", len(suc)])
+        table.append(["# auto_run err", count('auto_run err')])
+        table.append(["# tasks setup err", count('tasks setup err')])
+        table.append(["# finish setup err", count('finish setup err')])
+        table.append(["# import err", imp_err])
+        table.append(["# other err", sum(r['error'] is not None
+                                         for r in rows) - imp_err])
+        table.append(["# successful", count('successful')])
 
         msg = tabulate(table)
+        msg += '\n\n' + _batch.format_rows('status', rows)
 
         return msg
 
+    def __str__(self):
+        return self.summary(nprocs=1)
+
 
 def _get_auto_runs_map(script_filepath):
     script_name = basename(script_filepath)
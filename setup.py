@@ -17,9 +17,10 @@ def setup_package():
     install_requires = [
         'pytest', 'scipy>=0.17', 'numpy>=1.9', 'tabulate', 'humanfriendly',
         'pickle-mixin', 'pickle-blosc', 'limix-lsf', 'joblib', 'tqdm',
-        'cachetools>=2.0.0'
+        'cachetools>=2.0.0', 'blosc'
     ]
     tests_require = ['pytest']
+    extras_require = {'export': ['pyarrow', 'h5py']}
 
     metadata = dict(
         name='limix-exp',
@@ -33,7 +34,12 @@ def setup_package():
         install_requires=install_requires,
         setup_requires=setup_requires,
         tests_require=tests_require,
+        extras_require=extras_require,
         include_package_data=True,
+        classifiers=[
+            'Programming Language :: Python :: 2.7',
+            'Programming Language :: Python :: 3',
+        ],
         entry_points={
             'console_scripts': [
                 'arauto = limix_exp.arauto:entry_point',